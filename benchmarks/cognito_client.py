@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""Compare a fresh cognito client per call with the shared client of CognitoUser, against a local stub endpoint"""
+
+import os
+import sys
+import time
+import logging
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+import boto3
+from src.config import app
+from src.lib.cognito_user import CognitoUser
+from fakes import JSONHandler, start_server
+
+log = logging.getLogger(__name__)
+
+CALLS = int(os.environ.get("BENCHMARK_CALLS", 200))
+
+
+def measure(get_client):
+    """Get the mean duration, in ms, of a confirm signup call"""
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        get_client().admin_confirm_sign_up(UserPoolId="us-east-1_benchmark", Username="benchmark")
+    return (time.perf_counter() - start) * 1000 / CALLS
+
+
+def run():
+    """Run the benchmark"""
+    server, endpoint_url = start_server(JSONHandler)
+
+    app.config.update(COGNITO_REGION="us-east-1", COGNITO_ENDPOINT_URL=endpoint_url,
+                      COGNITO_MAX_POOL_CONNECTIONS=10, COGNITO_CONNECT_TIMEOUT=2, COGNITO_READ_TIMEOUT=5,
+                      COGNITO_MAX_ATTEMPTS=3)
+    with app.app_context():
+        fresh = measure(lambda: boto3.client("cognito-idp", region_name="us-east-1", endpoint_url=endpoint_url))
+        shared = measure(CognitoUser.get_client)
+    server.shutdown()
+
+    log.info("Fresh client per call: %.2f ms/call", fresh)
+    log.info("Shared client: %.2f ms/call", shared)
+    log.info("Saved per call: %.2f ms (%.1fx)", fresh - shared, fresh / shared)
+
+
+if __name__ == "__main__":
+    run()
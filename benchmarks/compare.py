@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Compare a benchmark report with a baseline, exits with an error when an endpoint regressed"""
+
+import sys
+import json
+import logging
+import argparse
+
+log = logging.getLogger(__name__)
+
+
+def compare(baseline, report, tolerance, timings=True):
+    """
+    Get the regressions of a report, as messages: slower latencies or throughput beyond tolerance unless timings
+    are left out, more queries or errors
+    """
+    regressions = []
+    for name, before in baseline["endpoints"].items():
+        after = report["endpoints"].get(name)
+        if after is None:
+            regressions.append("%s: missing from the report" % name)
+            continue
+        for metric in ("p50", "p95", "p99") if timings else ():
+            if after[metric] > before[metric] * (1 + tolerance):
+                regressions.append("%s: %s went from %.1f ms to %.1f ms" % (name, metric, before[metric],
+                                                                           after[metric]))
+        if timings and after["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append("%s: throughput went from %.0f to %.0f req/s" % (name, before["throughput"],
+                                                                             after["throughput"]))
+        if after["queries"] > before["queries"]:
+            regressions.append("%s: queries went from %.1f to %.1f per request" % (name, before["queries"],
+                                                                                after["queries"]))
+        if after["errors"] > before["errors"]:
+            regressions.append("%s: errors went from %s to %s" % (name, before["errors"], after["errors"]))
+    return regressions
+
+
+def run():
+    """Compare the reports"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("baseline")
+    parser.add_argument("report")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative change of latencies and throughput allowed, queries must not increase")
+    parser.add_argument("--no-timings", dest="timings", action="store_false",
+                        help="only compare queries and errors, for a report measured on another machine than the "
+                             "baseline")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.report) as f:
+        report = json.load(f)
+    for name, after in report["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if before is not None:
+            log.info("%s: p95 %.1f -> %.1f ms, %.0f -> %.0f req/s, %.1f -> %.1f queries/request", name, before["p95"],
+                     after["p95"], before["throughput"], after["throughput"], before["queries"], after["queries"])
+    regressions = compare(baseline, report, args.tolerance, args.timings)
+    for regression in regressions:
+        log.error(regression)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Compare sending the digests of many clients in rate limited batches from a pool of workers with querying and
+sending them one client at a time, through an in memory mailer standing in for the round trip to SES
+"""
+
+import os
+import sys
+import time
+import logging
+from datetime import date
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from src.config import app, db
+from src.lib.digest import DigestSender, MemoryMailer, get_digest_rows_query, iter_digests
+from src.model.orm import Client, Keyword, KeywordMover, Website
+
+log = logging.getLogger(__name__)
+
+CLIENTS = int(os.environ.get("BENCHMARK_CLIENTS", 100000))
+MOVERS = int(os.environ.get("BENCHMARK_MOVERS", 3))
+# Clients sent one at a time, the duration for every client is extrapolated from them
+SAMPLE = int(os.environ.get("BENCHMARK_SAMPLE", 500))
+LATENCY = float(os.environ.get("BENCHMARK_LATENCY", 0.05))
+RATE = float(os.environ.get("BENCHMARK_RATE", 2000))
+WORKERS = int(os.environ.get("BENCHMARK_WORKERS", 16))
+BATCH_SIZE = 10000
+
+
+def fill(day):
+    """Insert clients with notifications on, each with a website, keywords and movers on the day"""
+    db.drop_all()
+    db.create_all()
+    with db.engine.begin() as connection:
+        for offset in range(0, CLIENTS, BATCH_SIZE):
+            usernames = ["client-%06d" % idx for idx in range(offset, min(offset + BATCH_SIZE, CLIENTS))]
+            connection.execute(Client.__table__.insert(), [
+                {"username": username, "email": "%s@example.com" % username, "notifications": True}
+                for username in usernames])
+            connection.execute(Website.__table__.insert(), [
+                {"id": username, "username": username, "domain": "www.%s.com" % username} for username in usernames])
+            connection.execute(Keyword.__table__.insert(), [
+                {"id": "%s-%s" % (username, idx), "websiteId": username, "name": "keyword %s" % idx}
+                for username in usernames for idx in range(MOVERS)])
+            connection.execute(KeywordMover.__table__.insert(), [
+                {"keyword": "%s-%s" % (username, idx), "engine": "google", "period": "1d", "date": day,
+                 "username": username, "websiteId": username, "position": 10, "previous": 30 if idx % 2 else 1,
+                 "delta": 20 if idx % 2 else -9 - idx, "best": 10, "worst": 30, "average": 20.0}
+                for username in usernames for idx in range(MOVERS)])
+
+
+def send_per_client(day, usernames):
+    """Query and send the digest of each client on its own, the way a loop over clients would"""
+    mailer = MemoryMailer(latency=LATENCY)
+    start = time.perf_counter()
+    for username in usernames:
+        rows = get_digest_rows_query(day).filter(Client.username == username).all()
+        if rows:
+            mailer.send([{"to": rows[0].email, "data": {"changes": [row.keyword for row in rows]}}])
+    return len(mailer.sent), time.perf_counter() - start
+
+
+def send_batched(day):
+    """Read every digest in a single query and send them in batches from a pool of workers"""
+    mailer = MemoryMailer(latency=LATENCY)
+    sender = DigestSender(mailer, rate=RATE, workers=WORKERS)
+    with db.engine.connect() as connection:
+        sent, failed, seconds = sender.send(iter_digests(connection, day))
+    if failed or len(mailer.sent) != sent:
+        raise AssertionError("Some digests were not sent")
+    return sent, seconds, mailer.calls
+
+
+def run():
+    """Run the benchmark"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI", "sqlite:////tmp/serpbot_digest.sqlite")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+
+    day = date.today()
+    with app.app_context():
+        fill(day)
+        sampled, per_client = send_per_client(day, ["client-%06d" % idx for idx in range(min(SAMPLE, CLIENTS))])
+        sent, batched, calls = send_batched(day)
+        estimate = per_client / sampled * sent
+        log.info("%s digests, per client: %.0f s (extrapolated from %s), %.0f digests/s", sent, estimate, sampled,
+                 sampled / per_client)
+        log.info("%s digests, batched: %.1f s in %s calls, %.0f digests/s (%.0fx faster)", sent, batched, calls,
+                 sent / batched, estimate / batched)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compare the peak memory and time to first byte of a streamed trend export with loading the same history as orm
+objects into one json document, for growing histories
+"""
+
+import os
+import sys
+import time
+import logging
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from src.config import app, db
+from src.lib.export import format_csv, get_export_keywords, iter_export_rows
+from src.lib.response import dumps
+from src.model.orm import Keyword, Trend, Website
+from generate import generate
+
+log = logging.getLogger(__name__)
+
+KEYWORDS = int(os.environ.get("BENCHMARK_KEYWORDS", 50))
+HISTORIES = [int(days) for days in os.environ.get("BENCHMARK_DAYS", "180,720,1440").split(",")]
+
+
+def export_streamed(website_id):
+    """Stream the csv export, returns its (first rows seconds, bytes)"""
+    start = time.perf_counter()
+    first = None
+    size = 0
+    with db.engine.connect() as connection:
+        for idx, chunk in enumerate(format_csv(iter_export_rows(connection,
+                                                                get_export_keywords(connection, website_id)))):
+            # The first chunk is the header, the second holds the first rows
+            if idx == 1:
+                first = time.perf_counter() - start
+            size += len(chunk)
+    return first, size
+
+
+def export_buffered(website_id):
+    """Load every trend as an orm object into one json document, returns its (first byte seconds, bytes)"""
+    start = time.perf_counter()
+    trends = Trend.query.join(Keyword, Keyword.id == Trend.keyword).filter(Keyword.websiteId == website_id).all()
+    document = dumps([{"keyword": trend.keyword, "engine": trend.engine, "date": trend.date,
+                       "position": trend.position} for trend in trends])
+    return time.perf_counter() - start, len(document)
+
+
+def measure(func, website_id):
+    """Get the (peak MB, first byte ms) of an export"""
+    db.session.remove()
+    tracemalloc.start()
+    first, _ = func(website_id)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6, first * 1000
+
+
+def run():
+    """Run the benchmark"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI", "sqlite:////tmp/serpbot_export.sqlite")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+
+    with app.app_context():
+        for days in HISTORIES:
+            trends = generate(db.engine, clients=1, websites=1, keywords=KEYWORDS, days=days)
+            website_id = Website.query.first().id
+            streamed, streamed_first = measure(export_streamed, website_id)
+            buffered, buffered_first = measure(export_buffered, website_id)
+            log.info("%s trends: streamed peak %.1f MB, first byte %.1f ms; buffered peak %.1f MB, first byte %.1f ms",
+                     trends, streamed, streamed_first, buffered, buffered_first)
+
+
+if __name__ == "__main__":
+    run()
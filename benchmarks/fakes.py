@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""In-memory and local stand-ins for the external services used by the benchmarks"""
+
+import json
+import time
+import threading
+from uuid import uuid4
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import rsa
+from jose import jwk, jwt
+
+
+class FakeSQS():
+    """Thread safe in-memory SQS client, messages stay in flight until they are deleted"""
+
+    def __init__(self):
+        self.visible = []
+        self.in_flight = {}
+        self._condition = threading.Condition()
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self._condition:
+            for entry in Entries:
+                self.visible.append({"MessageId": str(uuid4()), "Body": entry["MessageBody"]})
+            self._condition.notify_all()
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs):
+        with self._condition:
+            if not self.visible:
+                self._condition.wait(WaitTimeSeconds)
+            messages, self.visible = self.visible[:MaxNumberOfMessages], self.visible[MaxNumberOfMessages:]
+            for message in messages:
+                message["ReceiptHandle"] = str(uuid4())
+                self.in_flight[message["ReceiptHandle"]] = message
+        return {"Messages": messages} if messages else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self._condition:
+            for entry in Entries:
+                self.in_flight.pop(entry["ReceiptHandle"], None)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+class JWTSigner():
+    """Signs userpool-like id tokens with a local key and publishes the matching jwks"""
+
+    def __init__(self, app_client_id, kid="benchmark"):
+        self.app_client_id = app_client_id
+        self.kid = kid
+        public_key, private_key = rsa.newkeys(2048)
+        self.private_key = private_key.save_pkcs1().decode("utf-8")
+        key = jwk.construct(public_key.save_pkcs1().decode("utf-8"), "RS256").to_dict()
+        key.update(kid=kid, alg="RS256", use="sig")
+        self.jwks = {"keys": [key]}
+        self.tokens = {}
+
+    def write_jwks(self, path):
+        """Write the jwks to a file, to be used as COGNITO_JWKS_URL"""
+        with open(path, "w") as f:
+            json.dump(self.jwks, f)
+
+    def sign(self, username, ttl=3600):
+        """Sign an id token for a user"""
+        claims = {"cognito:username": username, "aud": self.app_client_id, "token_use": "id",
+                  "exp": int(time.time()) + ttl}
+        return jwt.encode(claims, self.private_key, algorithm="RS256", headers={"kid": self.kid})
+
+    def get_token(self, username):
+        """Get a token of a user, signed once so that the stand-ins do not weigh on the measures"""
+        if username not in self.tokens:
+            self.tokens[username] = self.sign(username)
+        return self.tokens[username]
+
+
+class JSONHandler(BaseHTTPRequestHandler):
+    """Base handler of the stubs, answering every POST with the json document of respond"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def respond(self, body):
+        return {}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = json.dumps(self.respond(body)).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def get_cognito_handler(signer):
+    """Get a cognito-idp stub handler, logging users in with tokens of signer"""
+
+    class CognitoHandler(JSONHandler):
+        def respond(self, body):
+            if self.headers.get("X-Amz-Target", "").endswith("AdminInitiateAuth"):
+                username = json.loads(body)["AuthParameters"]["USERNAME"]
+                return {"AuthenticationResult": {"IdToken": signer.get_token(username)}}
+            return {}
+
+    return CognitoHandler
+
+
+class HCaptchaHandler(JSONHandler):
+    """hCaptcha stub, accepting every token but 'invalid'"""
+
+    def respond(self, body):
+        return {"success": b"response=invalid" not in body}
+
+
+def start_server(handler):
+    """Serve a handler on a free local port in the background, returns the server and its url"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:%s" % server.server_port
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Fill a local database with a seeded, reproducible data set of clients, websites, keywords and daily trends"""
+
+import os
+import sys
+import random
+import logging
+import argparse
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from src.config import app, db
+from src.model.orm import Client, Website, Keyword, Trend
+from src.lib.ingest import get_trend_id
+from src.lib.rollups import MAX_RANK, backfill_rollups
+
+log = logging.getLogger(__name__)
+
+ENGINES = ["google", "bing"]
+BATCH_SIZE = 10000
+
+
+def get_username(idx):
+    """Get the username of the idx-th generated client"""
+    return "client-%04d" % idx
+
+
+def get_ranks(rng, days):
+    """Get a random walk of daily ranks, -1 when the website is not ranked and None when nothing was collected"""
+    ranks = []
+    position = rng.randint(1, MAX_RANK)
+    for _ in range(days):
+        position = min(MAX_RANK, max(1, position + rng.randint(-3, 3)))
+        roll = rng.random()
+        ranks.append(None if roll < 0.03 else -1 if roll < 0.08 else position)
+    return ranks
+
+
+def generate(engine, clients=20, websites=5, keywords=5, days=365, seed=0, end=None):
+    """Create the tables and insert the data set, returns the number of trends"""
+    rng = random.Random(seed)
+    end = end or date.today()
+    start = end - timedelta(days=days - 1)
+    db.Model.metadata.drop_all(engine)
+    db.Model.metadata.create_all(engine)
+
+    trends = 0
+    with engine.begin() as connection:
+        pending = []
+        for client_idx in range(clients):
+            username = get_username(client_idx)
+            connection.execute(Client.__table__.insert(), [{"username": username, "email": "%s@example.com" % username,
+                                                            "notifications": client_idx % 2 == 0}])
+            for website_idx in range(websites):
+                website_id = "%s-website-%02d" % (username, website_idx)
+                connection.execute(Website.__table__.insert(), [{"id": website_id, "username": username,
+                                                                 "domain": "www.%s-%s.com" % (username, website_idx)}])
+                connection.execute(Keyword.__table__.insert(), [
+                    {"id": "%s-keyword-%02d" % (website_id, idx), "websiteId": website_id, "name": "keyword %s" % idx}
+                    for idx in range(keywords)])
+                for keyword_idx in range(keywords):
+                    keyword_id = "%s-keyword-%02d" % (website_id, keyword_idx)
+                    for search_engine in ENGINES:
+                        for offset, position in enumerate(get_ranks(rng, days)):
+                            if position is None:
+                                continue
+                            day = start + timedelta(days=offset)
+                            pending.append({"id": get_trend_id(keyword_id, search_engine, day), "keyword": keyword_id,
+                                            "engine": search_engine, "date": day, "position": position})
+                    if len(pending) >= BATCH_SIZE:
+                        connection.execute(Trend.__table__.insert(), pending)
+                        trends += len(pending)
+                        pending = []
+            log.info("Generated client %s/%s", client_idx + 1, clients)
+        if pending:
+            connection.execute(Trend.__table__.insert(), pending)
+            trends += len(pending)
+    return trends
+
+
+def run():
+    """Generate the data set"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--websites", type=int, default=5, help="websites per client")
+    parser.add_argument("--keywords", type=int, default=5, help="keywords per website")
+    parser.add_argument("--days", type=int, default=365, help="days of trends per keyword and engine")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rollups", action="store_true", help="also backfill the trend rollups")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI", "sqlite:////tmp/serpbot_benchmark.sqlite")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        trends = generate(db.engine, args.clients, args.websites, args.keywords, args.days, args.seed)
+        log.info("Generated %s trends", trends)
+        if args.rollups:
+            backfill_rollups(db.engine)
+
+
+if __name__ == "__main__":
+    run()
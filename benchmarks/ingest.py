@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Measure trend ingestion throughput, in messages per second, against an SQS stand-in and a local database"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from src.config import app, db
+from src.lib.ingest import TrendIngester
+from fakes import FakeSQS
+
+log = logging.getLogger(__name__)
+
+MESSAGES = int(os.environ.get("BENCHMARK_MESSAGES", 20000))
+KEYWORDS = int(os.environ.get("BENCHMARK_KEYWORDS", 500))
+QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/000000000000/benchmark"
+
+
+def run():
+    """Run the benchmark"""
+    random.seed(0)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI", "sqlite:////tmp/serpbot_ingest.sqlite")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    sqs, queue_url = FakeSQS(), QUEUE_URL
+
+    today = date.today()
+    for offset in range(0, MESSAGES, 10):
+        entries = [{"Id": str(idx), "MessageBody": json.dumps({
+            "keyword": "keyword-%s" % random.randrange(KEYWORDS), "engine": random.choice(["google", "bing"]),
+            "date": (today - timedelta(days=random.randrange(365))).isoformat(),
+            "position": random.randrange(-1, 100)})} for idx in range(min(10, MESSAGES - offset))]
+        sqs.send_message_batch(QueueUrl=queue_url, Entries=entries)
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        ingester = TrendIngester(sqs, queue_url, db.engine,
+                                 batch_size=int(os.environ.get("INGEST_BATCH_SIZE", 500)),
+                                 receivers=int(os.environ.get("INGEST_RECEIVERS", 2)),
+                                 writers=int(os.environ.get("INGEST_WRITERS", 1)),
+                                 max_pending=int(os.environ.get("INGEST_MAX_PENDING", 5000)),
+                                 wait_time=1, flush_interval=0.1)
+        start = time.perf_counter()
+        ingester.start()
+        while ingester.ingested < MESSAGES:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        ingester.stop()
+        rows = db.session.execute("SELECT COUNT(*) FROM trends").scalar()
+
+    log.info("Ingested %s messages into %s trends in %.2f s: %.0f messages/s", MESSAGES, rows, elapsed,
+             MESSAGES / elapsed)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Compare a 10k keyword import diffed with set operations and written in bulk with the former per object diff of
+update_website, on a fresh website and on one whose keywords are half replaced
+"""
+
+import os
+import sys
+import time
+import logging
+from uuid import uuid4
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from src.config import app, db
+from src.lib.keywords import apply_keyword_diff, diff_keywords, get_keyword_rows
+from src.model.orm import Client, Keyword, Website
+
+log = logging.getLogger(__name__)
+
+KEYWORDS = int(os.environ.get("BENCHMARK_KEYWORDS", 10000))
+
+
+def import_per_object(website_id, names):
+    """Diff and write keywords the way update_website used to, one orm object at a time"""
+    website = Website.query.get(website_id)
+    existing = []
+    for keyword in website.keywords:
+        existing.append(keyword.name)
+        if keyword.name not in names:
+            db.session.delete(keyword)
+    for name in names:
+        if name not in existing:
+            db.session.add(Keyword(id=str(uuid4()), name=name, websiteId=website_id))
+    db.session.commit()
+
+
+def import_set_based(website_id, names):
+    """Diff keywords with set operations, then write them in a single delete and chunked inserts"""
+    added, removed = diff_keywords(get_keyword_rows(db.session, website_id), set(names))
+    apply_keyword_diff(db.session, website_id, added, removed)
+    db.session.commit()
+
+
+def measure(func, website_id, names):
+    """Get the duration of an import, in ms"""
+    start = time.perf_counter()
+    func(website_id, names)
+    duration = (time.perf_counter() - start) * 1000
+    db.session.remove()
+    if sorted(row.name for row in get_keyword_rows(db.session, website_id)) != sorted(names):
+        raise AssertionError("The import did not leave the website with the imported keywords")
+    return duration
+
+
+def run():
+    """Run the benchmark"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI", "sqlite:////tmp/serpbot_keywords.sqlite")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+
+    first = ["keyword %s" % idx for idx in range(KEYWORDS)]
+    # Half of the keywords are kept, the other half replaced
+    second = first[::2] + ["other keyword %s" % idx for idx in range(KEYWORDS // 2)]
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(Client(username="benchmark", email="benchmark@serpbot.io"))
+        for name in ("per_object", "set_based"):
+            db.session.add(Website(id=name, domain="%s.com" % name, username="benchmark"))
+        db.session.commit()
+
+        for label, names in (("fresh website", first), ("half replaced", second)):
+            per_object = measure(import_per_object, "per_object", names)
+            set_based = measure(import_set_based, "set_based", names)
+            log.info("%s keywords, %s: per object %.0f ms, set based %.0f ms (%.1fx faster)", KEYWORDS, label,
+                     per_object, set_based, per_object / set_based)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Closed loop http load generator: keeps a fixed number of requests in flight against running servers and reports
+throughput and latency percentiles, to compare serving configurations such as:
+
+    gunicorn --config gunicorn_config.py --chdir src server:app
+    gunicorn --config gunicorn_async_config.py --chdir src server:app
+"""
+
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+import http.client
+from urllib.parse import urlsplit
+
+log = logging.getLogger(__name__)
+
+
+def percentile(durations, fraction):
+    """Get a percentile of sorted durations"""
+    if not durations:
+        return 0
+    return durations[min(len(durations) - 1, int(len(durations) * fraction))]
+
+
+def summarize(durations, errors, elapsed):
+    """Get the throughput and latency percentiles, in ms, of request durations"""
+    durations = sorted(durations)
+    return {"requests": len(durations), "errors": errors, "throughput": len(durations) / elapsed,
+            "p50": percentile(durations, 0.50) * 1000, "p95": percentile(durations, 0.95) * 1000,
+            "p99": percentile(durations, 0.99) * 1000}
+
+
+def load(url, concurrency, duration, headers=None):
+    """Keep concurrency requests in flight against url for duration seconds"""
+    parts = urlsplit(url)
+    path = parts.path + ("?" + parts.query if parts.query else "")
+    deadline = time.perf_counter() + duration
+    durations = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def client():
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        samples = []
+        failures = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers=headers or {})
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 500:
+                    failures += 1
+                    continue
+                samples.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                failures += 1
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+        with lock:
+            durations.extend(samples)
+            errors[0] += failures
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(durations, errors[0], time.perf_counter() - start)
+
+
+def run():
+    """Run the load test"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url", nargs="+", help="urls to load, one after the other")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--header", action="append", default=[], help="header sent with every request, as Name: value")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    headers = dict(header.split(": ", 1) for header in args.header)
+
+    report = []
+    for url in args.url:
+        for concurrency in args.concurrency:
+            result = load(url, concurrency, args.duration, headers)
+            result.update(url=url, concurrency=concurrency)
+            log.info("%s with %s in flight: %.0f req/s, p50 %.1f ms, p95 %.1f ms, p99 %.1f ms, %s errors", url,
+                     concurrency, result["throughput"], result["p50"], result["p95"], result["p99"], result["errors"])
+            report.append(result)
+    json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Measure the throughput, latency percentiles and database queries of the api endpoints against a local database,
+with stand-ins for cognito, its jwks and hcaptcha. The report is written as json, to be compared with a stored
+baseline by benchmarks/compare.py:
+
+    python3 benchmarks/run.py --output report.json
+    python3 benchmarks/compare.py baseline.json report.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import platform
+import argparse
+import tempfile
+import threading
+from uuid import uuid4
+from datetime import date, datetime
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from fakes import JWTSigner, HCaptchaHandler, get_cognito_handler, start_server
+from generate import generate, get_username
+from load import summarize
+
+log = logging.getLogger(__name__)
+
+APP_CLIENT_ID = "benchmark"
+ENGINES = ["google", "bing"]
+
+
+def get_scenarios():
+    """Get the requests of every measured endpoint, as functions of a random generator and a user"""
+    def trend(query):
+        return lambda rng, user: {"path": "/trend/%s/%s?%s" % (rng.choice(user["websites"]), rng.choice(ENGINES),
+                                                               query),
+                                  "headers": user["headers"]}
+
+    return {
+        "trend_7d": trend("period=7d"),
+        "trend_30d": trend("period=30d"),
+        "trend_all": trend("period=all"),
+        "trend_all_100_points": trend("period=all&points=100"),
+        "dashboard_30d": lambda rng, user: {"path": "/dashboard?period=30d", "headers": user["headers"]},
+        "movers_7d": lambda rng, user: {"path": "/movers?period=7d", "headers": user["headers"]},
+        "websites": lambda rng, user: {"path": "/website", "headers": user["headers"]},
+        "websites_page": lambda rng, user: {"path": "/website?limit=20&includeKeywords=false",
+                                            "headers": user["headers"]},
+        "website": lambda rng, user: {"path": "/website/%s" % rng.choice(user["websites"]),
+                                      "headers": user["headers"]},
+        "login": lambda rng, user: {"path": "/login", "method": "POST",
+                                    "json": {"username": user["username"], "password": "benchmark",
+                                             "recaptcha": str(uuid4())}},
+    }
+
+
+def configure(database_uri):
+    """Start the stand-ins and point the app configuration at them, returns the jwt signer"""
+    signer = JWTSigner(APP_CLIENT_ID)
+    jwks_path = os.path.join(tempfile.mkdtemp(prefix="serpbot-benchmark-"), "jwks.json")
+    signer.write_jwks(jwks_path)
+    cognito_url = start_server(get_cognito_handler(signer))[1]
+    hcaptcha_url = start_server(HCaptchaHandler)[1]
+    os.environ.update(DATABASE_URI=database_uri, COGNITO_REGION="us-east-1", COGNITO_USERPOOL_ID="us-east-1_benchmark",
+                      COGNITO_APP_CLIENT_ID=APP_CLIENT_ID, COGNITO_APP_CLIENT_SECRET="benchmark",
+                      COGNITO_ENDPOINT_URL=cognito_url, COGNITO_JWKS_URL=jwks_path, HCAPTCHA_URL=hcaptcha_url,
+                      HCAPTCHA_SECRET="benchmark", HCAPTCHA_SITE_KEY="benchmark")
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+    return signer
+
+
+def get_users(db, signer):
+    """Get the generated users with their websites and a signed token"""
+    from src.model.orm import Website
+    users = {}
+    for website in Website.query.order_by(Website.id):
+        user = users.setdefault(website.username, {"username": website.username, "websites": [], "headers": {
+            "Authorization": "Bearer %s" % signer.get_token(website.username)}})
+        user["websites"].append(website.id)
+    return list(users.values())
+
+
+def measure(app, db, users, scenario, requests, concurrency, warmup, seed):
+    """Send requests of a scenario from concurrency threads, returns its summary and queries per request"""
+    rng = random.Random(seed)
+    plans = [scenario(rng, rng.choice(users)) for _ in range(warmup + requests)]
+    client = app.test_client()
+    for plan in plans[:warmup]:
+        client.open(**plan)
+
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    durations = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker(plans):
+        client = app.test_client()
+        samples = []
+        failures = 0
+        for plan in plans:
+            start = time.perf_counter()
+            response = client.open(**plan)
+            if response.status_code != 200:
+                failures += 1
+                continue
+            samples.append(time.perf_counter() - start)
+        with lock:
+            durations.extend(samples)
+            errors[0] += failures
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        start = time.perf_counter()
+        threads = [threading.Thread(target=worker, args=(plans[warmup + idx::concurrency],), daemon=True)
+                   for idx in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    result = summarize(durations, errors[0], elapsed)
+    result["queries"] = queries[0] / requests
+    return result
+
+
+def run():
+    """Run the benchmark suite"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="path of the json report, stdout by default")
+    parser.add_argument("--endpoint", action="append", choices=sorted(get_scenarios()),
+                        help="endpoint to measure, every endpoint by default")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=20, help="requests per endpoint sent before measuring")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--generate", action="store_true", help="regenerate the data set even if it exists")
+    parser.add_argument("--clients", type=int, default=20)
+    parser.add_argument("--websites", type=int, default=5, help="websites per client")
+    parser.add_argument("--keywords", type=int, default=5, help="keywords per website")
+    parser.add_argument("--days", type=int, default=365, help="days of trends per keyword and engine")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    database_uri = os.environ.get("DATABASE_URI", "sqlite:////tmp/serpbot_benchmark.sqlite")
+    signer = configure(database_uri)
+    from src import server
+    from src.config import db
+    from src.lib.movers import compute_movers
+    from src.model.orm import Client
+    app = server.app
+
+    with app.app_context():
+        if args.generate or not db.inspect(db.engine).has_table("clients") or \
+                db.session.get(Client, get_username(args.clients - 1)) is None:
+            trends = generate(db.engine, args.clients, args.websites, args.keywords, args.days, args.seed)
+            log.info("Generated %s trends", trends)
+            with db.engine.begin() as connection:
+                log.info("Computed %s movers", compute_movers(connection, date.today()))
+        users = get_users(db, signer)
+
+        scenarios = get_scenarios()
+        report = {"meta": {"started": datetime.utcnow().isoformat() + "Z", "python": platform.python_version(),
+                           "database": db.engine.dialect.name, "seed": args.seed, "requests": args.requests,
+                           "concurrency": args.concurrency, "clients": len(users),
+                           "config": {key: app.config[key] for key in ("TREND_ROLLUPS", "TREND_CACHE_SIZE")}},
+                  "endpoints": {}}
+        for name in args.endpoint or scenarios:
+            result = measure(app, db, users, scenarios[name], args.requests, args.concurrency, args.warmup, args.seed)
+            log.info("%s: %.0f req/s, p50 %.1f ms, p95 %.1f ms, p99 %.1f ms, %.1f queries/request, %s errors",
+                     name, result["throughput"], result["p50"], result["p95"], result["p99"], result["queries"],
+                     result["errors"])
+            report["endpoints"][name] = result
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    run()
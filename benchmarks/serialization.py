@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Compare the precompiled serializers and pre-encoded responses with SerializerMixin and flask's json encoder"""
+
+import os
+import sys
+import time
+import random
+import logging
+from datetime import date, timedelta
+from http import HTTPStatus
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from flask import json
+from src.config import app, connex_app
+from src.lib.response import HttpResponse
+from src.lib.websites import website_serializer
+from src.model.orm import Website
+
+log = logging.getLogger(__name__)
+
+KEYWORDS = int(os.environ.get("BENCHMARK_KEYWORDS", 50))
+DAYS = int(os.environ.get("BENCHMARK_DAYS", 365))
+ROUNDS = int(os.environ.get("BENCHMARK_ROUNDS", 50))
+
+
+def measure(fn):
+    """Get the mean duration, in ms, of a call"""
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - start) * 1000 / ROUNDS
+
+
+def run():
+    """Run the benchmark"""
+    random.seed(0)
+    connex_app.add_api("serpbot.yaml")
+    labels = [date.today() - timedelta(days=day) for day in range(DAYS)]
+    trend = {"keywords": [{"label": "keyword %s" % idx, "data": [random.randrange(-1, 100) for _ in labels]}
+                          for idx in range(KEYWORDS)],
+             "labels": labels}
+    websites = [Website(id="website-%s" % idx, domain="domain-%s.com" % idx, username="benchmark")
+                for idx in range(KEYWORDS)]
+
+    with app.test_request_context():
+        def current_trend():
+            body = {"status": "success", "data": {"trend": trend}, "error": ""}
+            return app.response_class(json.dumps(body), mimetype="application/json")
+
+        def current_websites():
+            return [website.to_dict(only=("id", "domain", "username")) for website in websites]
+
+        results = [
+            ("trend chart, flask json", measure(current_trend)),
+            ("trend chart, HttpResponse", measure(lambda: HttpResponse().success(status=HTTPStatus.OK, trend=trend))),
+            ("websites, SerializerMixin", measure(current_websites)),
+            ("websites, ModelSerializer", measure(lambda: [website_serializer(website) for website in websites])),
+        ]
+    for name, duration in results:
+        log.info("%s: %.3f ms", name, duration)
+
+
+if __name__ == "__main__":
+    run()
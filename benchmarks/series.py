@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Compare the storage size and chart read latency of row per day trends with packed monthly series"""
+
+import os
+import sys
+import time
+import random
+import logging
+from datetime import date, timedelta
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from src.config import app, db
+from src.lib.series import backfill_series
+from src.lib.trends import build_trend_matrix, get_trend_store
+from src.model.orm import Website
+from generate import generate
+
+log = logging.getLogger(__name__)
+
+CLIENTS = int(os.environ.get("BENCHMARK_CLIENTS", 10))
+DAYS = int(os.environ.get("BENCHMARK_DAYS", 730))
+ROUNDS = int(os.environ.get("BENCHMARK_ROUNDS", 100))
+
+
+def get_table_size(connection, table):
+    """Get the bytes used by a table and its indexes"""
+    if connection.dialect.name == "mysql":
+        connection.execute(text("ANALYZE TABLE %s" % table))
+        return connection.execute(text(
+            "SELECT data_length + index_length FROM information_schema.TABLES"
+            " WHERE table_schema = DATABASE() AND table_name = :table"), {"table": table}).scalar()
+    return connection.execute(text(
+        "SELECT SUM(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = :table)"),
+        {"table": table}).scalar()
+
+
+def measure(store, websites, since):
+    """Get the mean duration, in ms, of reading and building a chart, with the charts built"""
+    rng = random.Random(0)
+    charts = []
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        charts.append(build_trend_matrix(store.get_rows(rng.choice(websites), rng.choice(["google", "bing"]), since)))
+    return (time.perf_counter() - start) * 1000 / ROUNDS, charts
+
+
+def run():
+    """Run the benchmark"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+    logging.getLogger("src.lib.series").setLevel(logging.WARNING)
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI", "sqlite:////tmp/serpbot_series.sqlite")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+
+    with app.app_context():
+        trends = generate(db.engine, clients=CLIENTS, days=DAYS)
+        backfill_series(db.engine)
+        with db.engine.connect() as connection:
+            series = connection.execute(text("SELECT COUNT(*) FROM trend_series")).scalar()
+            sizes = {table: get_table_size(connection, table) for table in ("trends", "trend_series")}
+        log.info("trends: %s rows, %.1f MB", trends, sizes["trends"] / 1e6)
+        log.info("trend_series: %s rows, %.1f MB (%.1fx smaller)", series, sizes["trend_series"] / 1e6,
+                 sizes["trends"] / sizes["trend_series"])
+
+        websites = [website.id for website in Website.query.all()]
+        for period, since in (("30d", date.today() - timedelta(days=30)), ("all", None)):
+            rows, row_charts = measure(get_trend_store("rows"), websites, since)
+            packed, packed_charts = measure(get_trend_store("packed"), websites, since)
+            if row_charts != packed_charts:
+                raise AssertionError("Packed series charts differ from the trends table charts")
+            log.info("period %s: rows %.2f ms/chart, packed %.2f ms/chart (%.1fx faster)", period, rows, packed,
+                     rows / packed)
+
+
+if __name__ == "__main__":
+    run()
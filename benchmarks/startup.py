@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Measure the cold start of a worker: parsing the api spec, importing the app in a fresh interpreter, and the
+memory of workers importing it themselves against workers forked from a preloading master:
+
+    python3 benchmarks/startup.py --runs 10 --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+import subprocess
+import yaml
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from fakes import JWTSigner
+from src.lib.spec import SPEC_PATH, get_cache_path, load_spec, parse_spec
+
+log = logging.getLogger(__name__)
+
+SRC_PATH = os.path.join(os.path.abspath(os.path.dirname(__file__)), "..", "src")
+
+# Imports the app like gunicorn does, then reports its import time and memory, from every worker when it forks
+WORKER = """
+import os, sys, json, time
+start = time.perf_counter()
+sys.path.insert(0, ".")
+import server
+seconds = time.perf_counter() - start
+
+def report():
+    memory = {}
+    if os.path.exists("/proc/self/smaps_rollup"):
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if parts[0] in ("Rss:", "Pss:", "Private_Dirty:"):
+                    memory[parts[0][:-1].lower()] = int(parts[1])
+    # One write per report, so that the reports of forked workers do not interleave
+    os.write(1, (json.dumps(dict(seconds=seconds, boto3="boto3" in sys.modules, **memory)) + "\\n").encode())
+
+workers = int(sys.argv[1])
+if not workers:
+    report()
+children = []
+for _ in range(workers):
+    pid = os.fork()
+    if pid == 0:
+        server.reset_after_fork()
+        report()
+        os._exit(0)
+    children.append(pid)
+for pid in children:
+    os.waitpid(pid, 0)
+"""
+
+
+def timeit(func, runs):
+    """Get the median duration of func, in ms"""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def start_workers(env, workers=0):
+    """Import the app in a fresh interpreter, forking workers from it when workers is set, returns their reports"""
+    output = subprocess.run([sys.executable, "-c", WORKER, str(workers)], cwd=SRC_PATH, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+
+
+def summarize(reports):
+    """Get the median of every measure of worker reports"""
+    return {key: statistics.median(report[key] for report in reports)
+            for key in reports[0] if not isinstance(reports[0][key], bool)}
+
+
+def run():
+    """Run the startup benchmark"""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] serpbot %(message)s",
+                        datefmt="%Y-%m-%d %H:%M:%S")
+
+    jwks_path = os.path.join(tempfile.mkdtemp(prefix="serpbot-startup-"), "jwks.json")
+    JWTSigner("benchmark").write_jwks(jwks_path)
+    env = dict(os.environ, DATABASE_URI="sqlite://", COGNITO_REGION="us-east-1",
+               COGNITO_USERPOOL_ID="us-east-1_benchmark", COGNITO_APP_CLIENT_ID="benchmark",
+               COGNITO_JWKS_URL=jwks_path)
+    report = {}
+
+    with open(SPEC_PATH, "rb") as f:
+        source = f.read()
+    load_spec(SPEC_PATH)
+    report["spec_ms"] = {"yaml_pure_python": timeit(lambda: yaml.safe_load(source), args.runs),
+                         "yaml_libyaml": timeit(lambda: parse_spec(source), args.runs),
+                         "json_copy": timeit(lambda: load_spec(SPEC_PATH), args.runs)}
+    log.info("Spec: pure python yaml %(yaml_pure_python).1f ms, libyaml %(yaml_libyaml).1f ms, "
+             "json copy %(json_copy).1f ms", report["spec_ms"])
+
+    # The first boot parses the yaml and writes the json copy every following boot loads
+    first = []
+    for _ in range(args.runs):
+        os.remove(get_cache_path(SPEC_PATH))
+        first.extend(start_workers(env))
+    cached = []
+    for _ in range(args.runs):
+        cached.extend(start_workers(env))
+    report["import"] = {"first_boot": summarize(first), "cached_spec": summarize(cached),
+                        "boto3_imported": any(worker["boto3"] for worker in first + cached)}
+    log.info("Import: first boot %.0f ms, with the cached spec %.0f ms, boto3 imported: %s",
+             report["import"]["first_boot"]["seconds"] * 1000, report["import"]["cached_spec"]["seconds"] * 1000,
+             report["import"]["boto3_imported"])
+
+    own = []
+    for _ in range(args.workers):
+        own.extend(start_workers(env))
+    forked = start_workers(env, args.workers)
+    report["workers"] = {"own_import": summarize(own), "preloaded": summarize(forked)}
+    if "private_dirty" in forked[0]:
+        log.info("Private memory per worker: %.0f kB importing the app, %.0f kB forked from a preloading master",
+                 report["workers"]["own_import"]["private_dirty"], report["workers"]["preloaded"]["private_dirty"])
+    json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,28 @@
+import os
+import shutil
+import tempfile
+
+# Opt-in cooperative mode: each worker serves many requests concurrently on gevent, waiting on MySQL,
+# Cognito and hCaptcha without holding a thread. The database goes through the pure python PyMySQL driver
+# so that gevent can patch its sockets
+bind = "0.0.0.0:5000"
+workers = 4
+worker_class = "gevent"
+worker_connections = 256
+timeout = 120
+raw_env = ["DATABASE_DRIVER=mysql+pymysql", "DATABASE_POOL_SIZE=32", "DATABASE_MAX_OVERFLOW=32"]
+
+# Workers share their prometheus metrics through the files of this directory
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "serpbot-metrics"))
+
+
+def on_starting(server):
+    """Empty the metrics of the previous run"""
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of an exited worker"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
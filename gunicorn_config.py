@@ -1,4 +1,39 @@
+import os
+import shutil
+import tempfile
+
 bind = "0.0.0.0:5000"
 workers = 4
 threads = 4
-timeout = 120
\ No newline at end of file
+timeout = 120
+
+# One database connection per thread, with a little overflow for the odd burst, so that 4 workers hold 16 to 24
+os.environ.setdefault("DATABASE_POOL_SIZE", str(threads))
+os.environ.setdefault("DATABASE_MAX_OVERFLOW", "2")
+# One hCaptcha connection per thread, as every thread validates the captchas of its own requests
+os.environ.setdefault("HCAPTCHA_POOL_SIZE", str(threads))
+
+# Import the app once in the master, so that workers start faster and share its memory copy-on-write
+preload_app = os.environ.get("GUNICORN_PRELOAD") == "True"
+
+# Workers share their prometheus metrics through the files of this directory
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "serpbot-metrics"))
+
+
+def on_starting(server):
+    """Empty the metrics of the previous run"""
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def post_fork(server, worker):
+    """Restart the threads and database connections a worker cannot share with a preloading master"""
+    if server.cfg.preload_app:
+        import server as serpbot
+        serpbot.reset_after_fork()
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of an exited worker"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -3,5 +3,5 @@ import yaml
 import logging.config
 
 with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "logging.yaml"), "r") as f:
-    log_cfg = yaml.safe_load(f.read())
+    log_cfg = yaml.load(f.read(), Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
     logging.config.dictConfig(log_cfg)
\ No newline at end of file
@@ -5,6 +5,8 @@ import os
 import logging
 from config import app
 from model.orm import db, Client
+from src import migrations
+from src.lib.partitions import partition_trends
 
 log = logging.getLogger(__name__)
 
@@ -21,6 +23,9 @@ def run():
     db.init_app(app)
     with app.app_context():
         db.create_all()
+        with db.engine.begin() as connection:
+            partition_trends(connection, int(os.environ.get("TREND_PARTITIONS_AHEAD", 3)))
+        migrations.stamp(db.engine)
         db.session.add(Client(username="nicolas", email="temp@onintime.com"))
         db.session.commit()
 
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Backfill trend rollups from the trends table"""
+
+import os
+import logging
+from config import app
+from src.model.orm import db
+from src.lib.versions import TRENDS_VERSION, bump_versions
+from src.lib.rollups import backfill_rollups
+
+log = logging.getLogger(__name__)
+
+
+def run():
+    """Runtime configuration of flask"""
+    app.config['SQLALCHEMY_DATABASE_URI'] = "mysql://%s:%s@%s/%s" % \
+                                            (os.environ.get("DATABASE_USERNAME"),
+                                             os.environ.get("DATABASE_PASSWORD"),
+                                             os.environ.get("DATABASE_HOST"),
+                                             os.environ.get("DATABASE_NAME"))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        backfill_rollups(db.engine)
+        with db.engine.begin() as connection:
+            bump_versions(connection, [TRENDS_VERSION])
+
+
+if __name__ == "__main__":
+    run()
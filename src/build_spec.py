@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""Build the json copy of the api spec, so that workers start without parsing its yaml"""
+
+import os
+import sys
+import logging
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from src.lib.spec import SPEC_PATH, build_spec_cache, get_cache_path
+
+log = logging.getLogger(__name__)
+
+
+def run():
+    """Write the json copy of the spec next to it"""
+    build_spec_cache(SPEC_PATH)
+    log.info("Built %s", get_cache_path(SPEC_PATH))
+
+
+if __name__ == "__main__":
+    run()
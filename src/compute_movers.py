@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Compute the keyword movers of a day from the trends table, to be run once the ranks of the day are ingested"""
+
+import os
+import logging
+import argparse
+from datetime import date, timedelta
+from config import app
+from src.model.orm import db
+from src.lib.movers import compute_movers
+
+log = logging.getLogger(__name__)
+
+
+def run():
+    """Runtime configuration of flask"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(),
+                        help="last day computed, as YYYY-MM-DD, today by default")
+    parser.add_argument("--days", type=int, default=1, help="days computed up to the last one, to backfill movers")
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URI") or "mysql://%s:%s@%s/%s" % \
+                                            (os.environ.get("DATABASE_USERNAME"),
+                                             os.environ.get("DATABASE_PASSWORD"),
+                                             os.environ.get("DATABASE_HOST"),
+                                             os.environ.get("DATABASE_NAME"))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        for offset in reversed(range(args.days)):
+            day = args.date - timedelta(days=offset)
+            with db.engine.begin() as connection:
+                movers = compute_movers(connection, day)
+            log.info("Computed %s movers for %s", movers, day)
+
+
+if __name__ == "__main__":
+    run()
@@ -5,13 +5,17 @@ import os
 import sys
 import secrets
 import connexion
-from flask_sqlalchemy import SQLAlchemy
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
 from src.lib.flask_cognito import CognitoAuth
+from src.lib.metrics import Metrics
+from src.lib.routing import RoutingSQLAlchemy
+from src.lib.trend_cache import TrendCache
 
 connex_app  = connexion.App(__name__, specification_dir="./swagger/")
 app = connex_app.app
 
 cogauth = CognitoAuth()
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+trend_cache = TrendCache()
+metrics = Metrics()
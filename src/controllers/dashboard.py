@@ -0,0 +1,44 @@
+from datetime import date
+from http import HTTPStatus
+from flask import _request_ctx_stack
+
+from src.lib import dashboard
+from src.lib.conditional import add_validators, not_modified
+from src.lib.flask_cognito import cognito_auth_header_required_api, log
+from src.lib.response import HttpResponse
+from src.lib.routing import read_only
+from src.lib.trends import AGGREGATES, ENGINES, PERIODS, RESOLUTIONS, get_period_start
+from src.lib.versions import TRENDS_VERSION, get_user_version_name, get_validators
+
+
+@cognito_auth_header_required_api
+@read_only
+def get_dashboard(engines=None, period="all", resolution="day", aggregate="last"):
+    try:
+        engines = list(dict.fromkeys(engines)) if engines else list(ENGINES)
+        for engine in engines:
+            if engine not in ENGINES:
+                return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                              error="Invalid engine selected. Must be one of: google, bing")
+        if period not in PERIODS:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid period selected. Must be one of: 7d, 30d, all")
+        if resolution not in RESOLUTIONS:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid resolution selected. Must be one of: day, week, month")
+        if aggregate not in AGGREGATES:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid aggregate selected. Must be one of: best, average, last")
+
+        username = _request_ctx_stack.top.cogauth_username
+        # The period start moves with the day, so the day is part of the version
+        etag, last_modified = get_validators([get_user_version_name(username), TRENDS_VERSION], username, engines,
+                                             period, resolution, aggregate, date.today())
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        websites = dashboard.get_dashboard(username, engines, get_period_start(period), resolution, aggregate)
+        return add_validators(HttpResponse().success(status=HTTPStatus.OK, websites=websites), etag, last_modified)
+    except Exception as exception:
+        log.error("Unable to fetch dashboard: %s", exception)
+        return HttpResponse().failure(status=HTTPStatus.INTERNAL_SERVER_ERROR, error="Unable to process the request")
@@ -0,0 +1,39 @@
+from http import HTTPStatus
+from flask import _request_ctx_stack
+
+from src.lib import movers
+from src.lib.conditional import add_validators, not_modified
+from src.lib.flask_cognito import cognito_auth_header_required_api, log
+from src.lib.response import HttpResponse
+from src.lib.routing import read_only
+from src.lib.trends import ENGINES
+from src.lib.versions import MOVERS_VERSION, get_user_version_name, get_validators
+
+
+@cognito_auth_header_required_api
+@read_only
+def get_movers(engine="google", period="7d", limit=10):
+    try:
+        if engine not in ENGINES:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid engine selected. Must be one of: google, bing")
+        if period not in movers.MOVER_PERIODS:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid period selected. Must be one of: 1d, 7d, 30d")
+        if not 1 <= limit <= movers.MAX_MOVERS:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid limit selected. Must be between 1 and %s" %
+                                                movers.MAX_MOVERS)
+
+        username = _request_ctx_stack.top.cogauth_username
+        etag, last_modified = get_validators([get_user_version_name(username), MOVERS_VERSION], username, engine,
+                                             period, limit)
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        day, gainers, losers = movers.get_movers(username, engine, period, limit)
+        return add_validators(HttpResponse().success(status=HTTPStatus.OK, date=day, gainers=gainers, losers=losers),
+                              etag, last_modified)
+    except Exception as exception:
+        log.error("Unable to fetch movers: %s", exception)
+        return HttpResponse().failure(status=HTTPStatus.INTERNAL_SERVER_ERROR, error="Unable to process the request")
@@ -1,79 +1,95 @@
-import json
+from datetime import date, timedelta
 from http import HTTPStatus
-from flask import _request_ctx_stack
+from flask import Response, _request_ctx_stack, stream_with_context
 
-from sqlalchemy import and_, func
-from datetime import datetime, timedelta
+from src.config import db, trend_cache
 from src.lib.flask_cognito import cognito_auth_header_required_api, log
 from src.lib.response import HttpResponse
-from src.model.orm import Website, Trend
-
-MAX_RANK = 100
+from src.lib.routing import read_only
+from src.lib.conditional import add_validators, not_modified
+from src.lib.export import EXPORT_FORMATS, get_export_keywords, iter_export_rows
+from src.lib.trends import AGGREGATES, ENGINES, PERIODS, RESOLUTIONS, get_period_start, get_trend, \
+    get_trend_version
+from src.model.orm import Website
 
 
 @cognito_auth_header_required_api
-def get_trend_for_website(website_id, engine, period):
+@read_only
+def get_trend_for_website(website_id, engine, period="all", resolution=None, aggregate="last", points=None,
+                          **kwargs):
     try:
         website = Website.query.get(website_id)
         if website is None or website.username != _request_ctx_stack.top.cogauth_username:
             return HttpResponse().failure(status=HTTPStatus.NOT_FOUND, error="Website does not exist")
-        if engine != "google" and engine != "bing":
+        if engine not in ENGINES:
             return HttpResponse().failure(status=HTTPStatus.NOT_FOUND, error="Engine does not exist")
+        if period not in PERIODS:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid period selected. Must be one of: 7d, 30d, all")
+        if resolution is not None and resolution not in RESOLUTIONS:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid resolution selected. Must be one of: day, week, month")
+        if aggregate not in AGGREGATES:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid aggregate selected. Must be one of: best, average, last")
+        if points is not None and points < 1:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid points selected. Must be at least 1")
+        try:
+            start = date.fromisoformat(kwargs["from"]) if kwargs.get("from") else None
+            end = date.fromisoformat(kwargs["to"]) if kwargs.get("to") else None
+        except ValueError:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid date selected. Must be formatted as YYYY-MM-DD")
+        if start is not None and end is not None and start > end:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid dates selected. from must not be after to")
 
-        tempTrends = {}
-        result = {"keywords": [], "labels": []}
-        if website is not None:
-            for keyword in website.keywords:
-                if keyword.name not in tempTrends:
-                    tempTrends[keyword.name] = []
-
-                if period == "30d":
-                    thirty_days_ago = (datetime.today() - timedelta(days=30)).date()
-                    trends = Trend.query.filter(Trend.keyword == keyword.id, Trend.engine == engine,
-                                                Trend.date > thirty_days_ago).order_by(
-                        Trend.date).all()
-                elif period == "7d":
-                    seven_days_ago = (datetime.today() - timedelta(days=7)).date()
-                    trends = Trend.query.filter(Trend.keyword == keyword.id, Trend.engine == engine,
-                                                Trend.date > seven_days_ago).order_by(
-                        Trend.date).all()
-                elif period == "all":
-                    trends = Trend.query.filter(Trend.keyword == keyword.id, Trend.engine == engine).order_by(
-                        Trend.date).all()
-                else:
-                    return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
-                                                  error="Invalid period selected. Must be one of: 7d, 30d, all")
-
-                for trend in trends:
-                    if trend.date not in result["labels"]:
-                        result["labels"].append(trend.date)
-                    tempTrends[keyword.name].append({str(trend.date): trend.position})
-
-            result["labels"].sort()
+        since = start - timedelta(days=1) if start is not None else get_period_start(period)
+        if since is not None and end is not None and end <= since:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid dates selected. to must not be before the period start")
+        view = "%s:%s:%s:%s:%s" % (since, end, resolution, aggregate, points)
+        etag, last_modified = get_trend_version(website.id, engine, view)
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        trend = trend_cache.get(website.id, engine, view, etag)
+        if trend is None:
+            try:
+                trend = get_trend(website.id, engine, since, end, resolution, aggregate, points)
+            except ValueError as exception:
+                return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY, error=str(exception))
+            trend_cache.set(website.id, engine, view, etag, trend)
+        response = HttpResponse().success(status=HTTPStatus.OK, trend=trend)
+        return add_validators(response, etag, last_modified)
+    except Exception as exception:
+        log.error("Unable to fetch website (%s): %s", website_id, exception)
+        return HttpResponse().failure(status=HTTPStatus.INTERNAL_SERVER_ERROR, error="Unable to process the request")
 
-            # Initialize the result object with the keywords fetched for this domain
-            for keyword in tempTrends:
-                result["keywords"].append({"label": keyword, "data": []})
 
-            # Iterate through all dates found for all keywords for this domain
-            for date in result["labels"]:
-                # Iterate through the keywords to check if their rank has been fetched on this specific date
-                for keyword in tempTrends:
-                    rank = -1
-                    for tempTrend in tempTrends[keyword]:
-                        # Keyword has rank associated to it on this specific day
-                        if str(date) in tempTrend:
-                            # Keep track of the rank
-                            rank = tempTrend[str(date)] if tempTrend[str(date)] != -1 else MAX_RANK
-                            break
-                    for idx, data in enumerate(result["keywords"]):
-                        # Write the rank to the correct keyword in the result object
-                        if data["label"] == keyword:
-                            result["keywords"][idx]["data"].append(rank)
-                            break
-            return HttpResponse().success(status=HTTPStatus.OK, trend=result)
-        else:
+@cognito_auth_header_required_api
+@read_only
+def export_trends(website_id, format="csv", engine=None):
+    try:
+        website = Website.query.get(website_id)
+        if website is None or website.username != _request_ctx_stack.top.cogauth_username:
             return HttpResponse().failure(status=HTTPStatus.NOT_FOUND, error="Website does not exist")
+        if engine is not None and engine not in ENGINES:
+            return HttpResponse().failure(status=HTTPStatus.NOT_FOUND, error="Engine does not exist")
+        if format not in EXPORT_FORMATS:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid format selected. Must be one of: %s" %
+                                                ", ".join(EXPORT_FORMATS))
+
+        # Picked while the operation is marked read only, the rows are read from it once the view has returned
+        connection = db.session.connection()
+        keywords = get_export_keywords(connection, website.id)
+        content_type, write = EXPORT_FORMATS[format]
+        response = Response(stream_with_context(write(iter_export_rows(connection, keywords, engine))),
+                            content_type=content_type)
+        response.headers["Content-Disposition"] = "attachment; filename=\"%s.%s\"" % (website.domain, format)
+        return response
     except Exception as exception:
-        log.error("Unable to fetch website (%s): %s", id, exception)
+        log.error("Unable to export website (%s): %s", website_id, exception)
         return HttpResponse().failure(status=HTTPStatus.INTERNAL_SERVER_ERROR, error="Unable to process the request")
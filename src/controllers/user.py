@@ -12,15 +12,15 @@ log = logging.getLogger(__name__)
 
 
 def login(body):
-    """Handle login event"""
-    response = validate_input(body, CognitoUser.LOGIN_FIELDS)
+    """Handle login event, the captcha is validated first so that bots never reach cognito and its lockouts"""
+    response = validate_input(body, CognitoUser.LOGIN_FIELDS) or validate_captcha(body)
     if response is not None:
         return response
     return CognitoUser.initiate_auth(body["username"], body["password"])
 
 def signup(body):
-    """Handle signup event"""
-    response = validate_input(body, CognitoUser.SIGN_UP_FIELDS)
+    """Handle signup event, the captcha is validated first as a signup can't be undone"""
+    response = validate_input(body, CognitoUser.SIGN_UP_FIELDS) or validate_captcha(body)
     if response is not None:
         return response
     return CognitoUser.create_cognito_user(body["username"], body["password"], body["email"])
@@ -35,10 +35,15 @@ def validate_input(body, fields):
         if body.get(field) == "":
             return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
                                           error="Field (%s) is blank" % (field))
+    return None
+
+
+def validate_captcha(body):
+    """Validate the captcha of an event"""
     if current_app.config.get("TESTING"):
         return None
     if CognitoUser.validate_recaptcha(body["recaptcha"]):
-         return None
+        return None
     return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
                                   error="Invalid captcha provided")
 
@@ -1,35 +1,39 @@
 #!/usr/bin/env python3
 
+import io
 import logging
 from uuid import uuid4
 import validators
 from http import HTTPStatus
-from flask import _request_ctx_stack
+from flask import _request_ctx_stack, request
 from sqlalchemy import and_
+from src.config import trend_cache
+from src.lib import keywords, websites
+from src.lib.conditional import add_validators, not_modified
 from src.lib.response import HttpResponse
+from src.lib.routing import read_only
+from src.lib.versions import get_user_version_name, get_validators, get_website_version_name
 from src.model.orm import db, Website, Keyword
 from src.lib.flask_cognito import cognito_auth_header_required_api
 
 log = logging.getLogger(__name__)
 
-WEBSITE_LIMIT = 5
-KEYWORD_LIMIT = 5
 
 @cognito_auth_header_required_api
+@read_only
 def get_website(id):
     """
     Get website details handler
     """
     try:
-        website = Website.query.get(id)
-        if website is not None and website.username == _request_ctx_stack.top.cogauth_username:
-            keywords = []
-            for keyword in website.keywords:
-                keywords.append(keyword.name)
-            temp_website = website.to_dict()
-            temp_website["keywords"] = keywords
-            temp_website["numKeywords"] = len(keywords)
-            return HttpResponse().success(status=HTTPStatus.OK, website=temp_website)
+        username = _request_ctx_stack.top.cogauth_username
+        etag, last_modified = get_validators([get_website_version_name(id)], username, id)
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        website = websites.get_website(username, id)
+        if website is not None:
+            return add_validators(HttpResponse().success(status=HTTPStatus.OK, website=website), etag, last_modified)
         else:
             return HttpResponse().failure(status=HTTPStatus.NOT_FOUND, error="Website does not exist")
     except Exception as exception:
@@ -38,18 +42,32 @@ def get_website(id):
 
 
 @cognito_auth_header_required_api
-def get_all_websites():
-    websites = []
+@read_only
+def get_all_websites(limit=None, cursor=None, includeKeywords=True):
     try:
-        for website in Website.query.filter(Website.username == _request_ctx_stack.top.cogauth_username):
-            keywords = []
-            for keyword in website.keywords:
-                keywords.append(keyword.name)
-            temp_website = website.to_dict()
-            temp_website["keywords"] = keywords
-            temp_website["numKeywords"] = len(keywords)
-            websites.append(temp_website)
-        return HttpResponse().success(status=HTTPStatus.OK, websites=websites)
+        if limit is not None and not 1 <= limit <= websites.MAX_PAGE_SIZE:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid limit selected. Must be between 1 and %s" %
+                                                websites.MAX_PAGE_SIZE)
+        username = _request_ctx_stack.top.cogauth_username
+        etag, last_modified = get_validators([get_user_version_name(username)], username, limit, cursor,
+                                             includeKeywords)
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
+        try:
+            if limit is None and cursor is None and includeKeywords:
+                # The whole listing with keyword names is read in a single query
+                page, next_cursor = websites.get_websites(username), None
+            else:
+                page, next_cursor = websites.get_website_page(username, limit, cursor, includeKeywords)
+        except ValueError:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY, error="Invalid cursor provided")
+        if limit is not None:
+            response = HttpResponse().success(status=HTTPStatus.OK, websites=page, nextCursor=next_cursor)
+        else:
+            response = HttpResponse().success(status=HTTPStatus.OK, websites=page)
+        return add_validators(response, etag, last_modified)
     except Exception as exception:
         log.error("Unable to fetch websites: %s", exception)
         return HttpResponse().failure(status=HTTPStatus.INTERNAL_SERVER_ERROR, error="Unable to process the request")
@@ -63,18 +81,21 @@ def add_website(body):
             domain = Website.query.filter(and_(Website.domain == body["domain"], Website.username == _request_ctx_stack.top.cogauth_username)).one_or_none()
             if domain is None:
                 # Check if limit is reached
+                website_limit, keyword_limit = keywords.get_limits(_request_ctx_stack.top.cogauth_username)
                 num_websites = Website.query.filter(Website.username == _request_ctx_stack.top.cogauth_username).count()
-                if num_websites >= WEBSITE_LIMIT:
-                    return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY, error="Reached website limit (%s)" % (WEBSITE_LIMIT))
-
-                keywords = []
-                for keyword in {k for k in body["keywords"]}:
-                    if keyword == "":
-                        return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
-                                                      error="Keyword cannot be blank")
-                    keywords.append(Keyword(id=uuid4(), name=keyword))
-                db.session.add(Website(id=uuid4(), domain=body["domain"], username=_request_ctx_stack.top.cogauth_username,
-                                       keywords=keywords))
+                if num_websites >= website_limit:
+                    return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY, error="Reached website limit (%s)" % (website_limit))
+                try:
+                    names = {keywords.validate_keyword(keyword) for keyword in body["keywords"]}
+                except ValueError as exception:
+                    return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY, error=str(exception))
+                if len(names) > keyword_limit:
+                    return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                                  error="Reached keyword limit (%s)" % (keyword_limit))
+
+                new_keywords = [Keyword(id=str(uuid4()), name=keyword) for keyword in names]
+                db.session.add(Website(id=str(uuid4()), domain=body["domain"], username=_request_ctx_stack.top.cogauth_username,
+                                       keywords=new_keywords))
                 db.session.commit()
                 return HttpResponse().success(status=HTTPStatus.OK)
             else:
@@ -93,6 +114,7 @@ def delete_website(id):
         if website.username == _request_ctx_stack.top.cogauth_username:
             db.session.delete(Website.query.get(id))
             db.session.commit()
+            trend_cache.invalidate(id)
             return HttpResponse().success(status=HTTPStatus.OK)
         else:
             return HttpResponse().failure(status=HTTPStatus.FORBIDDEN,
@@ -111,25 +133,20 @@ def update_website(id, body):
             return HttpResponse().failure(HTTPStatus.NOT_FOUND, error="Website does not exist")
         elif website.username == _request_ctx_stack.top.cogauth_username:
             # Check if limit is reached
-            if len(body["keywords"]) >= KEYWORD_LIMIT:
+            try:
+                names = {keywords.validate_keyword(keyword) for keyword in body["keywords"]}
+            except ValueError as exception:
+                return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY, error=str(exception))
+            keyword_limit = keywords.get_limits(website.username)[1]
+            if len(names) > keyword_limit:
                 return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
-                                              error="Reached keyword limit (%s)" % (KEYWORD_LIMIT))
-
-            # Remove unwanted keywords
-            temp_keywords = []
-            for keyword in website.keywords:
-                temp_keywords.append(keyword.name)
-                if keyword.name not in body["keywords"]:
-                    db.session.delete(keyword)
-
-            # Add missing keywords
-            for keyword in body["keywords"]:
-                if keyword == "":
-                    return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
-                                                  error="Keyword cannot be blank")
-                if keyword not in temp_keywords:
-                    db.session.add(Keyword(id=uuid4(), name=keyword, websiteId=website.id))
+                                              error="Reached keyword limit (%s)" % (keyword_limit))
+
+            # Remove unwanted keywords and add missing ones
+            added, removed = keywords.diff_keywords(keywords.get_keyword_rows(db.session, website.id), names)
+            keywords.apply_keyword_diff(db.session, website.id, added, removed)
             db.session.commit()
+            trend_cache.invalidate(website.id)
             return HttpResponse().success(HTTPStatus.OK)
         else:
             return HttpResponse().failure(status=HTTPStatus.FORBIDDEN,
@@ -137,3 +154,46 @@ def update_website(id, body):
     except Exception as exception:
         log.error("Unable to update website (%s): %s", id, exception)
         return HttpResponse().failure(status=HTTPStatus.INTERNAL_SERVER_ERROR, error="Unable to process the request")
+
+
+@cognito_auth_header_required_api
+def import_keywords(id, body=None, mode="replace"):
+    """
+    Import the keywords of a website from a csv or ndjson upload, replacing its keywords or appending to them
+    """
+    try:
+        if mode not in keywords.IMPORT_MODES:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid mode selected. Must be one of: %s" %
+                                                ", ".join(keywords.IMPORT_MODES))
+        if request.mimetype not in keywords.IMPORT_FORMATS:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Invalid content type provided. Must be one of: %s" %
+                                                ", ".join(keywords.IMPORT_FORMATS))
+        website = Website.query.get(id)
+        if website is None:
+            return HttpResponse().failure(HTTPStatus.NOT_FOUND, error="Website does not exist")
+        if website.username != _request_ctx_stack.top.cogauth_username:
+            return HttpResponse().failure(status=HTTPStatus.FORBIDDEN,
+                                          error="User does not have access to provided resource")
+        keyword_limit = keywords.get_limits(website.username)[1]
+        try:
+            # connexion has already read the upload, bounded by MAX_CONTENT_LENGTH. It is still parsed a line at a
+            # time, and no further than the keyword limit since the website cannot end up with fewer keywords
+            names = keywords.read_keywords(io.BytesIO(request.get_data()), request.mimetype, limit=keyword_limit)
+        except ValueError as exception:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY, error=str(exception))
+
+        rows = keywords.get_keyword_rows(db.session, website.id)
+        added, removed = keywords.diff_keywords(rows, names, replace=mode == "replace")
+        if len(rows) + len(added) - len(removed) > keyword_limit:
+            return HttpResponse().failure(status=HTTPStatus.UNPROCESSABLE_ENTITY,
+                                          error="Reached keyword limit (%s)" % (keyword_limit))
+        keywords.apply_keyword_diff(db.session, website.id, added, removed)
+        db.session.commit()
+        trend_cache.invalidate(website.id)
+        return HttpResponse().success(status=HTTPStatus.OK, added=len(added), removed=len(removed),
+                                      numKeywords=len(rows) + len(added) - len(removed))
+    except Exception as exception:
+        log.error("Unable to import keywords (%s): %s", id, exception)
+        return HttpResponse().failure(status=HTTPStatus.INTERNAL_SERVER_ERROR, error="Unable to process the request")
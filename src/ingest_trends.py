@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Ingest ranks from the SQS queue into the trends table"""
+
+import os
+import signal
+import logging
+import threading
+import boto3
+from config import app
+from src.config import trend_cache
+from src.model.orm import db
+from src.lib.ingest import TrendIngester
+
+log = logging.getLogger(__name__)
+
+
+def run():
+    """Runtime configuration of flask"""
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URI") or "mysql://%s:%s@%s/%s" % \
+                                            (os.environ.get("DATABASE_USERNAME"),
+                                             os.environ.get("DATABASE_PASSWORD"),
+                                             os.environ.get("DATABASE_HOST"),
+                                             os.environ.get("DATABASE_NAME"))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TREND_CACHE_STORE_URL'] = os.environ.get("TREND_CACHE_STORE_URL")
+    db.init_app(app)
+    trend_cache.init_app(app)
+
+    sqs = boto3.client("sqs", region_name=os.environ.get("SQS_REGION"), endpoint_url=os.environ.get("SQS_ENDPOINT_URL"))
+    queue_url = sqs.get_queue_url(QueueName=os.environ.get("SQS_NAME"))["QueueUrl"]
+    dead_letter_url = sqs.get_queue_url(QueueName=os.environ.get("SQS_DEAD_LETTER_NAME"))["QueueUrl"] \
+        if os.environ.get("SQS_DEAD_LETTER_NAME") else None
+    with app.app_context():
+        ingester = TrendIngester(sqs, queue_url, db.engine,
+                                 batch_size=int(os.environ.get("INGEST_BATCH_SIZE", 500)),
+                                 receivers=int(os.environ.get("INGEST_RECEIVERS", 2)),
+                                 writers=int(os.environ.get("INGEST_WRITERS", 1)),
+                                 max_pending=int(os.environ.get("INGEST_MAX_PENDING", 5000)),
+                                 cache=trend_cache if trend_cache.store is not None else None,
+                                 rollups=os.environ.get("TREND_ROLLUPS") == "True",
+                                 series=os.environ.get("TREND_STORAGE") == "packed",
+                                 dead_letter_url=dead_letter_url)
+        stopped = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: stopped.set())
+        signal.signal(signal.SIGINT, lambda *args: stopped.set())
+        log.info("Ingesting ranks from %s", queue_url)
+        ingester.start()
+        stopped.wait()
+        log.info("Stopping, flushing received ranks")
+        ingester.stop()
+        log.info("Ingested %s messages, rejected %s", ingester.ingested, ingester.rejected)
+
+
+if __name__ == "__main__":
+    run()
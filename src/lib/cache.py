@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""In-process caches"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache():
+    """Thread safe, size bounded lru cache whose entries can expire"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Get the value of a key, default when it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, expires_at=None):
+        """Set the value of a key until the expires_at timestamp, evicting the least recently used keys"""
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        """Remove a key"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove every key"""
+        with self._lock:
+            self._entries.clear()
+
+
+class MemoryStore():
+    """In-memory stand-in for a shared cache store"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the bytes of a key, None when it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        """Set the bytes of a key for ttl seconds"""
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+
+    def incr(self, key):
+        """Increment the integer of a key, returns the new value"""
+        with self._lock:
+            value = int(self._entries.get(key, (0, None))[0]) + 1
+            self._entries[key] = (value, None)
+            return value
+
+
+class RedisStore():
+    """Shared cache store backed by redis"""
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        """Get the bytes of a key, None when it is missing or expired"""
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        """Set the bytes of a key for ttl seconds"""
+        self.client.set(key, value, ex=ttl)
+
+    def incr(self, key):
+        """Increment the integer of a key, returns the new value"""
+        return self.client.incr(key)
+
+
+def get_store(url):
+    """Get the shared cache store of an url, memory:// for the in-memory stand-in, None when url is empty"""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryStore()
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisStore(url)
+    raise ValueError("Unsupported cache store: %s" % url)
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""hCaptcha verifier"""
+
+import time
+import hashlib
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from .cache import LRUCache
+from .metrics import timed
+
+log = logging.getLogger(__name__)
+
+
+class CaptchaVerifier():
+    """hCaptcha verifier sharing keep-alive connections and remembering the tokens it rejected"""
+
+    def __init__(self, url, secret, sitekey, timeout, cache_size=1024, cache_ttl=120, pool_size=4):
+        self.url = url
+        self.secret = secret
+        self.sitekey = sitekey
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache = LRUCache(cache_size)
+        self.session = requests.Session()
+        # One keep-alive connection per request thread of the worker, which all validate through this session
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def validate(self, token):
+        """Validate hcaptcha token"""
+        key = hashlib.sha256(str(token).encode("utf-8")).hexdigest()
+        # Only rejections are remembered, an accepted token is checked again so that it cannot be replayed
+        if self.cache.get(key) is not None:
+            return False
+        params = {"secret": self.secret, "response": token, "sitekey": self.sitekey}
+        try:
+            with timed("hcaptcha", "siteverify"):
+                success = self.session.post(self.url, data=params, timeout=self.timeout).json()["success"]
+        except Exception as exception:
+            log.warning("Unable to validate hcaptcha with token (%s): %s", token, exception)
+            return False
+        if not success:
+            self.cache.set(key, False, expires_at=time.time() + self.cache_ttl)
+        return success
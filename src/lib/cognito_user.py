@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
 """Boto3 user handler"""
 
+import os
 import logging.config
 import hashlib
 import hmac
 import base64
+import threading
 from http import HTTPStatus
-import requests
-import boto3
 from flask import current_app
 from src.config import db
 from src.model.orm import Client
+from .captcha import CaptchaVerifier
+from .metrics import instrument_client
 from .response import HttpResponse
 
 log = logging.getLogger(__name__)
@@ -21,6 +23,54 @@ class CognitoUser:
     LOGIN_FIELDS = ["username", "password", "recaptcha"]
     SIGN_UP_FIELDS = ["username", "email", "password", "recaptcha"]
 
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls):
+        """Get the cognito client of this worker, created on first use and shared by its threads"""
+        if cls._client is None or cls._client_pid != os.getpid():
+            with cls._client_lock:
+                if cls._client is None or cls._client_pid != os.getpid():
+                    # boto3 takes a while to import, workers only pay for it once a user logs in or signs up
+                    import boto3
+                    from botocore.config import Config
+                    config = Config(max_pool_connections=current_app.config.get("COGNITO_MAX_POOL_CONNECTIONS"),
+                                    connect_timeout=current_app.config.get("COGNITO_CONNECT_TIMEOUT"),
+                                    read_timeout=current_app.config.get("COGNITO_READ_TIMEOUT"),
+                                    retries={"max_attempts": current_app.config.get("COGNITO_MAX_ATTEMPTS"),
+                                             "mode": "standard"})
+                    cls._client = boto3.session.Session().client(
+                        "cognito-idp",
+                        region_name=current_app.config.get("COGNITO_REGION"),
+                        endpoint_url=current_app.config.get("COGNITO_ENDPOINT_URL"),
+                        config=config)
+                    instrument_client(cls._client, "cognito")
+                    cls._client_pid = os.getpid()
+        return cls._client
+
+    _captcha_verifier = None
+    _captcha_verifier_pid = None
+
+    @classmethod
+    def get_captcha_verifier(cls):
+        """Get the hcaptcha verifier of this worker, created on first use and shared by its threads"""
+        if cls._captcha_verifier is None or cls._captcha_verifier_pid != os.getpid():
+            with cls._client_lock:
+                if cls._captcha_verifier is None or cls._captcha_verifier_pid != os.getpid():
+                    cls._captcha_verifier = CaptchaVerifier(
+                        current_app.config.get("HCAPTCHA_URL"),
+                        current_app.config.get("HCAPTCHA_SECRET"),
+                        current_app.config.get("HCAPTCHA_SITE_KEY"),
+                        timeout=(current_app.config.get("HCAPTCHA_CONNECT_TIMEOUT"),
+                                 current_app.config.get("HCAPTCHA_READ_TIMEOUT")),
+                        cache_size=current_app.config.get("HCAPTCHA_CACHE_SIZE"),
+                        cache_ttl=current_app.config.get("HCAPTCHA_CACHE_TTL"),
+                        pool_size=current_app.config.get("HCAPTCHA_POOL_SIZE"))
+                    cls._captcha_verifier_pid = os.getpid()
+        return cls._captcha_verifier
+
     @staticmethod
     def get_secret_hash(username):
         """Get cognito secret hash for user"""
@@ -34,8 +84,7 @@ class CognitoUser:
     def initiate_auth(username, password):
         """Login user using cognito"""
         try:
-            client = boto3.client("cognito-idp",
-                                  region_name=current_app.config.get("COGNITO_REGION"))
+            client = CognitoUser.get_client()
             resp = client.admin_initiate_auth(
                 UserPoolId=current_app.config.get("COGNITO_USERPOOL_ID"),
                 ClientId=current_app.config.get("COGNITO_APP_CLIENT_ID"),
@@ -69,7 +118,7 @@ class CognitoUser:
     @staticmethod
     def create_cognito_user(username, password, email):
         """Create cognito and db user"""
-        client = boto3.client("cognito-idp", region_name=current_app.config.get("COGNITO_REGION"))
+        client = CognitoUser.get_client()
         try:
             client.sign_up(
                 ClientId=current_app.config.get("COGNITO_APP_CLIENT_ID"),
@@ -117,7 +166,7 @@ class CognitoUser:
     @staticmethod
     def delete_cognito_user(username, access_token):
         """Delete cognito and db user"""
-        client = boto3.client("cognito-idp", region_name=current_app.config.get("COGNITO_REGION"))
+        client = CognitoUser.get_client()
         try:
             client.delete_user(
                 AccessToken=access_token)
@@ -137,7 +186,7 @@ class CognitoUser:
     @staticmethod
     def confirm_signup(username):
         """Confirm cognito user"""
-        client = boto3.client("cognito-idp", region_name=current_app.config.get("COGNITO_REGION"))
+        client = CognitoUser.get_client()
         try:
             client.admin_confirm_sign_up(
                 UserPoolId=current_app.config.get("COGNITO_USERPOOL_ID"),
@@ -178,12 +227,4 @@ class CognitoUser:
     @staticmethod
     def validate_recaptcha(token):
         """Validate hcaptcha"""
-        url = "https://hcaptcha.com/siteverify"
-        params = {"secret": current_app.config.get("HCAPTCHA_SECRET"),
-                  "response": token, "sitekey": current_app.config.get("HCAPTCHA_SITE_KEY")}
-        try:
-            response = requests.post(url, data=params).json()
-            return response["success"]
-        except Exception as exception:
-            log.warning("Unable to validate hcaptcha with token (%s): %s", token, exception)
-            return False
+        return CognitoUser.get_captcha_verifier().validate(token)
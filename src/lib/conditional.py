@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""Conditional GET helpers"""
+
+import hashlib
+from datetime import datetime, time
+from flask import Response, request
+
+
+def get_etag(*parts):
+    """Get a strong entity tag from the parts identifying a version of a resource"""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def add_validators(response, etag, last_modified=None):
+    """Add validators to a response, asking clients to revalidate it on every use"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = datetime.combine(last_modified, time()) \
+            if not isinstance(last_modified, datetime) else last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    """Get a 304 response when the client already holds this version of the resource, None otherwise"""
+    if etag not in request.if_none_match:
+        return None
+    return add_validators(Response(status=304), etag, last_modified)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""Dashboard of every website of a user with its charts"""
+
+import logging
+from flask import current_app
+from src.lib.trends import build_trend_matrix, bucket_rows, get_bucket_range, get_trend_store, get_user_rollup_rows
+from src.lib.websites import get_websites
+
+log = logging.getLogger(__name__)
+
+
+def get_dashboard_rows(username, engines, since=None, resolution="day", aggregate="last"):
+    """
+    Fetch the (website id, keyword id, keyword name, engine, date or bucket, position) rows of every chart of a
+    user in a single query, buckets come from rollups when they are enabled and raw days otherwise
+    """
+    if resolution != "day" and current_app.config.get("TREND_ROLLUPS"):
+        return get_user_rollup_rows(username, engines, resolution, aggregate, since)
+    if resolution != "day":
+        since = get_bucket_range(resolution, since)[0]
+    return get_trend_store().get_user_rows(username, engines, since)
+
+
+def build_dashboard(websites, rows, engines, resolution="day", aggregate="last", bucketed=False):
+    """
+    Add to website dicts the chart of every engine, splitting the rows of all charts in one pass.
+    Raw days are aggregated into buckets of the resolution when bucketed is set
+    """
+    keywords = {}
+    charts = {}
+    for website_id, keyword_id, name, engine, day, position in rows:
+        keywords.setdefault(website_id, {})[keyword_id] = name
+        if engine is not None:
+            charts.setdefault((website_id, engine), []).append((keyword_id, name, day, position))
+    for website in websites:
+        # Every keyword gets a line on every engine, even without any rank
+        lines = [(keyword_id, name, None, None) for keyword_id, name in keywords.get(website["id"], {}).items()]
+        website["trends"] = {}
+        for engine in engines:
+            chart = lines + charts.get((website["id"], engine), [])
+            if bucketed:
+                chart = bucket_rows(chart, resolution, aggregate)
+            website["trends"][engine] = build_trend_matrix(chart)
+    return websites
+
+
+def get_dashboard(username, engines, since=None, resolution="day", aggregate="last"):
+    """Get every website of a user with its keyword names and its chart on every engine, in two queries"""
+    bucketed = resolution != "day" and not current_app.config.get("TREND_ROLLUPS")
+    return build_dashboard(get_websites(username), get_dashboard_rows(username, engines, since, resolution, aggregate),
+                           engines, resolution, aggregate, bucketed)
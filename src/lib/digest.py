@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Digests of the significant rank changes of a day, sent in rate limited batches to the clients that opted in"""
+
+import time
+import heapq
+import logging
+import threading
+from datetime import datetime
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import and_, func, or_
+from src.config import db
+from src.lib.metrics import instrument_client
+from src.lib.response import dumps
+from src.lib.sql import upsert
+from src.model.orm import Client, DigestSend, Keyword, KeywordMover, Website
+
+log = logging.getLogger(__name__)
+
+DIGEST_MAILERS = ("ses", "memory")
+# Largest number of destinations of a single SES bulk email call
+SES_MAX_BATCH_SIZE = 50
+
+
+def get_digest_rows_query(day, period="1d", min_delta=10):
+    """
+    Get the query of the movers of a day that gained or lost at least min_delta positions, for every client with
+    notifications on whose digest of the day was not sent yet, ordered by client
+    """
+    return db.session.query(Client.username, Client.email, KeywordMover.engine, Keyword.name.label("keyword"),
+                            Website.domain, KeywordMover.previous, KeywordMover.position, KeywordMover.delta) \
+        .join(KeywordMover, KeywordMover.username == Client.username) \
+        .join(Keyword, Keyword.id == KeywordMover.keyword) \
+        .join(Website, Website.id == KeywordMover.websiteId) \
+        .outerjoin(DigestSend, and_(DigestSend.username == Client.username, DigestSend.period == period,
+                                    DigestSend.date == day)) \
+        .filter(Client.notifications.is_(True), KeywordMover.period == period, KeywordMover.date == day,
+                or_(KeywordMover.delta >= min_delta, KeywordMover.delta <= -min_delta), DigestSend.username.is_(None)) \
+        .order_by(KeywordMover.username)
+
+
+def count_digests(connection, day, period="1d", min_delta=10):
+    """Get the number of digests left to send for a day"""
+    query = get_digest_rows_query(day, period, min_delta).with_entities(func.count(Client.username.distinct()))
+    return connection.execute(query.order_by(None).statement).scalar()
+
+
+def record_sent(connection, messages):
+    """Mark the digests of messages as sent, so that they are skipped when the job runs again"""
+    sent_at = datetime.utcnow()
+    upsert(connection, DigestSend.__table__,
+           [{"username": message["data"]["username"], "period": message["data"]["period"],
+             "date": message["data"]["date"], "sentAt": sent_at} for message in messages],
+           ["username", "period", "date"])
+
+
+def iter_digests(connection, day, period="1d", min_delta=10, max_changes=20):
+    """
+    Get the digest messages of a day, one per client, read from a server side cursor in a single query. Each
+    digest holds the max_changes largest changes of the client
+    """
+    result = connection.execution_options(stream_results=True).execute(
+        get_digest_rows_query(day, period, min_delta).statement)
+    for (username, email), rows in groupby(result, key=lambda row: (row.username, row.email)):
+        rows = list(rows)
+        changes = heapq.nlargest(max_changes, rows, key=lambda row: abs(row.delta))
+        yield {"to": email, "data": {
+            "username": username, "date": day, "period": period,
+            "gained": sum(1 for row in rows if row.delta > 0), "lost": sum(1 for row in rows if row.delta < 0),
+            "changes": [{"keyword": row.keyword, "domain": row.domain, "engine": row.engine,
+                         "previous": row.previous, "position": row.position, "delta": row.delta}
+                        for row in changes]}}
+
+
+class MemoryMailer():
+    """Mailer keeping messages in memory instead of sending them, to run digests locally and in tests"""
+    max_batch_size = SES_MAX_BATCH_SIZE
+
+    def __init__(self, latency=0.0):
+        # Seconds each call takes, to stand in for the round trip to a mail service
+        self.latency = latency
+        self.sent = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def send(self, messages):
+        """Keep a batch of messages, returns the ones that failed"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.sent.extend(messages)
+            self.calls += 1
+        return []
+
+
+class SesMailer():
+    """Mailer sending a batch of messages as one SES bulk email, rendered by an SES template from their data"""
+    max_batch_size = SES_MAX_BATCH_SIZE
+
+    def __init__(self, sender, template, region=None, endpoint_url=None, max_pool_connections=10):
+        # boto3 takes a while to import, only the digest job pays for it
+        import boto3
+        from botocore.config import Config
+        self.sender = sender
+        self.template = template
+        self.client = boto3.session.Session().client(
+            "sesv2", region_name=region, endpoint_url=endpoint_url,
+            config=Config(max_pool_connections=max_pool_connections, retries={"max_attempts": 5, "mode": "standard"}))
+        instrument_client(self.client, "ses")
+
+    def send(self, messages):
+        """Send a batch of messages, returns the ones that failed"""
+        response = self.client.send_bulk_email(
+            FromEmailAddress=self.sender,
+            DefaultContent={"Template": {"TemplateName": self.template, "TemplateData": "{}"}},
+            BulkEmailEntries=[{"Destination": {"ToAddresses": [message["to"]]},
+                               "ReplacementEmailContent": {"ReplacementTemplate": {
+                                   "ReplacementTemplateData": dumps(message["data"]).decode("utf-8")}}}
+                              for message in messages])
+        failed = []
+        for message, result in zip(messages, response["BulkEmailEntryResults"]):
+            if result["Status"] != "SUCCESS":
+                log.warning("Unable to send digest to %s: %s", message["to"], result.get("Error", result["Status"]))
+                failed.append(message)
+        return failed
+
+
+class RateLimiter():
+    """Token bucket shared by threads, refilled with rate tokens per second up to burst"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count=1):
+        """Wait until count tokens are available, then take them"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= count:
+                    self.tokens -= count
+                    return
+                wait = (count - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DigestSender():
+    """
+    Sends messages in batches from a bounded pool of workers, at most rate messages per second. At most two
+    batches per worker wait to be sent, so that messages are read as fast as they can be sent and no faster.
+    The messages sent by each batch are passed to on_sent
+    """
+
+    def __init__(self, mailer, rate, workers=8, batch_size=None, on_sent=None):
+        self.mailer = mailer
+        self.on_sent = on_sent
+        self.batch_size = min(batch_size or mailer.max_batch_size, mailer.max_batch_size)
+        self.limiter = RateLimiter(rate, burst=max(rate, self.batch_size))
+        self.workers = workers
+        self.sent = 0
+        self.failed = 0
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._lock = threading.Lock()
+
+    def send_batch(self, messages):
+        """Send a batch of messages once the rate allows it"""
+        try:
+            self.limiter.acquire(len(messages))
+            failed = self.mailer.send(messages)
+            if self.on_sent is not None:
+                try:
+                    self.on_sent([message for message in messages if message not in failed])
+                except Exception as exception:
+                    # The digests are out, they would only be sent again by a rerun
+                    log.error("Unable to record %s sent digests: %s", len(messages) - len(failed), exception)
+            failed = len(failed)
+        except Exception as exception:
+            log.error("Unable to send %s digests: %s", len(messages), exception)
+            failed = len(messages)
+        finally:
+            self._slots.release()
+        with self._lock:
+            self.sent += len(messages) - failed
+            self.failed += failed
+
+    def send(self, messages):
+        """Send messages until there is none left, returns the (sent, failed, seconds) of the run"""
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="digest") as executor:
+            batch = []
+            for message in messages:
+                batch.append(message)
+                if len(batch) == self.batch_size:
+                    self._slots.acquire()
+                    executor.submit(self.send_batch, batch)
+                    batch = []
+            if batch:
+                self._slots.acquire()
+                executor.submit(self.send_batch, batch)
+        return self.sent, self.failed, time.perf_counter() - start
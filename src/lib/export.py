@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Streamed exports of the trend history of a website"""
+
+import io
+import csv
+import logging
+from src.lib.response import dumps
+from src.model.orm import Keyword, Trend
+
+log = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ("keyword", "engine", "date", "position")
+# Rows fetched from the server side cursor at a time, each batch is written out as one chunk of the response
+EXPORT_BATCH_SIZE = 1000
+# Keywords read by each query, chunks of keyword ids keep the rows in index order so that nothing is sorted
+EXPORT_KEYWORD_CHUNK = 100
+
+
+def get_export_keywords(connection, website_id):
+    """Get the (id, name) keywords of a website, by id"""
+    table = Keyword.__table__
+    return connection.execute(table.select().with_only_columns([table.c.id, table.c.name])
+                              .where(table.c.websiteId == website_id).order_by(table.c.id)).fetchall()
+
+
+def get_export_rows_query(keyword_ids, engine=None):
+    """Get the query of the (keyword id, engine, date, position) trends of keywords, in index order"""
+    table = Trend.__table__
+    query = table.select().with_only_columns([table.c.keyword, table.c.engine, table.c.date, table.c.position]) \
+        .where(table.c.keyword.in_(keyword_ids))
+    if engine is not None:
+        query = query.where(table.c.engine == engine)
+    return query.order_by(table.c.keyword, table.c.engine, table.c.date)
+
+
+class ExportError(Exception):
+    """Error reading the rows of an export once its response has started"""
+
+
+def iter_export_rows(connection, keywords, engine=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Get batches of (keyword name, engine, date, position) rows of (id, name) keywords from a server side cursor.
+    The view has returned by the time rows are read, so errors are logged here and raised as ExportError
+    """
+    names = dict(keywords)
+    keyword_ids = [keyword[0] for keyword in keywords]
+    try:
+        for offset in range(0, len(keyword_ids), EXPORT_KEYWORD_CHUNK):
+            result = connection.execution_options(stream_results=True).execute(
+                get_export_rows_query(keyword_ids[offset:offset + EXPORT_KEYWORD_CHUNK], engine))
+            for partition in result.partitions(batch_size):
+                yield [(names[row[0]], row[1], row[2], row[3]) for row in partition]
+    except Exception as exception:
+        log.error("Unable to export the trends of %s keywords: %s", len(keyword_ids), exception)
+        raise ExportError(str(exception)) from exception
+
+
+def format_csv(batches):
+    """
+    Write batches of export rows as csv, with a header. An export error aborts the response, so that it is not
+    mistaken for a complete file
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows((keyword, engine, day.isoformat(), position) for keyword, engine, day, position in batch)
+        yield buffer.getvalue()
+
+
+def format_ndjson(batches):
+    """Write batches of export rows as newline delimited json objects, ending with an error object on failure"""
+    try:
+        for batch in batches:
+            yield b"".join(dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in batch)
+    except ExportError:
+        yield dumps({"error": "Unable to export the trends"}) + b"\n"
+
+
+# Content type and writer of every export format
+EXPORT_FORMATS = {
+    "csv": ("text/csv", format_csv),
+    "ndjson": ("application/x-ndjson", format_ndjson),
+}
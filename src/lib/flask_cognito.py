@@ -1,14 +1,23 @@
 #!/usr/bin/env python3
 """This module handles cognito authentication and validation"""
 
+import json
+import time
+import hashlib
 import logging
+import threading
 from http import HTTPStatus
 from collections import OrderedDict
 from functools import wraps
+import requests
 from flask import _request_ctx_stack, current_app, jsonify, request
 from werkzeug.local import LocalProxy
-from cognitojwt import CognitoJWTException, decode as cognito_jwt_decode
+from cognitojwt import CognitoJWTException
+from jose import jwk, jwt
 from jose.exceptions import JWTError
+from jose.utils import base64url_decode
+from .cache import LRUCache
+from .metrics import timed
 from .response import HttpResponse
 
 log = logging.getLogger(__name__)
@@ -19,8 +28,15 @@ CONFIG_DEFAULTS = {
     "COGNITO_JWT_SESSION_PREFIX": "Bearer",
     "COGNITO_JWT_HEADER_NAME": "Authorization",
     "COGNITO_JWT_HEADER_PREFIX": "Bearer",
+    "COGNITO_TOKEN_CACHE_SIZE": 1024,
+    "COGNITO_JWKS_REFRESH_INTERVAL": 3600,
+    "COGNITO_JWKS_RETRY_INTERVAL": 30,
+    "COGNITO_JWKS_MIN_REFRESH_INTERVAL": 60,
+    "COGNITO_JWKS_TIMEOUT": 5,
 }
 
+JWKS_URL = "https://cognito-idp.%s.amazonaws.com/%s/.well-known/jwks.json"
+
 # user from pool
 current_cognito_jwt = LocalProxy(lambda: getattr(_request_ctx_stack.top,
     "cogauth_cognito_jwt", None))
@@ -74,6 +90,20 @@ class CognitoAuth(object):
         # optional configuration
         self.check_expiration = app.config.get("COGNITO_CHECK_TOKEN_EXPIRATION", True)
         self.app_client_id = app.config.get("COGNITO_APP_CLIENT_ID")
+        self.jwks_url = app.config.get("COGNITO_JWKS_URL") or JWKS_URL % (self.region, self.userpool_id)
+        self.jwks_refresh_interval = app.config.get("COGNITO_JWKS_REFRESH_INTERVAL")
+        self.jwks_retry_interval = app.config.get("COGNITO_JWKS_RETRY_INTERVAL")
+        self.jwks_timeout = app.config.get("COGNITO_JWKS_TIMEOUT")
+        self.jwks_min_refresh_interval = app.config.get("COGNITO_JWKS_MIN_REFRESH_INTERVAL")
+
+        # verified claims, keyed by token hash
+        self.token_cache = LRUCache(app.config.get("COGNITO_TOKEN_CACHE_SIZE"))
+
+        # prefetch userpool keys so that no request waits for them
+        self.keys = {}
+        self.keys_refreshed_at = None
+        self._keys_lock = threading.Lock()
+        self.start_key_refresher()
 
         # save for localproxy
         app.extensions["cognito_auth"] = self
@@ -140,18 +170,93 @@ class CognitoAuth(object):
             ("description", error.description),
         ])), error.status_code, error.headers
 
+    def refresh_keys(self):
+        """Fetch the userpool public keys, from a local file when the jwks url is a path"""
+        if self.jwks_url.startswith("http"):
+            response = requests.get(self.jwks_url, timeout=self.jwks_timeout)
+            response.raise_for_status()
+            keys = response.json()["keys"]
+        else:
+            with open(self.jwks_url, "r") as f:
+                keys = json.load(f)["keys"]
+        self.keys = {key["kid"]: jwk.construct(key) for key in keys}
+        log.info("Loaded %s userpool public keys", len(self.keys))
+
+    def _try_refresh_keys(self):
+        self.keys_refreshed_at = time.monotonic()
+        try:
+            self.refresh_keys()
+            return True
+        except Exception as exception:
+            log.error("Unable to fetch userpool public keys: %s", exception)
+            return False
+
+    def _refresh_keys_forever(self, refreshed):
+        while True:
+            time.sleep(self.jwks_refresh_interval if refreshed else self.jwks_retry_interval)
+            refreshed = self._try_refresh_keys()
+
+    def start_key_refresher(self):
+        """Fetch the userpool public keys now, then keep refreshing them in the background"""
+        self._start_refresher_thread(self._try_refresh_keys())
+
+    def restart_key_refresher(self):
+        """Keep refreshing the keys inherited from a forked process, whose refresher thread was not"""
+        self._start_refresher_thread(bool(self.keys))
+
+    def _start_refresher_thread(self, refreshed):
+        thread = threading.Thread(target=self._refresh_keys_forever, args=(refreshed,), name="cognito-jwks",
+                                  daemon=True)
+        thread.start()
+
+    def get_key(self, kid):
+        """
+        Get the userpool public key of a kid. An unknown kid refreshes the keys first, in case they were rotated,
+        at most once every jwks_min_refresh_interval
+        """
+        key = self.keys.get(kid)
+        if key is not None:
+            return key
+        with self._keys_lock:
+            key = self.keys.get(kid)
+            if key is None and (self.keys_refreshed_at is None or
+                                time.monotonic() - self.keys_refreshed_at >= self.jwks_min_refresh_interval):
+                log.info("Refreshing userpool public keys for unknown kid (%s)", kid)
+                self._try_refresh_keys()
+                key = self.keys.get(kid)
+        return key
+
+    def verify_token(self, token):
+        """Verify token signature, expiration and audience, then return its claims."""
+        message, encoded_signature = str(token).rsplit(".", 1)
+        key = self.get_key(jwt.get_unverified_headers(token)["kid"])
+        if key is None:
+            raise CognitoJWTException("Public key not found in jwks.json")
+        if not key.verify(message.encode("utf-8"), base64url_decode(encoded_signature.encode("utf-8"))):
+            raise CognitoJWTException("Signature verification failed")
+
+        claims = jwt.get_unverified_claims(token)
+        if self.check_expiration and time.time() > claims["exp"]:
+            raise CognitoJWTException("Token is expired")
+        if self.app_client_id:
+            audience = claims.get("client_id") if claims.get("token_use") == "access" else claims.get("aud")
+            if audience != self.app_client_id:
+                raise CognitoJWTException("Token was not issued for this audience")
+        return claims
+
     def decode_token(self, token):
-        """Decode token."""
+        """Decode token, reusing the claims of tokens already verified until they expire."""
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        claims = self.token_cache.get(key)
+        if claims is not None:
+            return claims
         try:
-            return cognito_jwt_decode(
-                token=token,
-                region=self.region,
-                app_client_id=self.app_client_id,
-                userpool_id=self.userpool_id,
-                testmode=not self.check_expiration,
-            )
-        except (ValueError, JWTError):
+            with timed("cognito_jwt", "verify"):
+                claims = self.verify_token(token)
+        except (ValueError, KeyError, JWTError):
             raise CognitoJWTException("Malformed Authentication Token")
+        self.token_cache.set(key, claims, expires_at=claims["exp"] if self.check_expiration else None)
+        return claims
 
 def cognito_auth_header_required_api(fn):
     """View decorator that requires a valid Cognito JWT token to be present in the header."""
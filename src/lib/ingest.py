@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""Batched SQS consumer writing ranks into the trends table"""
+
+import json
+import queue
+import logging
+import threading
+from uuid import uuid5, UUID
+from datetime import date
+from sqlalchemy.exc import OperationalError
+from src.lib.rollups import refresh_rollups
+from src.lib.series import refresh_series, validate_position
+from src.lib.sql import upsert
+from src.lib.trends import ENGINES
+from src.lib.versions import bump_trend_versions
+from src.model.orm import Keyword, Trend
+
+log = logging.getLogger(__name__)
+
+# Trends get a deterministic id, rows are upserted on their keyword, engine and day so that a rank delivered twice
+# updates the same row whatever its id
+TREND_NAMESPACE = UUID("6b1f5bd4-3c5d-4a53-9d8e-2f0c1a8e4b7d")
+SQS_MAX_MESSAGES = 10
+
+
+def get_trend_id(keyword, engine, day):
+    """Get the id of the trend of a keyword on an engine for a day"""
+    return str(uuid5(TREND_NAMESPACE, "%s/%s/%s" % (keyword, engine, day.isoformat())))
+
+
+def parse_message(body):
+    """
+    Parse a message holding one rank object or a list of them into trend rows, raises ValueError when one of them
+    has an unknown engine or an invalid position
+    """
+    ranks = json.loads(body)
+    if isinstance(ranks, dict):
+        ranks = [ranks]
+    trends = []
+    for rank in ranks:
+        day = date.fromisoformat(rank["date"])
+        if rank["engine"] not in ENGINES:
+            raise ValueError("Unknown engine: %s" % rank["engine"])
+        trends.append({"id": get_trend_id(rank["keyword"], rank["engine"], day), "keyword": rank["keyword"],
+                       "engine": rank["engine"], "date": day, "position": validate_position(int(rank["position"]))})
+    return trends
+
+
+class TrendIngester():
+    """
+    Long polls an SQS queue from several receivers and writes its messages into the trends table in batches.
+    Receivers block once max_pending messages wait to be written, and messages are only deleted from the
+    queue after their batch has been committed. Messages that cannot be parsed or written are moved to the
+    dead letter queue, or dropped when there is none
+    """
+
+    def __init__(self, sqs, queue_url, engine, batch_size=500, receivers=2, writers=1, max_pending=5000,
+                 wait_time=20, flush_interval=1.0, cache=None, rollups=False, series=False,
+                 dead_letter_url=None):
+        self.sqs = sqs
+        self.cache = cache
+        self.rollups = rollups
+        self.series = series
+        self.queue_url = queue_url
+        self.dead_letter_url = dead_letter_url
+        self.engine = engine
+        self.batch_size = batch_size
+        self.receivers = receivers
+        self.writers = writers
+        self.wait_time = wait_time
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.stopping = threading.Event()
+        self.threads = []
+        self.ingested = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def receive(self):
+        """Receive messages until stopped, waiting for room in the pending queue"""
+        while not self.stopping.is_set():
+            try:
+                response = self.sqs.receive_message(QueueUrl=self.queue_url, MaxNumberOfMessages=SQS_MAX_MESSAGES,
+                                                    WaitTimeSeconds=self.wait_time)
+            except Exception as exception:
+                log.error("Unable to receive messages: %s", exception)
+                self.stopping.wait(self.flush_interval)
+                continue
+            for message in response.get("Messages", []):
+                self.pending.put(message)
+
+    def next_batch(self):
+        """Get up to batch_size pending messages, waiting at most flush_interval for the first one"""
+        messages = []
+        try:
+            messages.append(self.pending.get(timeout=self.flush_interval))
+            while len(messages) < self.batch_size:
+                messages.append(self.pending.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+    def write(self, messages):
+        """
+        Write the trends of a batch of messages, then delete them from the queue. When the batch cannot be
+        written, its messages are written one at a time so that a single bad one does not hold back the others
+        """
+        parsed = []
+        rejected = []
+        for message in messages:
+            try:
+                parsed.append((message, parse_message(message["Body"])))
+            except (ValueError, KeyError, TypeError) as exception:
+                log.error("Unable to parse message (%s): %s", message["MessageId"], exception)
+                rejected.append(message)
+        try:
+            self.write_trends([trend for _, trends in parsed for trend in trends])
+            written = [message for message, _ in parsed]
+        except OperationalError:
+            # The database is unavailable, messages will be received again once their visibility timeout expires
+            raise
+        except Exception as exception:
+            log.error("Unable to write %s messages, writing them one at a time: %s", len(parsed), exception)
+            written = []
+            for message, trends in parsed:
+                try:
+                    self.write_trends(trends)
+                    written.append(message)
+                except OperationalError:
+                    raise
+                except Exception as exception:
+                    log.error("Unable to write message (%s): %s", message["MessageId"], exception)
+                    rejected.append(message)
+        self.dead_letter(rejected)
+        self.delete(written + rejected)
+        with self._lock:
+            self.ingested += len(written)
+            self.rejected += len(rejected)
+
+    def write_trends(self, trends):
+        """Write trends in a single transaction, with their rollups, series and cached charts"""
+        rows = {}
+        for trend in trends:
+            rows[(trend["keyword"], trend["engine"], trend["date"])] = trend
+        rows = [rows[key] for key in sorted(rows)]
+        if not rows:
+            return
+        with self.engine.begin() as connection:
+            upsert(connection, Trend.__table__, rows, ["keyword", "engine", "date"], update=["position"])
+            if self.rollups:
+                refresh_rollups(connection, [(row["keyword"], row["engine"], row["date"]) for row in rows])
+            if self.series:
+                refresh_series(connection, [(row["keyword"], row["engine"], row["date"], row["position"])
+                                            for row in rows])
+            bump_trend_versions(connection, {(row["keyword"], row["engine"]) for row in rows})
+            websites = self.get_websites(connection, {row["keyword"] for row in rows}) if self.cache else []
+        for website_id in websites:
+            self.cache.invalidate(website_id)
+
+    def dead_letter(self, messages):
+        """Send messages that cannot be ingested to the dead letter queue, log them when there is none"""
+        if self.dead_letter_url is None:
+            for message in messages:
+                log.error("Dropping message (%s): %s", message["MessageId"], message["Body"])
+            return
+        for offset in range(0, len(messages), SQS_MAX_MESSAGES):
+            entries = [{"Id": str(idx), "MessageBody": message["Body"]}
+                       for idx, message in enumerate(messages[offset:offset + SQS_MAX_MESSAGES])]
+            response = self.sqs.send_message_batch(QueueUrl=self.dead_letter_url, Entries=entries)
+            for failure in response.get("Failed", []):
+                message = messages[offset + int(failure["Id"])]
+                log.error("Unable to dead letter message (%s), dropping it: %s", message["MessageId"], message["Body"])
+
+    def get_websites(self, connection, keywords):
+        """Get the ids of the websites of keywords"""
+        if not keywords:
+            return []
+        table = Keyword.__table__
+        return [row[0] for row in connection.execute(
+            table.select().with_only_columns([table.c.websiteId]).where(table.c.id.in_(keywords)).distinct())]
+
+    def delete(self, messages):
+        """Delete messages from the queue, in batches of the sqs maximum"""
+        for offset in range(0, len(messages), SQS_MAX_MESSAGES):
+            entries = [{"Id": str(idx), "ReceiptHandle": message["ReceiptHandle"]}
+                       for idx, message in enumerate(messages[offset:offset + SQS_MAX_MESSAGES])]
+            response = self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            for failure in response.get("Failed", []):
+                log.warning("Unable to delete message: %s", failure.get("Message"))
+
+    def drain(self):
+        """Write pending messages until stopped and nothing is left to write"""
+        while not self.stopping.is_set() or not self.pending.empty():
+            messages = self.next_batch()
+            if not messages:
+                continue
+            try:
+                self.write(messages)
+            except Exception as exception:
+                # Messages will be received again once their visibility timeout expires
+                log.error("Unable to write %s messages: %s", len(messages), exception)
+
+    def start(self):
+        """Start the receivers and the writers"""
+        for idx in range(self.receivers):
+            self.threads.append(threading.Thread(target=self.receive, name="ingest-receiver-%s" % idx, daemon=True))
+        for idx in range(self.writers):
+            self.threads.append(threading.Thread(target=self.drain, name="ingest-writer-%s" % idx, daemon=True))
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """Stop receiving, then wait for the writers to flush what was already received"""
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
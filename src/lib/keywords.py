@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Keyword imports, diffed against the keywords of a website with set operations"""
+
+import io
+import csv
+import json
+import logging
+from uuid import uuid4
+from flask import current_app
+from src.config import db
+from src.lib.rollups import delete_keyword_rollups
+from src.lib.series import delete_keyword_series
+from src.lib.versions import bump_website_versions
+from src.model.orm import Client, Keyword
+
+log = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("text/csv", "application/x-ndjson")
+IMPORT_MODES = ("replace", "append")
+CSV_HEADERS = ("keyword", "name")
+MAX_KEYWORD_LENGTH = 255
+INSERT_CHUNK_SIZE = 1000
+
+
+def get_limits(username):
+    """Get the (website, keyword) limits of a client, the configured defaults where it has none"""
+    row = db.session.query(Client.websiteLimit, Client.keywordLimit).filter(Client.username == username).one_or_none()
+    website_limit, keyword_limit = row if row is not None else (None, None)
+    return (website_limit if website_limit is not None else current_app.config["WEBSITE_LIMIT"],
+            keyword_limit if keyword_limit is not None else current_app.config["KEYWORD_LIMIT"])
+
+
+def validate_keyword(keyword):
+    """Get a keyword name without its surrounding spaces, raises ValueError when it cannot be stored"""
+    if not isinstance(keyword, str):
+        raise ValueError("Keyword must be a string")
+    keyword = keyword.strip()
+    if keyword == "":
+        raise ValueError("Keyword cannot be blank")
+    if len(keyword) > MAX_KEYWORD_LENGTH:
+        raise ValueError("Keyword cannot be longer than %s characters" % MAX_KEYWORD_LENGTH)
+    return keyword
+
+
+def parse_csv(stream):
+    """Get the keywords of the first column of a csv stream, skipping empty lines and a keyword or name header"""
+    for idx, row in enumerate(csv.reader(io.TextIOWrapper(stream, encoding="utf-8-sig"))):
+        if not row or not "".join(row).strip():
+            continue
+        if idx == 0 and row[0].strip().lower() in CSV_HEADERS:
+            continue
+        yield row[0]
+
+
+def parse_ndjson(stream):
+    """Get the keywords of a newline delimited json stream, each line a string or an object with a keyword field"""
+    for line in stream:
+        if not line.strip():
+            continue
+        keyword = json.loads(line)
+        if isinstance(keyword, dict):
+            keyword = keyword.get("keyword")
+        yield keyword
+
+
+def read_keywords(stream, content_type, limit=None):
+    """
+    Get the set of keywords of an upload, one line at a time. Raises ValueError when one of them is invalid, or
+    as soon as there are more than limit of them
+    """
+    parse = parse_ndjson if content_type == "application/x-ndjson" else parse_csv
+    keywords = set()
+    try:
+        for keyword in parse(stream):
+            keywords.add(validate_keyword(keyword))
+            if limit is not None and len(keywords) > limit:
+                raise ValueError("Reached keyword limit (%s)" % limit)
+    except (UnicodeDecodeError, csv.Error) as exception:
+        raise ValueError("Unable to parse the keywords: %s" % exception)
+    return keywords
+
+
+def get_keyword_rows(session, website_id):
+    """Get the (id, name) rows of the keywords of a website"""
+    table = Keyword.__table__
+    return session.execute(table.select().with_only_columns([table.c.id, table.c.name])
+                           .where(table.c.websiteId == website_id)).fetchall()
+
+
+def diff_keywords(rows, keywords, replace=True):
+    """
+    Get the keyword names missing from (id, name) rows and, when replace is set, the ids of the rows whose name
+    is not in keywords
+    """
+    added = sorted(keywords - {row.name for row in rows})
+    removed = [row.id for row in rows if row.name not in keywords] if replace else []
+    return added, removed
+
+
+def apply_keyword_diff(session, website_id, added, removed, chunk_size=INSERT_CHUNK_SIZE):
+    """Remove keywords and their rollups and series by id, then add keyword names to a website in chunked inserts"""
+    table = Keyword.__table__
+    if removed:
+        session.execute(table.delete().where(table.c.id.in_(removed)))
+        # The delete bypasses the orm, so the flush listener does not see it
+        delete_keyword_rollups(session.connection(), removed)
+        delete_keyword_series(session.connection(), removed)
+    for offset in range(0, len(added), chunk_size):
+        session.execute(table.insert(), [{"id": str(uuid4()), "websiteId": website_id, "name": keyword}
+                                         for keyword in added[offset:offset + chunk_size]])
+    if added or removed:
+        bump_website_versions(session.connection(), [website_id])
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Prometheus instrumentation of requests, database queries and calls to external services"""
+
+import os
+import hmac
+import time
+import logging
+from contextlib import contextmanager
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import CollectorRegistry, CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+log = logging.getLogger(__name__)
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+REQUEST_DURATION = Histogram("serpbot_request_duration_seconds", "Duration of requests",
+                             ["operation", "method", "status"])
+REQUEST_QUERIES = Histogram("serpbot_request_db_queries", "Database queries run by requests", ["operation"],
+                            buckets=QUERY_BUCKETS)
+REQUEST_QUERY_DURATION = Histogram("serpbot_request_db_duration_seconds", "Time spent in database queries by requests",
+                                   ["operation"])
+DEPENDENCY_DURATION = Histogram("serpbot_dependency_duration_seconds", "Duration of calls to external services",
+                                ["dependency", "call"])
+TREND_CACHE = Gauge("serpbot_trend_cache", "Trend cache counters, summed over the live workers", ["counter"],
+                    multiprocess_mode="livesum")
+DB_POOL = Gauge("serpbot_db_pool_connections", "Connections of the database pools, summed over the live workers",
+                ["bind", "state"], multiprocess_mode="livesum")
+DB_POOL_SETTINGS = Gauge("serpbot_db_pool_settings", "Settings of the database pools of every worker", ["setting"],
+                         multiprocess_mode="max")
+
+
+def is_multiprocess():
+    """Whether metrics are shared between gunicorn workers through files"""
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR") or os.environ.get("prometheus_multiproc_dir"))
+
+
+@contextmanager
+def timed(dependency, call):
+    """Time a call to an external service"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        DEPENDENCY_DURATION.labels(dependency, call).observe(time.perf_counter() - start)
+
+
+def instrument_client(client, dependency):
+    """Time every call of a boto3 client"""
+    def before_call(model, context, **kwargs):
+        context["metrics_start"] = time.perf_counter()
+        context["metrics_call"] = model.name
+
+    def after_call(context, **kwargs):
+        if "metrics_start" in context:
+            DEPENDENCY_DURATION.labels(dependency, context["metrics_call"]).observe(
+                time.perf_counter() - context.pop("metrics_start"))
+
+    client.meta.events.register("before-call", before_call)
+    client.meta.events.register("after-call", after_call)
+    client.meta.events.register("after-call-error", after_call)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    _end_query(conn)
+
+
+def _handle_error(context):
+    # A query that raises never reaches after_cursor_execute, its start must not be paired with the next query
+    if context.connection is not None:
+        _end_query(context.connection)
+
+
+def _end_query(conn):
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    if has_request_context() and "metrics_queries" in g:
+        g.metrics_queries += 1
+        g.metrics_query_duration += duration
+
+
+def _set_pool_gauges():
+    state = current_app.extensions.get("sqlalchemy")
+    if state is None:
+        return
+    # Set with the connections rather than once, as metrics of a preloaded master are dropped by on_starting
+    for setting, value in (current_app.config.get("SQLALCHEMY_ENGINE_OPTIONS") or {}).items():
+        if isinstance(value, (bool, int, float)):
+            DB_POOL_SETTINGS.labels(setting).set(value)
+    for bind in [None] + list(current_app.config.get("SQLALCHEMY_BINDS") or {}):
+        pool = state.db.get_engine(current_app, bind=bind).pool
+        if not isinstance(pool, QueuePool):
+            continue
+        name = bind or "primary"
+        DB_POOL.labels(name, "size").set(pool.size())
+        DB_POOL.labels(name, "checked_in").set(pool.checkedin())
+        DB_POOL.labels(name, "checked_out").set(pool.checkedout())
+        # Negative while the pool has not opened pool_size connections yet
+        DB_POOL.labels(name, "overflow").set(max(pool.overflow(), 0))
+
+
+class Metrics():
+    """Records request metrics and serves them in the prometheus text format"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, path="/metrics"):
+        """Initializes the metrics for flask, served only to scrapers sending the bearer token of METRICS_TOKEN"""
+        app.config.setdefault("METRICS_TOKEN", None)
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(Engine, "handle_error", _handle_error)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule(path, "metrics", self.get_metrics)
+        app.extensions["metrics"] = self
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_duration = 0.0
+
+    def _after_request(self, response):
+        if "metrics_start" not in g:
+            return response
+        view = current_app.view_functions.get(request.endpoint)
+        operation = view.__name__ if view is not None else "unmatched"
+        REQUEST_DURATION.labels(operation, request.method, response.status_code).observe(
+            time.perf_counter() - g.metrics_start)
+        REQUEST_QUERIES.labels(operation).observe(g.metrics_queries)
+        REQUEST_QUERY_DURATION.labels(operation).observe(g.metrics_query_duration)
+        trend_cache = current_app.extensions.get("trend_cache")
+        if trend_cache is not None:
+            for counter, value in trend_cache.stats().items():
+                TREND_CACHE.labels(counter).set(value)
+        _set_pool_gauges()
+        return response
+
+    def get_metrics(self):
+        """Get the metrics of every worker, not found unless METRICS_TOKEN is set and sent as a bearer token"""
+        token = current_app.config.get("METRICS_TOKEN")
+        if not token:
+            return Response(status=404)
+        if not hmac.compare_digest(request.headers.get("Authorization", "").encode("utf-8"),
+                                   ("Bearer %s" % token).encode("utf-8")):
+            return Response(status=401, headers={"WWW-Authenticate": "Bearer"})
+        registry = REGISTRY
+        if is_multiprocess():
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
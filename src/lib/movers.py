@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Keyword movers: position changes over a period, computed in the database once per ingest day"""
+
+import logging
+from datetime import timedelta
+from sqlalchemy import and_, case, func, select, union_all
+from src.config import db
+from src.lib.rollups import MAX_RANK
+from src.lib.versions import MOVERS_VERSION, bump_versions
+from src.model.orm import Keyword, KeywordMover, Trend, Website
+
+log = logging.getLogger(__name__)
+
+MOVER_PERIODS = {"1d": 1, "7d": 7, "30d": 30}
+MAX_MOVERS = 100
+INSERT_CHUNK_SIZE = 1000
+
+
+def get_day_number(connection, column):
+    """Get a day number of a date column, so that range frames can be measured in days on every dialect"""
+    if connection.dialect.name == "mysql":
+        return func.to_days(column)
+    return func.julianday(column)
+
+
+def get_window_rows_query(connection, day):
+    """
+    Get the query of the position of every keyword on an engine on a day, with its previous position and its
+    best, worst and average positions over every mover period, computed with window functions. Days ranked more
+    than once keep their best position
+    """
+    table = Trend.__table__
+    # Only the trends of the longest period are read, frames of the day are whole within them
+    daily = select([table.c.keyword, table.c.engine, table.c.date,
+                    func.min(case([(table.c.position == -1, MAX_RANK)], else_=table.c.position)).label("position")]) \
+        .where(and_(table.c.date >= day - timedelta(days=max(MOVER_PERIODS.values())), table.c.date <= day)) \
+        .group_by(table.c.keyword, table.c.engine, table.c.date) \
+        .subquery("daily")
+    rank = daily.c.position
+    day_number = get_day_number(connection, daily.c.date)
+    partition = [daily.c.keyword, daily.c.engine]
+    columns = [daily.c.keyword, daily.c.engine, daily.c.date, rank, day_number.label("day"),
+               func.lag(rank).over(partition_by=partition, order_by=day_number).label("lag_position"),
+               func.lag(day_number).over(partition_by=partition, order_by=day_number).label("lag_day")]
+    for period, days in MOVER_PERIODS.items():
+        window = {"partition_by": partition, "order_by": day_number, "range_": (-days, 0)}
+        columns += [func.first_value(rank).over(**window).label("first_%s" % period),
+                    func.min(day_number).over(**window).label("start_%s" % period),
+                    func.min(rank).over(**window).label("best_%s" % period),
+                    func.max(rank).over(**window).label("worst_%s" % period),
+                    func.avg(rank).over(**window).label("average_%s" % period)]
+    windows = select(columns).subquery("windows")
+    keywords = Keyword.__table__
+    websites = Website.__table__
+    return select([windows, keywords.c.websiteId, websites.c.username]) \
+        .select_from(windows.join(keywords, keywords.c.id == windows.c.keyword)
+                     .join(websites, websites.c.id == keywords.c.websiteId)) \
+        .where(windows.c.date == day)
+
+
+def build_movers(rows):
+    """Build the mover rows of every period from window rows, leaving out periods without an earlier position"""
+    movers = []
+    for row in rows:
+        for period in MOVER_PERIODS:
+            if period == "1d":
+                previous = row.lag_position if row.lag_day is not None and row.lag_day == row.day - 1 else None
+            else:
+                previous = row["first_%s" % period] if row["start_%s" % period] < row.day else None
+            if previous is None:
+                continue
+            movers.append({"keyword": row.keyword, "engine": row.engine, "period": period, "date": row.date,
+                           "username": row.username, "websiteId": row.websiteId, "position": row.position,
+                           "previous": previous, "delta": previous - row.position,
+                           "best": row["best_%s" % period], "worst": row["worst_%s" % period],
+                           "average": round(float(row["average_%s" % period]), 1)})
+    return movers
+
+
+def compute_movers(connection, day):
+    """Replace the movers of a day, returns their number"""
+    movers = build_movers(connection.execute(get_window_rows_query(connection, day)).mappings())
+    table = KeywordMover.__table__
+    connection.execute(table.delete().where(table.c.date == day))
+    for offset in range(0, len(movers), INSERT_CHUNK_SIZE):
+        connection.execute(table.insert(), movers[offset:offset + INSERT_CHUNK_SIZE])
+    bump_versions(connection, [MOVERS_VERSION])
+    return len(movers)
+
+
+def get_latest_day_query(username, engine, period):
+    """Get the query of the last day movers were computed for a user"""
+    return db.session.query(func.max(KeywordMover.date)) \
+        .filter(KeywordMover.username == username, KeywordMover.engine == engine, KeywordMover.period == period)
+
+
+def get_movers_query(username, engine, period, day):
+    """Get the query of the movers of the websites of a user on a day, with their keyword names and domains"""
+    return db.session.query(Keyword.name.label("keyword"), KeywordMover.keyword.label("keywordId"),
+                            KeywordMover.websiteId, Website.domain, KeywordMover.position, KeywordMover.previous,
+                            KeywordMover.delta, KeywordMover.best, KeywordMover.worst, KeywordMover.average) \
+        .join(Keyword, Keyword.id == KeywordMover.keyword) \
+        .join(Website, Website.id == KeywordMover.websiteId) \
+        .filter(KeywordMover.username == username, KeywordMover.engine == engine, KeywordMover.period == period,
+                KeywordMover.date == day)
+
+
+def get_movers(username, engine, period, limit):
+    """
+    Get the last day movers were computed for a user, with the limit keywords of its websites that gained the
+    most positions over the period and the limit that lost the most, each read from the movers index. Both are
+    read in a single query on the last day, the day is only read on its own when nothing moved on it
+    """
+    query = get_movers_query(username, engine, period, get_latest_day_query(username, engine, period)
+                             .scalar_subquery()).add_columns(KeywordMover.date)
+    gainers = query.filter(KeywordMover.delta > 0).order_by(KeywordMover.delta.desc()).limit(limit)
+    losers = query.filter(KeywordMover.delta < 0).order_by(KeywordMover.delta).limit(limit)
+    rows = [dict(row) for row in db.session.execute(
+        union_all(select(gainers.subquery("gainers")), select(losers.subquery("losers")))).mappings()]
+    day = rows[0]["date"] if rows else get_latest_day_query(username, engine, period).scalar()
+    for row in rows:
+        del row["date"]
+    return (day, sorted((row for row in rows if row["delta"] > 0), key=lambda row: -row["delta"]),
+            sorted((row for row in rows if row["delta"] < 0), key=lambda row: row["delta"]))
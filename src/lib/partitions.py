@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Monthly range partitions of the trends table, on MySQL"""
+
+import logging
+from datetime import date, timedelta
+from sqlalchemy import and_, inspect, text
+from src.lib.rollups import aggregate, get_next_bucket
+from src.lib.sql import upsert
+from src.lib.versions import TRENDS_VERSION, bump_versions
+from src.model.orm import Trend, TrendRollup
+
+log = logging.getLogger(__name__)
+
+PARTITION_FORMAT = "p%Y%m"
+# Catch-all partition receiving trends past the last monthly partition, split ahead of time by create_partitions
+FUTURE_PARTITION = "pfuture"
+
+
+def add_months(month, count):
+    """Get the first day of the month count months after the month of a date"""
+    years, month_idx = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_idx + 1, 1)
+
+
+def get_months(start, end):
+    """Get the first day of every month from the month of start to the month of end, both included"""
+    months = []
+    month = start.replace(day=1)
+    while month <= end:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def get_partition_definition(month):
+    """Get the definition of the partition of a month"""
+    return "PARTITION %s VALUES LESS THAN ('%s')" % (month.strftime(PARTITION_FORMAT), add_months(month, 1).isoformat())
+
+
+def get_partitions(connection):
+    """Get the (name, month) monthly partitions of the trends table, in month order. Empty when it is not partitioned"""
+    rows = connection.execute(text(
+        "SELECT PARTITION_NAME FROM information_schema.PARTITIONS"
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'trends' AND PARTITION_NAME IS NOT NULL"
+        " ORDER BY PARTITION_ORDINAL_POSITION"))
+    names = [row[0] for row in rows]
+    if not names:
+        return []
+    if names[-1] != FUTURE_PARTITION:
+        raise ValueError("Unexpected partitioning of the trends table: %s" % ", ".join(names))
+    return [(name, date(int(name[1:5]), int(name[5:7]), 1)) for name in names[:-1]]
+
+
+def partition_trends(connection, months_ahead):
+    """
+    Partition the trends table by month, from its first trend to months_ahead months from now. MySQL requires
+    the partitioning column in the primary key and does not support foreign keys on partitioned tables
+    """
+    for foreign_key in inspect(connection).get_foreign_keys("trends"):
+        connection.execute(text("ALTER TABLE trends DROP FOREIGN KEY %s" % foreign_key["name"]))
+    if inspect(connection).get_pk_constraint("trends")["constrained_columns"] != ["id", "date"]:
+        connection.execute(text("ALTER TABLE trends DROP PRIMARY KEY, ADD PRIMARY KEY (id, date)"))
+    first = connection.execute(text("SELECT MIN(date) FROM trends")).scalar() or date.today()
+    months = get_months(first, add_months(date.today(), months_ahead))
+    definitions = [get_partition_definition(month) for month in months]
+    definitions.append("PARTITION %s VALUES LESS THAN (MAXVALUE)" % FUTURE_PARTITION)
+    connection.execute(text("ALTER TABLE trends PARTITION BY RANGE COLUMNS(date) (%s)" % ", ".join(definitions)))
+    log.info("Partitioned trends from %s to %s", months[0], months[-1])
+
+
+def create_partitions(connection, months_ahead):
+    """Split the catch-all partition so that every month up to months_ahead from now has its own, returns their names"""
+    partitions = get_partitions(connection)
+    if not partitions:
+        raise ValueError("The trends table is not partitioned, run the migrations first")
+    months = get_months(add_months(partitions[-1][1], 1), add_months(date.today(), months_ahead))
+    if not months:
+        return []
+    definitions = [get_partition_definition(month) for month in months]
+    definitions.append("PARTITION %s VALUES LESS THAN (MAXVALUE)" % FUTURE_PARTITION)
+    connection.execute(text("ALTER TABLE trends REORGANIZE PARTITION %s INTO (%s)" %
+                            (FUTURE_PARTITION, ", ".join(definitions))))
+    return [month.strftime(PARTITION_FORMAT) for month in months]
+
+
+def compact_month(connection, month, batch_size=10000):
+    """
+    Recompute the rollups of the buckets starting in a month from its trends, flagged as compacted so that they
+    are no longer recomputed once the month is dropped. Weeks starting in the month are read whole from the
+    following month, weeks starting in the previous month were compacted with it
+    """
+    start, end = month, add_months(month, 1)
+    table = Trend.__table__
+    rows = connection.execution_options(stream_results=True).execute(
+        table.select()
+        .with_only_columns([table.c.keyword, table.c.engine, table.c.date, table.c.position])
+        .where(and_(table.c.date >= start, table.c.date < get_next_bucket("week", end - timedelta(days=1)))))
+    rollups = [dict(rollup, compacted=True) for rollup in aggregate(rows) if start <= rollup["bucket"] < end]
+    for offset in range(0, len(rollups), batch_size):
+        upsert(connection, TrendRollup.__table__, rollups[offset:offset + batch_size],
+               ["keyword", "engine", "granularity", "bucket"])
+    return len(rollups)
+
+
+def compact_partitions(engine, retention_months):
+    """Compact every month older than retention_months into rollups, oldest first, then drop its partition"""
+    cutoff = add_months(date.today(), -retention_months)
+    with engine.connect() as connection:
+        partitions = get_partitions(connection)
+    compacted = []
+    for name, month in partitions:
+        if month >= cutoff:
+            break
+        with engine.begin() as connection:
+            rollups = compact_month(connection, month)
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE trends DROP PARTITION %s" % name))
+            bump_versions(connection, [TRENDS_VERSION])
+        log.info("Compacted partition %s into %s rollups", name, rollups)
+        compacted.append(name)
+    return compacted
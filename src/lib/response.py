@@ -2,6 +2,43 @@
 
 """Custom http response handler"""
 
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS if orjson else None
+
+
+def _default(value):
+    """Encode the values json can't, the same way connexion does"""
+    if isinstance(value, datetime):
+        return value.isoformat() if value.tzinfo else value.isoformat() + "Z"
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError("Object of type %s is not JSON serializable" % type(value).__name__)
+
+
+def dumps(value):
+    """Encode value to json bytes, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=ORJSON_OPTIONS)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def loads(value):
+    """Decode json bytes, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
 
 class HttpResponse():
     """Custom http response class"""
@@ -20,10 +57,13 @@ class HttpResponse():
             "error": error
         }
 
+    def _encode(self, status, http_status, **kwargs):
+        return Response(dumps(self._resp(status, **kwargs)), status=http_status.value, mimetype="application/json")
+
     def success(self, status, **kwargs):
         """Returns successful http request"""
-        return self._resp("success", **kwargs), status.value
+        return self._encode("success", status, **kwargs)
 
     def failure(self, status, **kwargs):
         """Returns failed http request"""
-        return self._resp("failure", **kwargs), status.value
+        return self._encode("failure", status, **kwargs)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Weekly and monthly trend rollups"""
+
+import logging
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import event, and_, inspect, tuple_
+from sqlalchemy.orm import Session
+from src.lib.series import delete_keyword_series, refresh_series, validate_position
+from src.lib.sql import upsert
+from src.model.orm import Keyword, Trend, TrendRollup
+
+log = logging.getLogger(__name__)
+
+MAX_RANK = 100
+GRANULARITIES = ("week", "month")
+
+
+def get_bucket(granularity, date):
+    """Get the first day of the bucket containing date"""
+    if granularity == "week":
+        return date - timedelta(days=date.weekday())
+    return date.replace(day=1)
+
+
+def get_next_bucket(granularity, date):
+    """Get the first day of the bucket following the one containing date"""
+    if granularity == "week":
+        return get_bucket(granularity, date) + timedelta(days=7)
+    return (date.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def aggregate(rows):
+    """
+    Aggregate (keyword, engine, date, position) rows into rollup rows for every granularity.
+    Unranked positions (-1) count as MAX_RANK
+    """
+    buckets = {}
+    for keyword, engine, date, position in rows:
+        position = position if position != -1 else MAX_RANK
+        for granularity in GRANULARITIES:
+            key = (keyword, engine, granularity, get_bucket(granularity, date))
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = [position, position, 1, position, date]
+                continue
+            bucket[0] = min(bucket[0], position)
+            bucket[1] += position
+            bucket[2] += 1
+            if date >= bucket[4]:
+                bucket[3] = position
+                bucket[4] = date
+    return [{"keyword": keyword, "engine": engine, "granularity": granularity, "bucket": bucket,
+             "best": best, "average": total / samples, "last": last, "samples": samples}
+            for (keyword, engine, granularity, bucket), (best, total, samples, last, _) in buckets.items()]
+
+
+def get_compacted_buckets(connection, condition):
+    """Get the (keyword, engine, granularity, bucket) of the compacted rollups matching a condition"""
+    table = TrendRollup.__table__
+    return {tuple(row) for row in connection.execute(
+        table.select()
+        .with_only_columns([table.c.keyword, table.c.engine, table.c.granularity, table.c.bucket])
+        .where(and_(table.c.compacted.is_(True), condition)))}
+
+
+def refresh_rollups(connection, trends):
+    """
+    Recompute the rollups of every bucket touched by the given (keyword, engine, date) trends, deleting the
+    ones left without any trend. Compacted buckets are left as they are, their daily trends are gone
+    """
+    trends = set(trends)
+    if not trends:
+        return
+    touched = {(keyword, engine, granularity, get_bucket(granularity, date))
+               for keyword, engine, date in trends for granularity in GRANULARITIES}
+    table = TrendRollup.__table__
+    compacted = get_compacted_buckets(connection, tuple_(table.c.keyword, table.c.engine, table.c.granularity,
+                                                         table.c.bucket).in_(list(touched)))
+    if compacted:
+        log.warning("Skipped %s compacted rollups written to after their trends were dropped", len(compacted))
+        touched -= compacted
+        if not touched:
+            return
+    dates = [date for _, _, date in trends]
+    start = min(get_bucket(granularity, min(dates)) for granularity in GRANULARITIES)
+    end = max(get_next_bucket(granularity, max(dates)) for granularity in GRANULARITIES)
+
+    table = Trend.__table__
+    rows = connection.execute(
+        table.select()
+        .with_only_columns([table.c.keyword, table.c.engine, table.c.date, table.c.position])
+        .where(and_(table.c.keyword.in_({keyword for keyword, _, _ in trends}),
+                    table.c.engine.in_({engine for _, engine, _ in trends}),
+                    table.c.date >= start, table.c.date < end)))
+    rollups = [rollup for rollup in aggregate(rows)
+               if (rollup["keyword"], rollup["engine"], rollup["granularity"], rollup["bucket"]) in touched]
+    upsert(connection, TrendRollup.__table__, rollups, ["keyword", "engine", "granularity", "bucket"])
+    empty = touched - {(rollup["keyword"], rollup["engine"], rollup["granularity"], rollup["bucket"])
+                       for rollup in rollups}
+    if empty:
+        table = TrendRollup.__table__
+        connection.execute(table.delete().where(
+            tuple_(table.c.keyword, table.c.engine, table.c.granularity, table.c.bucket).in_(list(empty))))
+
+
+def delete_keyword_rollups(connection, keyword_ids):
+    """Delete the rollups of removed keywords"""
+    if keyword_ids:
+        table = TrendRollup.__table__
+        connection.execute(table.delete().where(table.c.keyword.in_(list(keyword_ids))))
+
+
+def backfill_rollups(engine, batch_size=10000):
+    """
+    Rebuild the rollups of every keyword from the trends table, one transaction per keyword. Compacted rollups are
+    kept, their daily trends are gone
+    """
+    table = Trend.__table__
+    with engine.connect() as connection:
+        keywords = [row[0] for row in connection.execute(
+            table.select().with_only_columns([table.c.keyword]).distinct())]
+    for idx, keyword in enumerate(keywords):
+        with engine.begin() as connection:
+            rows = connection.execute(
+                table.select()
+                .with_only_columns([table.c.keyword, table.c.engine, table.c.date, table.c.position])
+                .where(table.c.keyword == keyword))
+            compacted = get_compacted_buckets(connection, TrendRollup.__table__.c.keyword == keyword)
+            rollups = [rollup for rollup in aggregate(rows) if (rollup["keyword"], rollup["engine"],
+                                                                rollup["granularity"], rollup["bucket"])
+                       not in compacted]
+            for offset in range(0, len(rollups), batch_size):
+                upsert(connection, TrendRollup.__table__, rollups[offset:offset + batch_size],
+                       ["keyword", "engine", "granularity", "bucket"])
+        log.info("Backfilled rollups for keyword %s/%s (%s)", idx + 1, len(keywords), keyword)
+
+
+def get_trend_keys(trend):
+    """Get the (keyword, engine, date) of a trend, and the one it had before being modified in this flush"""
+    state = inspect(trend)
+    keys = {(trend.keyword, trend.engine, trend.date)}
+    histories = [state.attrs[name].history for name in ("keyword", "engine", "date")]
+    if any(history.deleted for history in histories):
+        keys.add(tuple(history.deleted[0] if history.deleted else history.unchanged[0] for history in histories))
+    return keys
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_rollups_after_flush(session, flush_context):
+    """
+    Keep rollups and series up to date when trends or keywords are added, modified or deleted through the orm,
+    rollups only when TREND_ROLLUPS is set and series only when TREND_STORAGE is packed, as in the ingestion worker
+    """
+    # (keyword, engine, date) of the trends written, with their position, None for the days left without a trend
+    trends = {}
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Trend):
+            trends.update((key, None) for key in get_trend_keys(obj))
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Trend) and obj not in session.deleted:
+            trends[(obj.keyword, obj.engine, obj.date)] = validate_position(obj.position)
+    if trends:
+        if current_app.config.get("TREND_ROLLUPS"):
+            refresh_rollups(session.connection(), set(trends))
+        if current_app.config.get("TREND_STORAGE") == "packed":
+            refresh_series(session.connection(), [key + (position,) for key, position in trends.items()])
+    keywords = [obj.id for obj in session.deleted if isinstance(obj, Keyword)]
+    delete_keyword_rollups(session.connection(), keywords)
+    delete_keyword_series(session.connection(), keywords)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Routing of the database session between the primary and a read replica"""
+
+import time
+import logging
+from functools import wraps
+from flask import _request_ctx_stack, current_app
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from .cache import LRUCache, get_store
+
+log = logging.getLogger(__name__)
+
+REPLICA_BIND = "replica"
+
+CONFIG_DEFAULTS = {
+    # Seconds a user keeps reading from the primary after writing, longer than the replication lag
+    "DATABASE_REPLICA_STICKINESS": 5,
+    "DATABASE_REPLICA_STORE_URL": None,
+    "DATABASE_REPLICA_WRITERS_SIZE": 10000,
+}
+
+
+class RoutingSession(SignallingSession):
+    """
+    Session sending the queries of read only operations to the replica bind, when one is configured. Once the
+    session has written, its following queries go to the primary so that it reads its own writes, and so do the
+    requests of the same user for the next few seconds
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if clause is not None and getattr(clause, "is_dml", False):
+            self.info["wrote"] = True
+        if self.info.get("read_only") and not self.info.get("wrote") and not self._flushing \
+                and REPLICA_BIND in (self.app.config.get("SQLALCHEMY_BINDS") or {}):
+            return self.db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause, **kwargs)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+def get_username():
+    """Get the authenticated user of the current request, None outside of one"""
+    return getattr(_request_ctx_stack.top, "cogauth_username", None)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _after_commit(session):
+    username = get_username()
+    if session.info.get("wrote") and username:
+        session.db.mark_writer(username)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy whose sessions route read only operations to the replica. Users who just wrote are kept in a
+    bounded lru per worker, in front of an optional store shared by every worker
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.writers = None
+        self.writer_store = None
+        self.stickiness = None
+        super().__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        """Initializes the database for flask"""
+        for key, value in CONFIG_DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.writers = LRUCache(app.config.get("DATABASE_REPLICA_WRITERS_SIZE"))
+        self.writer_store = get_store(app.config.get("DATABASE_REPLICA_STORE_URL"))
+        # Without a replica every read goes to the primary already
+        self.stickiness = app.config.get("DATABASE_REPLICA_STICKINESS") \
+            if REPLICA_BIND in (app.config.get("SQLALCHEMY_BINDS") or {}) else 0
+        super().init_app(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def _writer_key(self, username):
+        return "replica-writer:%s" % username
+
+    def mark_writer(self, username):
+        """Send the reads of a user to the primary for the next stickiness seconds"""
+        if self.writers is None or not self.stickiness:
+            return
+        self.writers.set(username, True, expires_at=time.time() + self.stickiness)
+        if self.writer_store is not None:
+            try:
+                self.writer_store.set(self._writer_key(username), b"1", ttl=self.stickiness)
+            except Exception as exception:
+                log.error("Unable to mark user (%s) as a writer: %s", username, exception)
+
+    def is_writer(self, username):
+        """Whether a user wrote in the last stickiness seconds"""
+        if self.writers is None or not self.stickiness:
+            return False
+        if self.writers.get(username):
+            return True
+        if self.writer_store is None:
+            return False
+        try:
+            return self.writer_store.get(self._writer_key(username)) is not None
+        except Exception as exception:
+            # Reading from the primary is always safe
+            log.error("Unable to check whether user (%s) is a writer: %s", username, exception)
+            return True
+
+
+def read_only(func):
+    """
+    Mark an operation as read only, so that its queries may be served by the replica unless the user just wrote
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        db = current_app.extensions["sqlalchemy"].db
+        session = db.session
+        username = get_username()
+        if not (username and db.is_writer(username)):
+            session.info["read_only"] = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            session.info.pop("read_only", None)
+    return wrapper
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""Precompiled model serializers"""
+
+from operator import attrgetter
+from sqlalchemy import inspect
+
+
+class ModelSerializer():
+    """Serializer of a model whose columns are resolved once, instead of on every call like SerializerMixin"""
+
+    def __init__(self, model, only=None):
+        self.columns = tuple(attribute.key for attribute in inspect(model).column_attrs
+                             if only is None or attribute.key in only)
+        self.attributes = tuple(getattr(model, column) for column in self.columns)
+        self._getter = attrgetter(*self.columns)
+
+    def __call__(self, obj):
+        """Serialize a model instance"""
+        values = self._getter(obj)
+        if len(self.columns) == 1:
+            values = (values,)
+        return dict(zip(self.columns, values))
+
+    def from_row(self, row):
+        """Serialize a row whose first columns are the serializer attributes"""
+        return dict(zip(self.columns, row))
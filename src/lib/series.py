@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Packed monthly position series: one byte per day of a (keyword, engine, month)"""
+
+import logging
+import calendar
+from datetime import timedelta
+from sqlalchemy import and_, tuple_
+from src.config import db
+from src.lib.sql import upsert
+from src.model.orm import Keyword, Trend, TrendSeries, Website
+
+log = logging.getLogger(__name__)
+
+# Byte values of the days without any rank, and of unranked (-1) positions
+MISSING = 0
+UNRANKED = 255
+
+
+def get_month(day):
+    """Get the first day of the month of a date"""
+    return day.replace(day=1)
+
+
+def get_month_days(month):
+    """Get the number of days of a month"""
+    return calendar.monthrange(month.year, month.month)[1]
+
+
+def validate_position(position):
+    """Get a position, raises ValueError unless it is a rank or -1 for unranked"""
+    if position != -1 and position < 1:
+        raise ValueError("Invalid position: %s" % position)
+    return position
+
+
+def encode(position):
+    """Encode a position into a byte, positions past the last byte value are kept as the last one"""
+    if validate_position(position) == -1:
+        return UNRANKED
+    return min(position, UNRANKED - 1)
+
+
+def decode(value):
+    """Decode a byte into a position"""
+    return -1 if value == UNRANKED else value
+
+
+def pack(trends, series=None):
+    """
+    Patch (keyword, engine, date, position) trends into the series of their (keyword, engine, month), starting
+    from the given {(keyword, engine, month): bytes} series, returns the patched series. A None position clears
+    its day
+    """
+    patched = {}
+    for keyword, engine, day, position in trends:
+        key = (keyword, engine, get_month(day))
+        positions = patched.get(key)
+        if positions is None:
+            existing = (series or {}).get(key)
+            positions = patched[key] = bytearray(existing if existing is not None else get_month_days(key[2]))
+        positions[day.day - 1] = encode(position) if position is not None else MISSING
+    return patched
+
+
+def refresh_series(connection, trends):
+    """Write (keyword, engine, date, position) trends into their series in place, locking the series it patches"""
+    trends = list(trends)
+    if not trends:
+        return
+    keys = {(keyword, engine, get_month(day)) for keyword, engine, day, _ in trends}
+    table = TrendSeries.__table__
+    existing = connection.execute(
+        table.select()
+        .where(tuple_(table.c.keyword, table.c.engine, table.c.month).in_(list(keys)))
+        .with_for_update())
+    series = pack(trends, {(row.keyword, row.engine, row.month): row.positions for row in existing})
+    upsert(connection, table, [{"keyword": keyword, "engine": engine, "month": month, "positions": bytes(positions)}
+                               for (keyword, engine, month), positions in sorted(series.items())],
+           ["keyword", "engine", "month"])
+
+
+def delete_keyword_series(connection, keyword_ids):
+    """Delete the series of removed keywords"""
+    if keyword_ids:
+        table = TrendSeries.__table__
+        connection.execute(table.delete().where(table.c.keyword.in_(list(keyword_ids))))
+
+
+def get_series_rows_query(website_id, engine, since=None, until=None):
+    """Get the query of the (keyword id, keyword name, month, positions) series of every keyword of a website"""
+    condition = and_(TrendSeries.keyword == Keyword.id, TrendSeries.engine == engine)
+    if since is not None:
+        condition = and_(condition, TrendSeries.month >= get_month(since + timedelta(days=1)))
+    if until is not None:
+        condition = and_(condition, TrendSeries.month <= until)
+    return db.session.query(Keyword.id, Keyword.name, TrendSeries.month, TrendSeries.positions) \
+        .outerjoin(TrendSeries, condition) \
+        .filter(Keyword.websiteId == website_id)
+
+
+def get_user_series_rows_query(username, engines, since=None, until=None):
+    """
+    Get the query of the (website id, keyword id, keyword name, engine, month, positions) series of every keyword
+    of the websites of a user
+    """
+    condition = and_(TrendSeries.keyword == Keyword.id, TrendSeries.engine.in_(engines))
+    if since is not None:
+        condition = and_(condition, TrendSeries.month >= get_month(since + timedelta(days=1)))
+    if until is not None:
+        condition = and_(condition, TrendSeries.month <= until)
+    return db.session.query(Keyword.websiteId, Keyword.id, Keyword.name, TrendSeries.engine, TrendSeries.month,
+                            TrendSeries.positions) \
+        .join(Website, Website.id == Keyword.websiteId) \
+        .outerjoin(TrendSeries, condition) \
+        .filter(Website.username == username)
+
+
+def decode_series(month, positions, since=None, until=None):
+    """Get the (date, position) ranks of a series after since and until until, through a memory view of its bytes"""
+    view = memoryview(positions)
+    first = (since - month).days + 1 if since is not None and since >= month else 0
+    last = min(len(view), (until - month).days + 1) if until is not None else len(view)
+    return [(month + timedelta(days=offset), decode(view[offset])) for offset in range(first, last)
+            if view[offset] != MISSING]
+
+
+def get_series_trend_rows(website_id, engine, since=None, until=None):
+    """
+    Fetch the series of a website and decode them into the (keyword id, keyword name, date, position) rows of the
+    trends table
+    """
+    rows = []
+    keywords = {}
+    for keyword_id, name, month, positions in get_series_rows_query(website_id, engine, since, until):
+        keywords[keyword_id] = name
+        if month is not None:
+            rows.extend((keyword_id, name, day, position) for day, position in
+                        decode_series(month, positions, since, until))
+    ranked = {row[0] for row in rows}
+    rows.extend((keyword_id, name, None, None) for keyword_id, name in keywords.items() if keyword_id not in ranked)
+    return rows
+
+
+def get_user_series_trend_rows(username, engines, since=None, until=None):
+    """
+    Fetch the series of the websites of a user and decode them into (website id, keyword id, keyword name, engine,
+    date, position) rows
+    """
+    rows = []
+    keywords = {}
+    for website_id, keyword_id, name, engine, month, positions in \
+            get_user_series_rows_query(username, engines, since, until):
+        keywords[keyword_id] = (website_id, name)
+        if month is not None:
+            rows.extend((website_id, keyword_id, name, engine, day, position) for day, position in
+                        decode_series(month, positions, since, until))
+    ranked = {row[1] for row in rows}
+    rows.extend((website_id, keyword_id, name, None, None, None) for keyword_id, (website_id, name)
+                in keywords.items() if keyword_id not in ranked)
+    return rows
+
+
+def backfill_series(engine, batch_size=1000):
+    """Rebuild the series of every keyword from the trends table, one transaction per keyword"""
+    table = Trend.__table__
+    with engine.connect() as connection:
+        keywords = [row[0] for row in connection.execute(
+            table.select().with_only_columns([table.c.keyword]).distinct())]
+    for idx, keyword in enumerate(keywords):
+        with engine.begin() as connection:
+            rows = connection.execute(
+                table.select()
+                .with_only_columns([table.c.keyword, table.c.engine, table.c.date, table.c.position])
+                .where(table.c.keyword == keyword))
+            series = [{"keyword": keyword, "engine": search_engine, "month": month, "positions": bytes(positions)}
+                      for (_, search_engine, month), positions in sorted(pack(rows).items())]
+            for offset in range(0, len(series), batch_size):
+                upsert(connection, TrendSeries.__table__, series[offset:offset + batch_size],
+                       ["keyword", "engine", "month"])
+        log.info("Backfilled series for keyword %s/%s (%s)", idx + 1, len(keywords), keyword)
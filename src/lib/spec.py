@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""OpenAPI spec loading, from a json copy of the yaml spec when it is up to date"""
+
+import os
+import hashlib
+import logging
+import orjson
+import yaml
+
+log = logging.getLogger(__name__)
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "swagger", "serpbot.yaml")
+# The libyaml loader is an order of magnitude faster than the pure python one connexion would use
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def get_cache_path(path):
+    """Get the path of the json copy of a yaml spec"""
+    return os.path.splitext(path)[0] + ".json"
+
+
+def parse_spec(source):
+    """Parse the yaml source of a spec"""
+    return yaml.load(source, Loader=YAML_LOADER)
+
+
+def build_spec_cache(path):
+    """Write the json copy of a yaml spec, tagged with the hash of its source, returns the spec"""
+    with open(path, "rb") as f:
+        source = f.read()
+    spec = parse_spec(source)
+    with open(get_cache_path(path), "wb") as f:
+        f.write(orjson.dumps({"source": hashlib.sha256(source).hexdigest(), "spec": spec},
+                             option=orjson.OPT_NON_STR_KEYS))
+    return spec
+
+
+def load_spec(path):
+    """
+    Load a yaml spec from its json copy, which is rebuilt when missing or out of date. The yaml is parsed
+    directly when the copy cannot be written
+    """
+    with open(path, "rb") as f:
+        source = f.read()
+    try:
+        with open(get_cache_path(path), "rb") as f:
+            cache = orjson.loads(f.read())
+        if cache["source"] == hashlib.sha256(source).hexdigest():
+            return cache["spec"]
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        return build_spec_cache(path)
+    except OSError as exception:
+        log.warning("Unable to cache the spec (%s): %s", path, exception)
+        return parse_spec(source)
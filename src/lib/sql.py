@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""Dialect specific sql helpers"""
+
+from sqlalchemy.dialects import mysql, sqlite
+
+
+def upsert(connection, table, rows, keys, update=None):
+    """
+    Insert rows in a single statement, replacing the update columns of the rows that already exist, every non key
+    column by default
+    """
+    if not rows:
+        return
+    columns = update if update is not None else [column for column in rows[0] if column not in keys]
+    if connection.dialect.name == "mysql":
+        statement = mysql.insert(table)
+        statement = statement.on_duplicate_key_update({column: statement.inserted[column] for column in columns})
+    elif connection.dialect.name == "sqlite":
+        statement = sqlite.insert(table)
+        statement = statement.on_conflict_do_update(index_elements=keys,
+                                                    set_={column: statement.excluded[column] for column in columns})
+    else:
+        raise NotImplementedError("Upsert is not supported for %s" % connection.dialect.name)
+    connection.execute(statement, rows)
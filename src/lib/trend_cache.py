@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""Trend chart result cache"""
+
+import time
+import logging
+import threading
+from .cache import LRUCache, get_store
+from .response import dumps, loads
+
+log = logging.getLogger(__name__)
+
+CONFIG_DEFAULTS = {
+    "TREND_CACHE_SIZE": 256,
+    "TREND_CACHE_TTL": 300,
+    "TREND_CACHE_STORE_URL": None,
+}
+
+
+class TrendCache():
+    """
+    Two tier cache of trend charts keyed by (website, engine, view, version): a bounded lru per worker in front
+    of an optional store shared by every worker, holding charts as json. Invalidating a website bumps its
+    generation, which is part of every key, so that entries of both tiers stop matching
+    """
+
+    def __init__(self, app=None):
+        self.local = None
+        self.store = None
+        self.ttl = None
+        self.generations = {}
+        self.shared_hits = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initializes the trend cache for flask"""
+        for key, value in CONFIG_DEFAULTS.items():
+            app.config.setdefault(key, value)
+        self.local = LRUCache(app.config.get("TREND_CACHE_SIZE"))
+        self.store = get_store(app.config.get("TREND_CACHE_STORE_URL"))
+        self.ttl = app.config.get("TREND_CACHE_TTL")
+        app.extensions["trend_cache"] = self
+
+    def _generation_key(self, website_id):
+        return "trend-generation:%s" % website_id
+
+    def _key(self, website_id, engine, view, version):
+        generation = self.generations.get(website_id, 0)
+        if self.store is not None:
+            generation = (generation, int(self.store.get(self._generation_key(website_id)) or 0))
+        return "trend:%s:%s:%s:%s:%s" % (website_id, engine, view, version, generation)
+
+    def get(self, website_id, engine, view, version):
+        """Get a cached chart, None when neither tier has it"""
+        if self.local is None:
+            return None
+        try:
+            key = self._key(website_id, engine, view, version)
+            trend = self.local.get(key)
+            if trend is not None or self.store is None:
+                return trend
+            value = self.store.get(key)
+        except Exception as exception:
+            log.error("Unable to read cached trends of website (%s): %s", website_id, exception)
+            return None
+        if value is None:
+            return None
+        # Charts are served as json, so one decoded from the store is served as it was cached
+        trend = loads(value)
+        self.local.set(key, trend, expires_at=time.time() + self.ttl)
+        with self._lock:
+            self.shared_hits += 1
+        return trend
+
+    def set(self, website_id, engine, view, version, trend):
+        """Cache a chart in both tiers"""
+        if self.local is None:
+            return
+        try:
+            key = self._key(website_id, engine, view, version)
+            self.local.set(key, trend, expires_at=time.time() + self.ttl)
+            if self.store is not None:
+                self.store.set(key, dumps(trend), ttl=self.ttl)
+        except Exception as exception:
+            log.error("Unable to cache trends of website (%s): %s", website_id, exception)
+
+    def invalidate(self, website_id):
+        """Drop every cached chart of a website"""
+        with self._lock:
+            self.generations[website_id] = self.generations.get(website_id, 0) + 1
+            self.invalidations += 1
+        if self.store is not None:
+            try:
+                self.store.incr(self._generation_key(website_id))
+            except Exception as exception:
+                log.error("Unable to invalidate cached trends of website (%s): %s", website_id, exception)
+
+    def stats(self):
+        """Get the cache counters"""
+        return {"size": len(self.local) if self.local is not None else 0,
+                "hits": self.local.hits if self.local is not None else 0,
+                "shared_hits": self.shared_hits,
+                "misses": (self.local.misses if self.local is not None else 0) - self.shared_hits,
+                "evictions": self.local.evictions if self.local is not None else 0,
+                "invalidations": self.invalidations}
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""Set-based trend matrix builder"""
+
+import logging
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import Date, and_, case, func, select
+from src.config import db
+from src.lib.rollups import MAX_RANK, get_bucket, get_next_bucket, aggregate as aggregate_rollups
+from src.lib.series import get_series_trend_rows, get_user_series_trend_rows
+from src.lib.versions import TRENDS_VERSION, get_trend_version_name, get_validators, get_website_version_name
+from src.model.orm import Keyword, Trend, TrendRollup, Website
+
+log = logging.getLogger(__name__)
+
+ENGINES = ("google", "bing")
+PERIODS = {"7d": 7, "30d": 30, "all": None}
+RESOLUTIONS = ("day", "week", "month")
+AGGREGATES = ("best", "average", "last")
+# Longest span of history, in days, charted at each granularity
+GRANULARITY_SPANS = (("day", 90), ("week", 730), ("month", None))
+# Approximate length of a bucket, in days, used to count the points of a chart
+BUCKET_DAYS = {"day": 1, "week": 7, "month": 30}
+
+
+def get_period_start(period):
+    """Get the last date excluded from a period, None when the period is unbounded"""
+    days = PERIODS[period]
+    if days is None:
+        return None
+    return (datetime.today() - timedelta(days=days)).date()
+
+
+def get_trend_rows_query(website_id, engine, since=None, until=None):
+    """Get the query of the (keyword id, keyword name, date, position) rows of every keyword of a website"""
+    condition = and_(Trend.keyword == Keyword.id, Trend.engine == engine)
+    if since is not None:
+        condition = and_(condition, Trend.date > since)
+    if until is not None:
+        condition = and_(condition, Trend.date <= until)
+    return db.session.query(Keyword.id, Keyword.name, Trend.date, Trend.position) \
+        .outerjoin(Trend, condition) \
+        .filter(Keyword.websiteId == website_id)
+
+
+def get_trend_rows(website_id, engine, since=None, until=None):
+    """
+    Fetch (keyword id, keyword name, date, position) rows of every keyword of a website in a single query.
+    Keywords without any trend in the period come back once with a null date and position
+    """
+    return get_trend_rows_query(website_id, engine, since=since, until=until).all()
+
+
+def get_user_trend_rows_query(username, engines, since=None, until=None):
+    """
+    Get the query of the (website id, keyword id, keyword name, engine, date, position) rows of every keyword of
+    the websites of a user
+    """
+    condition = and_(Trend.keyword == Keyword.id, Trend.engine.in_(engines))
+    if since is not None:
+        condition = and_(condition, Trend.date > since)
+    if until is not None:
+        condition = and_(condition, Trend.date <= until)
+    return db.session.query(Keyword.websiteId, Keyword.id, Keyword.name, Trend.engine, Trend.date, Trend.position) \
+        .join(Website, Website.id == Keyword.websiteId) \
+        .outerjoin(Trend, condition) \
+        .filter(Website.username == username)
+
+
+def get_user_trend_rows(username, engines, since=None, until=None):
+    """
+    Fetch (website id, keyword id, keyword name, engine, date, position) rows of every keyword of the websites of
+    a user in a single query. Keywords without any trend come back once with a null engine, date and position
+    """
+    return get_user_trend_rows_query(username, engines, since=since, until=until).all()
+
+
+class RowStore():
+    """Daily trends read from the trends table, one row per keyword, engine and day"""
+
+    def get_rows(self, website_id, engine, since=None, until=None):
+        """Get the (keyword id, keyword name, date, position) rows of every keyword of a website"""
+        return get_trend_rows(website_id, engine, since=since, until=until)
+
+    def get_user_rows(self, username, engines, since=None, until=None):
+        """Get the (website id, keyword id, keyword name, engine, date, position) rows of the websites of a user"""
+        return get_user_trend_rows(username, engines, since=since, until=until)
+
+    def get_bucketed_rows(self, website_id, engine, granularity, aggregate="last", since=None, until=None):
+        """Get the (keyword id, keyword name, bucket, aggregated position) rows of a website, grouped in SQL"""
+        return get_grouped_trend_rows(website_id, engine, granularity, aggregate, since=since, until=until)
+
+
+class PackedStore():
+    """Daily trends read from the trend_series table, one packed series per keyword, engine and month"""
+
+    def get_rows(self, website_id, engine, since=None, until=None):
+        """Get the (keyword id, keyword name, date, position) rows of every keyword of a website"""
+        return get_series_trend_rows(website_id, engine, since=since, until=until)
+
+    def get_user_rows(self, username, engines, since=None, until=None):
+        """Get the (website id, keyword id, keyword name, engine, date, position) rows of the websites of a user"""
+        return get_user_series_trend_rows(username, engines, since=since, until=until)
+
+    def get_bucketed_rows(self, website_id, engine, granularity, aggregate="last", since=None, until=None):
+        """Get the (keyword id, keyword name, bucket, aggregated position) rows of a website, from its unpacked days"""
+        return bucket_rows(get_series_trend_rows(website_id, engine, since=since, until=until), granularity,
+                           aggregate)
+
+
+TREND_STORES = {"rows": RowStore, "packed": PackedStore}
+
+
+def get_trend_store(name=None):
+    """Get the store of daily trends, from TREND_STORAGE unless a name is given"""
+    name = name or current_app.config.get("TREND_STORAGE") or "rows"
+    if name not in TREND_STORES:
+        raise ValueError("Unsupported trend storage: %s" % name)
+    return TREND_STORES[name]()
+
+
+def get_rollup_rows_query(website_id, engine, granularity, aggregate="last", since=None, until=None):
+    """Get the query of the (keyword id, keyword name, bucket, aggregated position) rollup rows of a website"""
+    condition = and_(TrendRollup.keyword == Keyword.id, TrendRollup.engine == engine,
+                     TrendRollup.granularity == granularity)
+    if since is not None:
+        condition = and_(condition, TrendRollup.bucket >= get_bucket(granularity, since + timedelta(days=1)))
+    if until is not None:
+        condition = and_(condition, TrendRollup.bucket <= until)
+    return db.session.query(Keyword.id, Keyword.name, TrendRollup.bucket, getattr(TrendRollup, aggregate)) \
+        .outerjoin(TrendRollup, condition) \
+        .filter(Keyword.websiteId == website_id)
+
+
+def get_rollup_rows(website_id, engine, granularity, aggregate="last", since=None, until=None):
+    """
+    Fetch (keyword id, keyword name, bucket, aggregated position) rollup rows of every keyword of a website.
+    Buckets overlapping the period are returned whole. Keywords without any rollup come back once with a null
+    bucket and position
+    """
+    rows = get_rollup_rows_query(website_id, engine, granularity, aggregate, since, until).all()
+    if aggregate == "average":
+        return [(keyword_id, name, bucket, round(position, 1) if position is not None else None)
+                for keyword_id, name, bucket, position in rows]
+    return rows
+
+
+def get_user_rollup_rows_query(username, engines, granularity, aggregate="last", since=None, until=None):
+    """
+    Get the query of the (website id, keyword id, keyword name, engine, bucket, aggregated position) rollup rows
+    of every keyword of the websites of a user
+    """
+    condition = and_(TrendRollup.keyword == Keyword.id, TrendRollup.engine.in_(engines),
+                     TrendRollup.granularity == granularity)
+    if since is not None:
+        condition = and_(condition, TrendRollup.bucket >= get_bucket(granularity, since + timedelta(days=1)))
+    if until is not None:
+        condition = and_(condition, TrendRollup.bucket <= until)
+    return db.session.query(Keyword.websiteId, Keyword.id, Keyword.name, TrendRollup.engine, TrendRollup.bucket,
+                            getattr(TrendRollup, aggregate)) \
+        .join(Website, Website.id == Keyword.websiteId) \
+        .outerjoin(TrendRollup, condition) \
+        .filter(Website.username == username)
+
+
+def get_user_rollup_rows(username, engines, granularity, aggregate="last", since=None, until=None):
+    """
+    Fetch (website id, keyword id, keyword name, engine, bucket, aggregated position) rollup rows of every keyword
+    of the websites of a user in a single query
+    """
+    rows = get_user_rollup_rows_query(username, engines, granularity, aggregate, since, until).all()
+    if aggregate == "average":
+        return [row[:5] + (round(row[5], 1) if row[5] is not None else None,) for row in rows]
+    return rows
+
+
+def get_bucket_range(granularity, since=None, until=None):
+    """Widen a period to the whole buckets overlapping it"""
+    if since is not None:
+        since = get_bucket(granularity, since + timedelta(days=1)) - timedelta(days=1)
+    if until is not None:
+        until = get_next_bucket(granularity, until) - timedelta(days=1)
+    return since, until
+
+
+def bucket_rows(rows, granularity, aggregate="last"):
+    """
+    Aggregate (keyword id, keyword name, date, position) rows into the (keyword id, keyword name, bucket,
+    aggregated position) rows of a granularity, the way rollups are computed
+    """
+    names = {keyword_id: name for keyword_id, name, _, _ in rows}
+    rollups = [rollup for rollup in aggregate_rollups((keyword_id, None, day, position)
+                                                      for keyword_id, _, day, position in rows if day is not None)
+               if rollup["granularity"] == granularity]
+    bucketed = [(rollup["keyword"], names[rollup["keyword"]], rollup["bucket"],
+                 round(rollup[aggregate], 1) if aggregate == "average" else rollup[aggregate]) for rollup in rollups]
+    bucketed.extend((keyword_id, name, None, None) for keyword_id, name, day, _ in rows if day is None)
+    return bucketed
+
+
+def get_bucket_column(connection, granularity, column):
+    """Get the first day of the bucket containing a date column, the way get_bucket does, on every dialect"""
+    if connection.dialect.name == "mysql":
+        if granularity == "week":
+            return func.subdate(column, func.weekday(column))
+        return func.subdate(column, func.dayofmonth(column) - 1)
+    if granularity == "week":
+        # Forward to the sunday ending the week, then back to its monday
+        return func.date(column, "weekday 0", "-6 days", type_=Date)
+    return func.date(column, "start of month", type_=Date)
+
+
+def get_grouped_trend_rows_query(connection, website_id, engine, granularity, aggregate="last", since=None,
+                                 until=None):
+    """
+    Get the query of the (keyword id, keyword name, bucket, aggregated position) rows of every keyword of a
+    website, grouped by bucket in the database. The last position is joined back from the last day of each bucket
+    """
+    rank = case([(Trend.position == -1, MAX_RANK)], else_=Trend.position)
+    bucket = get_bucket_column(connection, granularity, Trend.date)
+    condition = and_(Trend.engine == engine, Keyword.websiteId == website_id)
+    if since is not None:
+        condition = and_(condition, Trend.date > since)
+    if until is not None:
+        condition = and_(condition, Trend.date <= until)
+    buckets = select([Trend.keyword, bucket.label("bucket"), func.min(rank).label("best"),
+                      func.avg(rank).label("average"), func.max(Trend.date).label("last_date")]) \
+        .select_from(Trend.__table__.join(Keyword.__table__, Keyword.id == Trend.keyword)) \
+        .where(condition) \
+        .group_by(Trend.keyword, bucket) \
+        .subquery("buckets")
+    if aggregate != "last":
+        return db.session.query(Keyword.id, Keyword.name, buckets.c.bucket, buckets.c[aggregate]) \
+            .outerjoin(buckets, buckets.c.keyword == Keyword.id) \
+            .filter(Keyword.websiteId == website_id)
+    return db.session.query(Keyword.id, Keyword.name, buckets.c.bucket, rank) \
+        .outerjoin(buckets, buckets.c.keyword == Keyword.id) \
+        .outerjoin(Trend, and_(Trend.keyword == buckets.c.keyword, Trend.engine == engine,
+                               Trend.date == buckets.c.last_date)) \
+        .filter(Keyword.websiteId == website_id)
+
+
+def get_grouped_trend_rows(website_id, engine, granularity, aggregate="last", since=None, until=None):
+    """
+    Fetch (keyword id, keyword name, bucket, aggregated position) rows of every keyword of a website, aggregated
+    from its daily trends by the database. Keywords without any trend come back once with a null bucket and position
+    """
+    rows = get_grouped_trend_rows_query(db.session.connection(), website_id, engine, granularity, aggregate, since,
+                                        until).all()
+    if aggregate == "average":
+        return [(keyword_id, name, bucket, round(float(position), 1) if position is not None else None)
+                for keyword_id, name, bucket, position in rows]
+    return rows
+
+
+def get_bucketed_rows(website_id, engine, granularity, aggregate="last", since=None, until=None):
+    """
+    Get the same rows as get_rollup_rows, aggregated from the raw trends of the buckets overlapping the period,
+    for databases whose rollups were not backfilled
+    """
+    since, until = get_bucket_range(granularity, since, until)
+    return get_trend_store().get_bucketed_rows(website_id, engine, granularity, aggregate, since=since, until=until)
+
+
+def get_first_trend_date_query(website_id, engine):
+    """Get the query of the first trend date of a website"""
+    return db.session.query(func.min(Trend.date)) \
+        .join(Keyword, Keyword.id == Trend.keyword) \
+        .filter(Keyword.websiteId == website_id, Trend.engine == engine)
+
+
+def get_history_start_query(website_id, engine):
+    """Get the query of the first monthly rollup bucket of a website"""
+    return db.session.query(func.min(TrendRollup.bucket)) \
+        .join(Keyword, Keyword.id == TrendRollup.keyword) \
+        .filter(Keyword.websiteId == website_id, TrendRollup.engine == engine, TrendRollup.granularity == "month")
+
+
+def get_history_start(website_id, engine):
+    """Get the first monthly rollup bucket of a website, None when it has no rollup"""
+    return get_history_start_query(website_id, engine).scalar()
+
+
+def get_trend_version(website_id, engine, view):
+    """
+    Get the (etag, last modified time) validators of the chart of a website, from the versions of its trends and
+    keyword set, without reading either
+    """
+    return get_validators([get_trend_version_name(website_id, engine), get_website_version_name(website_id),
+                           TRENDS_VERSION], website_id, engine, view, date.today())
+
+
+def get_history_span(website_id, engine, since=None, until=None):
+    """Get the number of days charted between since and until, None when the website has no history"""
+    if since is None:
+        if current_app.config.get("TREND_ROLLUPS"):
+            since = get_history_start(website_id, engine)
+        else:
+            since = get_first_trend_date_query(website_id, engine).scalar()
+        if since is None:
+            return None
+    return ((until or date.today()) - since).days
+
+
+def get_granularity(website_id, engine, since=None, until=None, points=None):
+    """
+    Get the granularity of a chart: the finest one fitting in points when they are given, otherwise the
+    coarsest one needed to chart the period, which is raw days unless rollups are enabled. Raises ValueError when
+    even months do not fit in points
+    """
+    if points is None and not current_app.config.get("TREND_ROLLUPS"):
+        return "day"
+    span = get_history_span(website_id, engine, since, until)
+    if span is None:
+        return "day"
+    if points is not None:
+        for granularity in RESOLUTIONS:
+            if span // BUCKET_DAYS[granularity] + 1 <= points:
+                return granularity
+        raise ValueError("Invalid points selected. Must be at least %s to chart the period" %
+                         (span // BUCKET_DAYS[RESOLUTIONS[-1]] + 1))
+    for granularity, days in GRANULARITY_SPANS:
+        if days is None or span <= days:
+            return granularity
+
+
+def get_trend(website_id, engine, since=None, until=None, resolution=None, aggregate="last", points=None):
+    """
+    Get the chart of a website for an engine between since (excluded) and until (included), at a resolution or
+    fitting in points. Weeks and months are read from rollups when they are enabled
+    """
+    granularity = resolution or get_granularity(website_id, engine, since, until, points)
+    if granularity == "day":
+        return build_trend_matrix(get_trend_store().get_rows(website_id, engine, since=since, until=until))
+    if current_app.config.get("TREND_ROLLUPS"):
+        return build_trend_matrix(get_rollup_rows(website_id, engine, granularity, aggregate, since, until))
+    return build_trend_matrix(get_bucketed_rows(website_id, engine, granularity, aggregate, since, until))
+
+
+def build_trend_matrix(rows):
+    """
+    Build the chart result from (keyword id, keyword name, date, position) rows in one pass.
+    Keywords sharing a name are merged into a single line, holding the position of the first of them ranked on each
+    day whatever the order of the rows, and missing days are filled with -1
+    """
+    # Keep the keyword order of the website, which is the order of their ids
+    first_ids = {}
+    for keyword_id, name, _, _ in rows:
+        if name not in first_ids or keyword_id < first_ids[name]:
+            first_ids[name] = keyword_id
+    names = sorted(first_ids, key=first_ids.get)
+    line_of = {name: idx for idx, name in enumerate(names)}
+
+    labels = sorted({row[2] for row in rows if row[2] is not None})
+    column_of = {date: idx for idx, date in enumerate(labels)}
+
+    matrix = [[-1] * len(labels) for _ in names]
+    # Id of the keyword each cell was read from
+    sources = [[None] * len(labels) for _ in names]
+    for keyword_id, name, date, position in rows:
+        if date is None:
+            continue
+        line, column = line_of[name], column_of[date]
+        if sources[line][column] is None or keyword_id < sources[line][column]:
+            sources[line][column] = keyword_id
+            matrix[line][column] = position if position != -1 else MAX_RANK
+
+    return {"keywords": [{"label": name, "data": matrix[idx]} for idx, name in enumerate(names)],
+            "labels": labels}
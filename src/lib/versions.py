@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""Versions of the data behind responses, replaced as it is written so that validators never read the data"""
+
+import logging
+from uuid import uuid4
+from datetime import datetime
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from src.config import db
+from src.lib.conditional import get_etag
+from src.lib.rollups import get_trend_keys
+from src.lib.sql import upsert
+from src.model.orm import DataVersion, Keyword, Trend, Website
+
+log = logging.getLogger(__name__)
+
+# Replaced when trends are dropped or rebuilt in bulk, every chart depends on it
+TRENDS_VERSION = "trends"
+# Replaced when the movers of a day are computed
+MOVERS_VERSION = "movers"
+
+
+def get_trend_version_name(website_id, engine):
+    """Get the name of the version of the trends of a website on an engine"""
+    return "trend:%s:%s" % (website_id, engine)
+
+
+def get_website_version_name(website_id):
+    """Get the name of the version of a website and its keyword set"""
+    return "website:%s" % website_id
+
+
+def get_user_version_name(username):
+    """Get the name of the version of everything a user owns: websites, keywords and trends"""
+    return "user:%s" % username
+
+
+def bump_versions(connection, names):
+    """Replace the versions of names"""
+    if not names:
+        return
+    version, updated_at = uuid4().hex, datetime.utcnow()
+    upsert(connection, DataVersion.__table__, [{"name": name, "version": version, "updatedAt": updated_at}
+                                               for name in sorted(names)], ["name"])
+
+
+def bump_trend_versions(connection, trends):
+    """Replace the versions of the charts of (keyword, engine) trends, and of the users owning them"""
+    trends = set(trends)
+    if not trends:
+        return
+    keywords = Keyword.__table__
+    websites = Website.__table__
+    owners = {row.id: (row.websiteId, row.username) for row in connection.execute(
+        select([keywords.c.id, keywords.c.websiteId, websites.c.username])
+        .select_from(keywords.join(websites, websites.c.id == keywords.c.websiteId))
+        .where(keywords.c.id.in_({keyword for keyword, _ in trends})))}
+    names = set()
+    for keyword, engine in trends:
+        if keyword in owners:
+            website_id, username = owners[keyword]
+            names |= {get_trend_version_name(website_id, engine), get_user_version_name(username)}
+    bump_versions(connection, names)
+
+
+def bump_website_versions(connection, website_ids, usernames=()):
+    """Replace the versions of websites whose keyword set changed, and of the users owning them"""
+    website_ids = {website_id for website_id in website_ids if website_id is not None}
+    names = {get_user_version_name(username) for username in usernames if username is not None}
+    names |= {get_website_version_name(website_id) for website_id in website_ids}
+    if website_ids:
+        websites = Website.__table__
+        names |= {get_user_version_name(row.username) for row in connection.execute(
+            select([websites.c.username]).where(websites.c.id.in_(website_ids)))}
+    bump_versions(connection, names)
+
+
+def get_versions_query(names):
+    """Get the query of the (name, version, updated at) rows of names"""
+    return db.session.query(DataVersion.name, DataVersion.version, DataVersion.updatedAt) \
+        .filter(DataVersion.name.in_(names))
+
+
+def get_versions(names):
+    """
+    Get the versions of names, None for the ones never written, with the last time one of them was replaced, in
+    a single read of their rows
+    """
+    rows = {row.name: row for row in get_versions_query(names)}
+    return [rows[name].version if name in rows else None for name in names], \
+        max((row.updatedAt for row in rows.values()), default=None)
+
+
+def get_validators(names, *parts):
+    """Get the (etag, last modified time) validators of a response built from the data behind names"""
+    versions, last_modified = get_versions(names)
+    return get_etag(*parts, versions), last_modified
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_versions_after_flush(session, flush_context):
+    """Replace the versions of the trends, keywords and websites written through the orm"""
+    trends = set()
+    website_ids = set()
+    usernames = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Trend):
+            trends |= {(keyword, engine) for keyword, engine, _ in get_trend_keys(obj)}
+        elif isinstance(obj, Keyword):
+            website_ids.add(obj.websiteId)
+        elif isinstance(obj, Website):
+            website_ids.add(obj.id)
+            usernames.add(obj.username)
+    if trends:
+        bump_trend_versions(session.connection(), trends)
+    if website_ids or usernames:
+        bump_website_versions(session.connection(), website_ids, usernames)
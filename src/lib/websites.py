@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Website listing queries"""
+
+import base64
+import binascii
+import logging
+import orjson
+from sqlalchemy import and_, func, or_
+from src.config import db
+from src.lib.serializer import ModelSerializer
+from src.model.orm import Website, Keyword
+
+log = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 100
+
+website_serializer = ModelSerializer(Website)
+
+
+def get_website_rows_query(username, website_id=None):
+    """Get the query of the (id, domain, username, keyword name) rows of the websites of a user"""
+    query = db.session.query(*website_serializer.attributes, Keyword.name) \
+        .outerjoin(Keyword, Keyword.websiteId == Website.id) \
+        .filter(Website.username == username)
+    if website_id is not None:
+        query = query.filter(Website.id == website_id)
+    return query
+
+
+def build_websites(rows):
+    """Build website dicts with their keyword names from (id, domain, username, keyword name) rows in one pass"""
+    websites = {}
+    for row in rows:
+        website = websites.get(row.id)
+        if website is None:
+            website = websites[row.id] = website_serializer.from_row(row)
+            website["keywords"] = []
+        keyword = row[-1]
+        if keyword is not None:
+            website["keywords"].append(keyword)
+    for website in websites.values():
+        website["numKeywords"] = len(website["keywords"])
+    return list(websites.values())
+
+
+def get_websites(username):
+    """Get every website of a user with its keyword names, in a single query"""
+    return build_websites(get_website_rows_query(username))
+
+
+def get_website(username, website_id):
+    """Get a website of a user with its keyword names in a single query, None when the user does not own it"""
+    websites = build_websites(get_website_rows_query(username, website_id))
+    return websites[0] if websites else None
+
+
+def encode_cursor(domain, website_id):
+    """Get the opaque cursor of the page following a website"""
+    return base64.urlsafe_b64encode(orjson.dumps([domain, website_id])).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Get the (domain, website id) of a cursor, raises ValueError when it is not one"""
+    try:
+        domain, website_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError, binascii.Error) as exception:
+        raise ValueError("Invalid cursor: %s" % exception)
+    if not isinstance(domain, str) or not isinstance(website_id, str):
+        raise ValueError("Invalid cursor: %s" % cursor)
+    return domain, website_id
+
+
+def get_website_page_query(username, limit=None, after=None):
+    """
+    Get the query of the (id, domain, username, keyword count) rows of a page of the websites of a user, by domain
+    and id, after a (domain, id) key. Keywords are counted by a grouped aggregate over the websites of the page
+    """
+    page = db.session.query(*website_serializer.attributes).filter(Website.username == username)
+    if after is not None:
+        page = page.filter(or_(Website.domain > after[0], and_(Website.domain == after[0], Website.id > after[1])))
+    page = page.order_by(Website.domain, Website.id)
+    if limit is not None:
+        page = page.limit(limit)
+    page = page.subquery("page")
+    columns = [page.c[column] for column in website_serializer.columns]
+    # Joined from the page, so that only the keywords of its websites are read
+    return db.session.query(*columns, func.count(Keyword.id)) \
+        .select_from(page) \
+        .outerjoin(Keyword, Keyword.websiteId == page.c.id) \
+        .group_by(*columns) \
+        .order_by(page.c.domain, page.c.id)
+
+
+def get_keyword_names(website_ids):
+    """Get the keyword names of websites, by website id"""
+    names = {website_id: [] for website_id in website_ids}
+    if website_ids:
+        for website_id, name in db.session.query(Keyword.websiteId, Keyword.name) \
+                .filter(Keyword.websiteId.in_(website_ids)).order_by(Keyword.websiteId, Keyword.name):
+            names[website_id].append(name)
+    return names
+
+
+def get_website_page(username, limit=None, cursor=None, keywords=True):
+    """
+    Get a page of the websites of a user with their keyword count and, when keywords is set, their keyword names,
+    with the cursor of the next page, None on the last one. Each page costs the same whatever the size of the account
+    """
+    rows = get_website_page_query(username, limit + 1 if limit is not None else None,
+                                  decode_cursor(cursor) if cursor else None).all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].domain, rows[-1].id)
+    websites = []
+    for row in rows:
+        website = website_serializer.from_row(row)
+        website["numKeywords"] = row[-1]
+        websites.append(website)
+    if keywords:
+        names = get_keyword_names([website["id"] for website in websites])
+        for website in websites:
+            website["keywords"] = names[website["id"]]
+    return websites, next_cursor
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Create the monthly partitions of the trends table ahead of time, and compact the oldest ones into rollups"""
+
+import os
+import sys
+import logging
+import argparse
+from config import app
+from src.model.orm import db
+from src.lib import partitions
+
+log = logging.getLogger(__name__)
+
+
+def run():
+    """Runtime configuration of flask"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ahead", type=int, default=int(os.environ.get("TREND_PARTITIONS_AHEAD", 3)),
+                        help="months of partitions to create past the current one")
+    parser.add_argument("--retention", type=int, default=int(os.environ.get("TREND_RETENTION_MONTHS", 0)),
+                        help="months of daily trends to keep past the current one, 0 keeps every trend")
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URI") or "mysql://%s:%s@%s/%s" % \
+                                            (os.environ.get("DATABASE_USERNAME"),
+                                             os.environ.get("DATABASE_PASSWORD"),
+                                             os.environ.get("DATABASE_HOST"),
+                                             os.environ.get("DATABASE_NAME"))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        if db.engine.dialect.name != "mysql":
+            log.error("Partitions are only supported on MySQL")
+            sys.exit(1)
+        with db.engine.begin() as connection:
+            created = partitions.create_partitions(connection, args.ahead)
+        log.info("Created %s partitions: %s", len(created), ", ".join(created))
+        if args.retention > 0:
+            compacted = partitions.compact_partitions(db.engine, args.retention)
+            log.info("Compacted %s partitions: %s", len(compacted), ", ".join(compacted))
+
+
+if __name__ == "__main__":
+    run()
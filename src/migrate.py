@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Apply versioned schema migrations and check that controller queries use indexes"""
+
+import os
+import sys
+import logging
+import argparse
+from datetime import date
+from config import app
+from src.model.orm import db, Website, Keyword, KeywordMover
+from src import migrations
+from src.lib import digest, movers, series, trends, versions, websites
+
+log = logging.getLogger(__name__)
+
+# Queries run by the controllers, with placeholder parameters
+QUERIES = {
+    "website by id": lambda: Website.query.filter(Website.id == "explain"),
+    "websites by username": lambda: Website.query.filter(Website.username == "explain"),
+    "website by domain and username": lambda: Website.query.filter(Website.domain == "explain",
+                                                                   Website.username == "explain"),
+    "keywords by website": lambda: Keyword.query.filter(Keyword.websiteId == "explain"),
+    "website rows": lambda: websites.get_website_rows_query("explain"),
+    "website page": lambda: websites.get_website_page_query("explain", 21, ("explain", "explain")),
+    "trend rows": lambda: trends.get_trend_rows_query("explain", "google", since=date.today()),
+    "data versions": lambda: versions.get_versions_query(["explain"]),
+    "rollup rows": lambda: trends.get_rollup_rows_query("explain", "google", "week"),
+    "history start": lambda: trends.get_history_start_query("explain", "google"),
+    "first trend date": lambda: trends.get_first_trend_date_query("explain", "google"),
+    "series rows": lambda: series.get_series_rows_query("explain", "google", since=date.today()),
+    "latest movers day": lambda: movers.get_latest_day_query("explain", "google", "7d"),
+    "movers": lambda: movers.get_movers_query("explain", "google", "7d", date.today())
+    .filter(KeywordMover.delta > 0).order_by(KeywordMover.delta.desc()).limit(10),
+    "digest rows": lambda: digest.get_digest_rows_query(date.today()),
+}
+
+
+def get_full_scans(connection, query):
+    """Get the tables read without any index by a query, derived tables such as a page of rows are not counted"""
+    compiled = query.statement.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    params = [compiled.params[name] for name in compiled.positiontup]
+    if connection.dialect.name == "mysql":
+        plan = connection.exec_driver_sql("EXPLAIN " + compiled.string, tuple(params)).mappings()
+        return [row["table"] for row in plan if row["type"] == "ALL" and not row["table"].startswith("<derived")]
+    plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + compiled.string, tuple(params))
+    return [row[3] for row in plan if row[3].startswith("SCAN") and "INDEX" not in row[3]
+            and row[3].split()[1] in db.metadata.tables]
+
+
+def explain():
+    """Check every controller query with EXPLAIN, returns False when one of them scans a whole table"""
+    success = True
+    with db.engine.connect() as connection:
+        for name, query in QUERIES.items():
+            full_scans = get_full_scans(connection, query())
+            if full_scans:
+                log.error("Query (%s) does not use any index on: %s", name, ", ".join(full_scans))
+                success = False
+            else:
+                log.info("Query (%s) uses indexes", name)
+    return success
+
+
+def run():
+    """Runtime configuration of flask"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("command", choices=["upgrade", "downgrade", "stamp", "status", "explain"])
+    parser.add_argument("version", nargs="?", help="target version of upgrade and downgrade")
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URI") or "mysql://%s:%s@%s/%s" % \
+                                            (os.environ.get("DATABASE_USERNAME"),
+                                             os.environ.get("DATABASE_PASSWORD"),
+                                             os.environ.get("DATABASE_HOST"),
+                                             os.environ.get("DATABASE_NAME"))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        if args.command == "upgrade":
+            migrations.upgrade(db.engine, args.version)
+        elif args.command == "downgrade":
+            if args.version is None:
+                parser.error("downgrade requires a target version")
+            migrations.downgrade(db.engine, args.version)
+        elif args.command == "stamp":
+            migrations.stamp(db.engine)
+        elif args.command == "status":
+            applied = migrations.get_applied(db.engine)
+            for version, migration in migrations.get_migrations():
+                log.info("%s %s: %s", "[x]" if version in applied else "[ ]", version, migration.__doc__)
+        elif not explain():
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations.
+Every vNNNN_<name>.py module of this package is a migration exposing upgrade(connection) and
+downgrade(connection), applied in version order and recorded in the schema_migrations table
+"""
+
+import logging
+import pkgutil
+import importlib
+from datetime import datetime
+from sqlalchemy import MetaData, Table, Column, String, DateTime
+
+log = logging.getLogger(__name__)
+
+metadata = MetaData()
+schema_migrations = Table("schema_migrations", metadata,
+                          Column("version", String(255), primary_key=True),
+                          Column("applied_at", DateTime, nullable=False))
+
+
+def get_migrations():
+    """Get every (version, module) migration, sorted by version"""
+    names = sorted(name for _, name, _ in pkgutil.iter_modules(__path__) if name.startswith("v"))
+    return [(name.split("_", 1)[0], importlib.import_module("%s.%s" % (__name__, name))) for name in names]
+
+
+def get_applied(engine):
+    """Get the versions already applied to the database"""
+    metadata.create_all(engine)
+    with engine.connect() as connection:
+        return {row[0] for row in connection.execute(schema_migrations.select())}
+
+
+def upgrade(engine, target=None):
+    """Apply every migration not applied yet, up to the target version included"""
+    applied = get_applied(engine)
+    for version, migration in get_migrations():
+        if target is not None and version > target:
+            break
+        if version in applied:
+            continue
+        log.info("Applying migration %s: %s", version, migration.__doc__)
+        with engine.begin() as connection:
+            migration.upgrade(connection)
+            connection.execute(schema_migrations.insert().values(version=version, applied_at=datetime.utcnow()))
+
+
+def downgrade(engine, target):
+    """Revert every applied migration more recent than the target version"""
+    applied = get_applied(engine)
+    for version, migration in reversed(get_migrations()):
+        if version <= target:
+            break
+        if version not in applied:
+            continue
+        log.info("Reverting migration %s: %s", version, migration.__doc__)
+        with engine.begin() as connection:
+            migration.downgrade(connection)
+            connection.execute(schema_migrations.delete().where(schema_migrations.c.version == version))
+
+
+def stamp(engine):
+    """Record every migration as applied, for databases created from the current models"""
+    applied = get_applied(engine)
+    with engine.begin() as connection:
+        for version, _ in get_migrations():
+            if version not in applied:
+                connection.execute(schema_migrations.insert().values(version=version, applied_at=datetime.utcnow()))
@@ -0,0 +1,23 @@
+"""Create the trend rollups table"""
+
+from sqlalchemy import inspect, text
+
+
+def upgrade(connection):
+    if inspect(connection).has_table("trend_rollups"):
+        return
+    connection.execute(text(
+        "CREATE TABLE trend_rollups ("
+        " keyword VARCHAR(255) NOT NULL,"
+        " engine VARCHAR(255) NOT NULL,"
+        " granularity VARCHAR(16) NOT NULL,"
+        " bucket DATE NOT NULL,"
+        " best INTEGER NOT NULL,"
+        " average FLOAT NOT NULL,"
+        " last INTEGER NOT NULL,"
+        " samples INTEGER NOT NULL,"
+        " PRIMARY KEY (keyword, engine, granularity, bucket))"))
+
+
+def downgrade(connection):
+    connection.execute(text("DROP TABLE trend_rollups"))
@@ -0,0 +1,23 @@
+"""Add covering indexes for the trend, website and keyword access paths"""
+
+from sqlalchemy import inspect, text
+
+INDEXES = [
+    ("trends", "ix_trends_keyword_engine_date", "keyword, engine, date, position"),
+    ("websites", "ix_websites_username_domain", "username, domain"),
+    ("keywords", "ix_keywords_website_name", "websiteId, name"),
+]
+
+
+def upgrade(connection):
+    for table, name, columns in INDEXES:
+        if name not in {index["name"] for index in inspect(connection).get_indexes(table)}:
+            connection.execute(text("CREATE INDEX %s ON %s (%s)" % (name, table, columns)))
+
+
+def downgrade(connection):
+    for table, name, _ in INDEXES:
+        if connection.dialect.name == "mysql":
+            connection.execute(text("DROP INDEX %s ON %s" % (name, table)))
+        else:
+            connection.execute(text("DROP INDEX %s" % name))
@@ -0,0 +1,25 @@
+"""Partition the trends table by month"""
+
+from sqlalchemy import text
+from src.lib.partitions import partition_trends
+
+MONTHS_AHEAD = 3
+
+
+def upgrade(connection):
+    if connection.dialect.name == "mysql":
+        partition_trends(connection, MONTHS_AHEAD)
+    else:
+        # Unique like the (id, date) primary key of the partitioned MySQL table, the primary key here is still id.
+        # Upserts key on ux_trends_keyword_engine_day since v0008, v0012 drops this index
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_trends_id_date ON trends (id, date)"))
+
+
+def downgrade(connection):
+    if connection.dialect.name == "mysql":
+        connection.execute(text("ALTER TABLE trends REMOVE PARTITIONING"))
+        connection.execute(text("ALTER TABLE trends DROP PRIMARY KEY, ADD PRIMARY KEY (id)"))
+        connection.execute(text("ALTER TABLE trends ADD CONSTRAINT trends_ibfk_1 FOREIGN KEY (keyword)"
+                                " REFERENCES keywords (id)"))
+    else:
+        connection.execute(text("DROP INDEX IF EXISTS ux_trends_id_date"))
@@ -0,0 +1,19 @@
+"""Create the packed trend series table"""
+
+from sqlalchemy import inspect, text
+
+
+def upgrade(connection):
+    if inspect(connection).has_table("trend_series"):
+        return
+    connection.execute(text(
+        "CREATE TABLE trend_series ("
+        " keyword VARCHAR(255) NOT NULL,"
+        " engine VARCHAR(255) NOT NULL,"
+        " month DATE NOT NULL,"
+        " positions VARBINARY(31) NOT NULL,"
+        " PRIMARY KEY (keyword, engine, month))"))
+
+
+def downgrade(connection):
+    connection.execute(text("DROP TABLE trend_series"))
@@ -0,0 +1,17 @@
+"""Add per client website and keyword limits"""
+
+from sqlalchemy import inspect, text
+
+COLUMNS = ["websiteLimit", "keywordLimit"]
+
+
+def upgrade(connection):
+    existing = {column["name"] for column in inspect(connection).get_columns("clients")}
+    for column in COLUMNS:
+        if column not in existing:
+            connection.execute(text("ALTER TABLE clients ADD COLUMN %s INTEGER NULL" % column))
+
+
+def downgrade(connection):
+    for column in COLUMNS:
+        connection.execute(text("ALTER TABLE clients DROP COLUMN %s" % column))
@@ -0,0 +1,29 @@
+"""Create the keyword movers table"""
+
+from sqlalchemy import inspect, text
+
+
+def upgrade(connection):
+    if inspect(connection).has_table("keyword_movers"):
+        return
+    connection.execute(text(
+        "CREATE TABLE keyword_movers ("
+        " keyword VARCHAR(255) NOT NULL,"
+        " engine VARCHAR(255) NOT NULL,"
+        " period VARCHAR(8) NOT NULL,"
+        " date DATE NOT NULL,"
+        " username VARCHAR(255) NOT NULL,"
+        " websiteId VARCHAR(255) NOT NULL,"
+        " position INTEGER NOT NULL,"
+        " previous INTEGER NOT NULL,"
+        " delta INTEGER NOT NULL,"
+        " best INTEGER NOT NULL,"
+        " worst INTEGER NOT NULL,"
+        " average FLOAT NOT NULL,"
+        " PRIMARY KEY (keyword, engine, period, date))"))
+    connection.execute(text(
+        "CREATE INDEX ix_keyword_movers_user_delta ON keyword_movers (username, engine, period, date, delta)"))
+
+
+def downgrade(connection):
+    connection.execute(text("DROP TABLE keyword_movers"))
@@ -0,0 +1,17 @@
+"""Index the keyword movers of a day, read for the digests of every client"""
+
+from sqlalchemy import inspect, text
+
+INDEX = "ix_keyword_movers_day_user"
+
+
+def upgrade(connection):
+    if INDEX not in {index["name"] for index in inspect(connection).get_indexes("keyword_movers")}:
+        connection.execute(text("CREATE INDEX %s ON keyword_movers (period, date, username)" % INDEX))
+
+
+def downgrade(connection):
+    if connection.dialect.name == "mysql":
+        connection.execute(text("DROP INDEX %s ON keyword_movers" % INDEX))
+    else:
+        connection.execute(text("DROP INDEX %s" % INDEX))
@@ -0,0 +1,34 @@
+"""Keep a single trend per keyword, engine and day"""
+
+import logging
+from sqlalchemy import inspect, text
+
+log = logging.getLogger(__name__)
+
+INDEX = "ux_trends_keyword_engine_day"
+
+
+def upgrade(connection):
+    if INDEX in {index["name"] for index in inspect(connection).get_indexes("trends")}:
+        return
+    # Keep the trend with the lowest id of every day written more than once
+    if connection.dialect.name == "mysql":
+        result = connection.execute(text(
+            "DELETE duplicate FROM trends duplicate JOIN trends kept"
+            " ON duplicate.keyword = kept.keyword AND duplicate.engine = kept.engine AND duplicate.date = kept.date"
+            " AND duplicate.id > kept.id"))
+    else:
+        result = connection.execute(text(
+            "DELETE FROM trends WHERE EXISTS (SELECT 1 FROM trends kept WHERE kept.keyword = trends.keyword"
+            " AND kept.engine = trends.engine AND kept.date = trends.date AND kept.id < trends.id)"))
+    if result.rowcount:
+        log.warning("Deleted %s duplicate trends, rollups and series need to be rebuilt", result.rowcount)
+    # The date is part of the index, as MySQL requires of unique indexes of the partitioned trends table
+    connection.execute(text("CREATE UNIQUE INDEX %s ON trends (keyword, engine, date)" % INDEX))
+
+
+def downgrade(connection):
+    if connection.dialect.name == "mysql":
+        connection.execute(text("DROP INDEX %s ON trends" % INDEX))
+    else:
+        connection.execute(text("DROP INDEX %s" % INDEX))
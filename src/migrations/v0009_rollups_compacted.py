@@ -0,0 +1,13 @@
+"""Flag the trend rollups compacted from dropped partitions"""
+
+from sqlalchemy import inspect, text
+
+
+def upgrade(connection):
+    existing = {column["name"] for column in inspect(connection).get_columns("trend_rollups")}
+    if "compacted" not in existing:
+        connection.execute(text("ALTER TABLE trend_rollups ADD COLUMN compacted BOOLEAN NOT NULL DEFAULT 0"))
+
+
+def downgrade(connection):
+    connection.execute(text("ALTER TABLE trend_rollups DROP COLUMN compacted"))
@@ -0,0 +1,19 @@
+"""Create the digest sends table"""
+
+from sqlalchemy import inspect, text
+
+
+def upgrade(connection):
+    if inspect(connection).has_table("digest_sends"):
+        return
+    connection.execute(text(
+        "CREATE TABLE digest_sends ("
+        " username VARCHAR(255) NOT NULL,"
+        " period VARCHAR(8) NOT NULL,"
+        " date DATE NOT NULL,"
+        " sentAt DATETIME NOT NULL,"
+        " PRIMARY KEY (username, period, date))"))
+
+
+def downgrade(connection):
+    connection.execute(text("DROP TABLE digest_sends"))
@@ -0,0 +1,18 @@
+"""Create the data versions table"""
+
+from sqlalchemy import inspect, text
+
+
+def upgrade(connection):
+    if inspect(connection).has_table("data_versions"):
+        return
+    connection.execute(text(
+        "CREATE TABLE data_versions ("
+        " name VARCHAR(255) NOT NULL,"
+        " version VARCHAR(32) NOT NULL,"
+        " updatedAt DATETIME NOT NULL,"
+        " PRIMARY KEY (name))"))
+
+
+def downgrade(connection):
+    connection.execute(text("DROP TABLE data_versions"))
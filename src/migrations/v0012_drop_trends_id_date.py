@@ -0,0 +1,16 @@
+"""Drop the unique index of trends on (id, date), unused since trends are upserted on their keyword, engine and day"""
+
+from sqlalchemy import inspect, text
+
+INDEX = "ux_trends_id_date"
+
+
+def upgrade(connection):
+    # Only created on SQLite, where the primary key of trends was still id
+    if INDEX in {index["name"] for index in inspect(connection).get_indexes("trends")}:
+        connection.execute(text("DROP INDEX %s" % INDEX))
+
+
+def downgrade(connection):
+    if connection.dialect.name != "mysql":
+        connection.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS %s ON trends (id, date)" % INDEX))
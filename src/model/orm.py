@@ -11,6 +11,9 @@ class Client(db.Model, SerializerMixin):
     username = db.Column(db.String(255), primary_key=True)
     email = db.Column(db.String(255), nullable=False)
     notifications = db.Column(db.Boolean, default=False)
+    # Limits of this client, the WEBSITE_LIMIT and KEYWORD_LIMIT defaults when null
+    websiteLimit = db.Column(db.Integer, nullable=True)
+    keywordLimit = db.Column(db.Integer, nullable=True)
 
     websites = db.relationship("Website")
 
@@ -18,6 +21,7 @@ class Client(db.Model, SerializerMixin):
 class Website(db.Model, SerializerMixin):
     """Website table in db"""
     __tablename__ = "websites"
+    __table_args__ = (db.Index("ix_websites_username_domain", "username", "domain"),)
     id = db.Column(db.String(255), primary_key=True)
     domain = db.Column(db.String(255), nullable=False)
     username = db.Column(db.String(255), db.ForeignKey("clients.username"), nullable=False)
@@ -28,6 +32,7 @@ class Website(db.Model, SerializerMixin):
 class Keyword(db.Model, SerializerMixin):
     """Website table in db"""
     __tablename__ = "keywords"
+    __table_args__ = (db.Index("ix_keywords_website_name", "websiteId", "name"),)
     id = db.Column(db.String(255), primary_key=True)
     websiteId = db.Column(db.String(255), db.ForeignKey("websites.id"))
     name = db.Column(db.String(255), nullable=False)
@@ -36,8 +41,73 @@ class Keyword(db.Model, SerializerMixin):
 class Trend(db.Model, SerializerMixin):
     """Statistics table in db"""
     __tablename__ = "trends"
+    __table_args__ = (db.Index("ix_trends_keyword_engine_date", "keyword", "engine", "date", "position"),
+                      db.Index("ux_trends_keyword_engine_day", "keyword", "engine", "date", unique=True))
     id = db.Column(db.String(255), primary_key=True)
-    keyword = db.Column(db.String(255), db.ForeignKey("keywords.id"))
+    # No foreign key to keywords, MySQL does not support them on the partitioned trends table
+    keyword = db.Column(db.String(255))
     position = db.Column(db.Integer, nullable=False)
     engine = db.Column(db.String(255), nullable=False)
-    date = db.Column(db.Date, nullable=False)
+    # Part of the primary key, as MySQL requires of the column the table is partitioned by
+    date = db.Column(db.Date, primary_key=True)
+
+
+class TrendRollup(db.Model, SerializerMixin):
+    """Weekly and monthly statistics table in db"""
+    __tablename__ = "trend_rollups"
+    keyword = db.Column(db.String(255), primary_key=True)
+    engine = db.Column(db.String(255), primary_key=True)
+    granularity = db.Column(db.String(16), primary_key=True)
+    bucket = db.Column(db.Date, primary_key=True)
+    best = db.Column(db.Integer, nullable=False)
+    average = db.Column(db.Float, nullable=False)
+    last = db.Column(db.Integer, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    # Set once the daily trends of the bucket were compacted and dropped, the rollup is then never recomputed
+    compacted = db.Column(db.Boolean, nullable=False, default=False)
+
+
+class TrendSeries(db.Model, SerializerMixin):
+    """Monthly statistics table in db, one byte per day"""
+    __tablename__ = "trend_series"
+    keyword = db.Column(db.String(255), primary_key=True)
+    engine = db.Column(db.String(255), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    positions = db.Column(db.VARBINARY(31), nullable=False)
+
+
+class KeywordMover(db.Model, SerializerMixin):
+    """Position changes of keywords over a period ending on a day, computed once per day"""
+    __tablename__ = "keyword_movers"
+    __table_args__ = (db.Index("ix_keyword_movers_user_delta", "username", "engine", "period", "date", "delta"),
+                      db.Index("ix_keyword_movers_day_user", "period", "date", "username"))
+    keyword = db.Column(db.String(255), primary_key=True)
+    engine = db.Column(db.String(255), primary_key=True)
+    period = db.Column(db.String(8), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    username = db.Column(db.String(255), nullable=False)
+    websiteId = db.Column(db.String(255), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    previous = db.Column(db.Integer, nullable=False)
+    # Positions gained, negative when lost
+    delta = db.Column(db.Integer, nullable=False)
+    best = db.Column(db.Integer, nullable=False)
+    worst = db.Column(db.Integer, nullable=False)
+    average = db.Column(db.Float, nullable=False)
+
+
+class DigestSend(db.Model, SerializerMixin):
+    """Digests sent to clients, one row per client, period and day so that a rerun skips them"""
+    __tablename__ = "digest_sends"
+    username = db.Column(db.String(255), primary_key=True)
+    period = db.Column(db.String(8), primary_key=True)
+    date = db.Column(db.Date, primary_key=True)
+    sentAt = db.Column(db.DateTime, nullable=False)
+
+
+class DataVersion(db.Model, SerializerMixin):
+    """Version of the data behind a set of responses, replaced whenever that data is written"""
+    __tablename__ = "data_versions"
+    name = db.Column(db.String(255), primary_key=True)
+    version = db.Column(db.String(32), nullable=False)
+    updatedAt = db.Column(db.DateTime, nullable=False)
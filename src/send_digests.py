@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Send the digest of the significant rank changes of a day to every client with notifications on"""
+
+import os
+import sys
+import logging
+import argparse
+from datetime import date
+from config import app
+from src.model.orm import db
+from src.lib.digest import DIGEST_MAILERS, DigestSender, MemoryMailer, SesMailer, count_digests, iter_digests, \
+    record_sent
+from src.lib.movers import MOVER_PERIODS
+
+log = logging.getLogger(__name__)
+
+
+def get_mailer(name):
+    """Get the mailer digests are sent with"""
+    if name == "memory":
+        return MemoryMailer()
+    return SesMailer(os.environ.get("DIGEST_SENDER") or os.environ.get("CONTACT_EMAIL"),
+                     os.environ.get("DIGEST_TEMPLATE", "serpbot-digest"),
+                     region=os.environ.get("SES_REGION"), endpoint_url=os.environ.get("SES_ENDPOINT_URL"),
+                     max_pool_connections=int(os.environ.get("DIGEST_WORKERS", 8)))
+
+
+def run():
+    """Runtime configuration of flask"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--date", type=date.fromisoformat, default=date.today(),
+                        help="day of the movers sent, as YYYY-MM-DD, today by default")
+    parser.add_argument("--period", choices=list(MOVER_PERIODS), default="1d", help="period of the rank changes")
+    parser.add_argument("--mailer", choices=DIGEST_MAILERS, default=os.environ.get("DIGEST_MAILER", "ses"),
+                        help="ses, or memory to build the digests without sending them")
+    args = parser.parse_args()
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get("DATABASE_URI") or "mysql://%s:%s@%s/%s" % \
+                                            (os.environ.get("DATABASE_USERNAME"),
+                                             os.environ.get("DATABASE_PASSWORD"),
+                                             os.environ.get("DATABASE_HOST"),
+                                             os.environ.get("DATABASE_NAME"))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    # Emails per second and seconds the job may take, 100k digests are sent in under 9 minutes by default
+    rate = float(os.environ.get("DIGEST_RATE", 200))
+    deadline = float(os.environ.get("DIGEST_DEADLINE", 900))
+    min_delta = int(os.environ.get("DIGEST_MIN_DELTA", 10))
+    with app.app_context():
+        with db.engine.connect() as connection:
+            pending = count_digests(connection, args.date, args.period, min_delta)
+        if pending / rate > deadline:
+            log.error("Sending %s digests at %s per second would take %.0f s, more than the %.0f s of "
+                      "DIGEST_DEADLINE: raise DIGEST_RATE and the SES sending quota", pending, rate, pending / rate,
+                      deadline)
+            sys.exit(1)
+
+        # Sent digests are recorded from the worker threads, outside of the app context
+        engine = db.engine
+
+        def on_sent(messages):
+            with engine.begin() as connection:
+                record_sent(connection, messages)
+
+        sender = DigestSender(get_mailer(args.mailer), rate=rate, workers=int(os.environ.get("DIGEST_WORKERS", 8)),
+                              on_sent=on_sent if args.mailer != "memory" else None)
+        with db.engine.connect() as connection:
+            sent, failed, seconds = sender.send(iter_digests(connection, args.date, args.period, min_delta=min_delta,
+                                                             max_changes=int(os.environ.get("DIGEST_MAX_CHANGES",
+                                                                                            20))))
+    log.info("Sent %s digests for %s (%s failed) in %.1f s, %.0f digests/s", sent, args.date, failed, seconds,
+             (sent + failed) / seconds if seconds else 0)
+
+
+if __name__ == "__main__":
+    run()
@@ -11,7 +11,9 @@ from connexion.exceptions import BadRequestProblem
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
 from src.lib.response import HttpResponse
-from src.config import connex_app, app, db, cogauth
+from src.lib.routing import REPLICA_BIND
+from src.lib.spec import SPEC_PATH, load_spec
+from src.config import connex_app, app, db, cogauth, trend_cache, metrics
 
 log = logging.getLogger(__name__)
 
@@ -34,33 +36,82 @@ def create_app():
     app.config["SITEMAP_IGNORE_ENDPOINTS"] = ["_openapi_json", "_openapi_yaml"]
     app.config["SITEMAP_URL_SCHEME"] = "https"
     app.config["SQLALCHEMY_ECHO"] = False
-    app.config["SQLALCHEMY_DATABASE_URI"] = "mysql://%s:%s@%s/%s" % \
-                                            (os.environ.get("DATABASE_USERNAME"),
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URI") or "%s://%s:%s@%s/%s" % \
+                                            (os.environ.get("DATABASE_DRIVER", "mysql"),
+                                             os.environ.get("DATABASE_USERNAME"),
                                              os.environ.get("DATABASE_PASSWORD"),
                                              os.environ.get("DATABASE_HOST"),
                                              os.environ.get("DATABASE_NAME"))
+    if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"pool_size": int(os.environ.get("DATABASE_POOL_SIZE", 5)),
+                                                   "max_overflow": int(os.environ.get("DATABASE_MAX_OVERFLOW", 10)),
+                                                   "pool_timeout": float(os.environ.get("DATABASE_POOL_TIMEOUT", 10)),
+                                                   "pool_recycle": int(os.environ.get("DATABASE_POOL_RECYCLE", 1800)),
+                                                   "pool_pre_ping": os.environ.get("DATABASE_POOL_PRE_PING", "True") == "True"}
+    if os.environ.get("DATABASE_REPLICA_URI") or os.environ.get("DATABASE_REPLICA_HOST"):
+        app.config["SQLALCHEMY_BINDS"] = {REPLICA_BIND: os.environ.get("DATABASE_REPLICA_URI") or "%s://%s:%s@%s/%s" %
+                                          (os.environ.get("DATABASE_DRIVER", "mysql"),
+                                           os.environ.get("DATABASE_USERNAME"),
+                                           os.environ.get("DATABASE_PASSWORD"),
+                                           os.environ.get("DATABASE_REPLICA_HOST"),
+                                           os.environ.get("DATABASE_NAME"))}
+    app.config["DATABASE_REPLICA_STICKINESS"] = int(os.environ.get("DATABASE_REPLICA_STICKINESS", 5))
+    app.config["DATABASE_REPLICA_STORE_URL"] = os.environ.get("DATABASE_REPLICA_STORE_URL") or \
+        os.environ.get("TREND_CACHE_STORE_URL")
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Largest request body accepted, keyword imports being the largest ones
+    app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_CONTENT_LENGTH", 4 * 1024 * 1024))
     app.config["SQS_NAME"] = os.environ.get("SQS_NAME")
     app.config["SQS_REGION"] = os.environ.get("SQS_REGION")
     app.config["COGNITO_REGION"] = os.environ.get("COGNITO_REGION")
     app.config["COGNITO_USERPOOL_ID"] = os.environ.get("COGNITO_USERPOOL_ID")
     app.config["COGNITO_APP_CLIENT_ID"] = os.environ.get("COGNITO_APP_CLIENT_ID")
     app.config["COGNITO_APP_CLIENT_SECRET"] = os.environ.get("COGNITO_APP_CLIENT_SECRET")
+    app.config["COGNITO_ENDPOINT_URL"] = os.environ.get("COGNITO_ENDPOINT_URL")
+    app.config["COGNITO_MAX_POOL_CONNECTIONS"] = int(os.environ.get("COGNITO_MAX_POOL_CONNECTIONS", 10))
+    app.config["COGNITO_CONNECT_TIMEOUT"] = float(os.environ.get("COGNITO_CONNECT_TIMEOUT", 2))
+    app.config["COGNITO_READ_TIMEOUT"] = float(os.environ.get("COGNITO_READ_TIMEOUT", 5))
+    app.config["COGNITO_MAX_ATTEMPTS"] = int(os.environ.get("COGNITO_MAX_ATTEMPTS", 3))
+    app.config["COGNITO_JWKS_URL"] = os.environ.get("COGNITO_JWKS_URL")
     app.config["COGNITO_CHECK_TOKEN_EXPIRATION"] = True
     app.config["COGNITO_JWT_HEADER_NAME"] = "Authorization"
     app.config["COGNITO_JWT_HEADER_PREFIX"] = "Bearer"
     app.config["RECAPTCHA_HEADER_NAME"] = "Recaptcha"
     app.config["HCAPTCHA_SECRET"] = os.environ.get("HCAPTCHA_SECRET")
     app.config["HCAPTCHA_SITE_KEY"] = os.environ.get("HCAPTCHA_SITE_KEY")
+    app.config["HCAPTCHA_URL"] = os.environ.get("HCAPTCHA_URL", "https://hcaptcha.com/siteverify")
+    app.config["HCAPTCHA_CONNECT_TIMEOUT"] = float(os.environ.get("HCAPTCHA_CONNECT_TIMEOUT", 2))
+    app.config["HCAPTCHA_READ_TIMEOUT"] = float(os.environ.get("HCAPTCHA_READ_TIMEOUT", 3))
+    app.config["HCAPTCHA_CACHE_SIZE"] = int(os.environ.get("HCAPTCHA_CACHE_SIZE", 1024))
+    app.config["HCAPTCHA_CACHE_TTL"] = int(os.environ.get("HCAPTCHA_CACHE_TTL", 120))
+    app.config["HCAPTCHA_POOL_SIZE"] = int(os.environ.get("HCAPTCHA_POOL_SIZE", 4))
     app.config["CONTACT_EMAIL"] = os.environ.get("CONTACT_EMAIL")
-    connex_app.add_api("serpbot.yaml", options={"swagger_ui": os.environ.get("SWAGGER_UI") == "True", "swagger_path": swagger_ui_3_path})
+    app.config["WEBSITE_LIMIT"] = int(os.environ.get("WEBSITE_LIMIT", 5))
+    app.config["KEYWORD_LIMIT"] = int(os.environ.get("KEYWORD_LIMIT", 5))
+    app.config["TREND_ROLLUPS"] = os.environ.get("TREND_ROLLUPS") == "True"
+    app.config["TREND_STORAGE"] = os.environ.get("TREND_STORAGE", "rows")
+    app.config["TREND_CACHE_SIZE"] = int(os.environ.get("TREND_CACHE_SIZE", 256))
+    app.config["TREND_CACHE_TTL"] = int(os.environ.get("TREND_CACHE_TTL", 300))
+    app.config["TREND_CACHE_STORE_URL"] = os.environ.get("TREND_CACHE_STORE_URL")
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    connex_app.add_api(load_spec(SPEC_PATH), options={"swagger_ui": os.environ.get("SWAGGER_UI") == "True", "swagger_path": swagger_ui_3_path})
     connex_app.add_error_handler(BadRequestProblem, bad_request_handler)
     db.init_app(app)
     cogauth.init_app(app)
+    trend_cache.init_app(app)
+    metrics.init_app(app)
     CORS(app)
     return app, connex_app
 
 
+def reset_after_fork():
+    """Restart what a worker does not inherit from an app preloaded by the gunicorn master"""
+    with app.app_context():
+        for bind in [None] + list(app.config.get("SQLALCHEMY_BINDS") or {}):
+            db.get_engine(app, bind=bind).dispose()
+    cogauth.restart_key_refresher()
+
+
 if __name__ == "__main__":
     run()
 else:
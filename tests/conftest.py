@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""Shared fixtures of the test suite"""
+
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)) + "/..")
+from src.config import app, db
+
+
+@pytest.fixture
+def database(tmp_path):
+    """App context over an empty SQLite database holding every table"""
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///%s" % (tmp_path / "serpbot.sqlite")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if "sqlalchemy" not in app.extensions:
+        db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.engine.dispose()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Digests of the rank changes of a day"""
+
+from datetime import date
+from src.lib.digest import DigestSender, MemoryMailer, count_digests, iter_digests, record_sent
+from src.model.orm import Client, Keyword, KeywordMover, Website
+
+DAY = date(2022, 1, 31)
+
+
+def add_movers(db, username, deltas, notifications=True):
+    """Add a client with a website whose keywords moved by deltas on the day"""
+    db.session.add(Client(username=username, email="%s@example.com" % username, notifications=notifications))
+    db.session.add(Website(id=username, domain="www.%s.com" % username, username=username))
+    for idx, delta in enumerate(deltas):
+        keyword = "%s-%s" % (username, idx)
+        db.session.add(Keyword(id=keyword, websiteId=username, name="keyword %s" % idx))
+        db.session.add(KeywordMover(keyword=keyword, engine="google", period="1d", date=DAY, username=username,
+                                    websiteId=username, position=50 - delta, previous=50, delta=delta, best=1,
+                                    worst=100, average=50.0))
+    db.session.commit()
+
+
+def get_digests(db, **kwargs):
+    """Get the digests of the day by recipient"""
+    with db.engine.connect() as connection:
+        return {digest["to"]: digest for digest in iter_digests(connection, DAY, **kwargs)}
+
+
+class FailingMailer(MemoryMailer):
+    """Mailer failing the messages of some recipients, and every call holding one of them"""
+
+    def __init__(self, failing, raising):
+        super().__init__()
+        self.failing = failing
+        self.raising = raising
+
+    def send(self, messages):
+        if any(message["to"] in self.raising for message in messages):
+            raise RuntimeError("Unavailable")
+        super().send([message for message in messages if message["to"] not in self.failing])
+        return [message for message in messages if message["to"] in self.failing]
+
+
+def test_digests_are_grouped_by_client(database):
+    add_movers(database, "alice", [12, -15, 3, 30])
+    add_movers(database, "bob", [-11])
+    add_movers(database, "carol", [40], notifications=False)
+    add_movers(database, "dave", [2, -9])
+
+    digests = get_digests(database)
+    assert sorted(digests) == ["alice@example.com", "bob@example.com"]
+    alice = digests["alice@example.com"]["data"]
+    assert (alice["username"], alice["gained"], alice["lost"]) == ("alice", 2, 1)
+    assert [change["delta"] for change in alice["changes"]] == [30, -15, 12]
+
+    alice = get_digests(database, max_changes=2)["alice@example.com"]["data"]
+    assert [change["delta"] for change in alice["changes"]] == [30, -15]
+    assert (alice["gained"], alice["lost"]) == (2, 1)
+
+
+def test_sender_counts_failures(database):
+    for idx in range(7):
+        add_movers(database, "client-%s" % idx, [20])
+    mailer = FailingMailer(failing={"client-1@example.com"}, raising={"client-5@example.com"})
+    sender = DigestSender(mailer, rate=1000, workers=2, batch_size=2)
+    with database.engine.connect() as connection:
+        sent, failed, _ = sender.send(iter_digests(connection, DAY))
+    # client-4 shares a batch with client-5, whose call raises
+    assert (sent, failed) == (4, 3)
+    assert sorted(message["to"] for message in mailer.sent) == \
+        ["client-%s@example.com" % idx for idx in (0, 2, 3, 6)]
+
+
+def test_sent_digests_are_skipped(database):
+    add_movers(database, "alice", [20])
+    add_movers(database, "bob", [-20])
+    with database.engine.begin() as connection:
+        assert count_digests(connection, DAY) == 2
+        record_sent(connection, [get_digests(database)["alice@example.com"]])
+        assert count_digests(connection, DAY) == 1
+    assert sorted(get_digests(database)) == ["bob@example.com"]
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+"""Parsing of the messages of the ingestion worker"""
+
+from datetime import date
+import pytest
+from src.lib.ingest import parse_message
+
+
+def test_messages_are_parsed():
+    trends = parse_message('[{"keyword": "keyword", "engine": "google", "date": "2022-01-31", "position": 3}, '
+                           '{"keyword": "keyword", "engine": "bing", "date": "2022-01-31", "position": -1}]')
+    assert [(trend["engine"], trend["date"], trend["position"]) for trend in trends] == \
+        [("google", date(2022, 1, 31), 3), ("bing", date(2022, 1, 31), -1)]
+
+
+@pytest.mark.parametrize("engine, position", [("yahoo", 3), ("google", 0), ("google", -2)])
+def test_invalid_ranks_are_rejected(engine, position):
+    with pytest.raises(ValueError):
+        parse_message('{"keyword": "keyword", "engine": "%s", "date": "2022-01-31", "position": %s}'
+                      % (engine, position))
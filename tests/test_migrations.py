@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Apply every migration to the baseline schema on SQLite, then revert them"""
+
+from datetime import date
+import pytest
+from sqlalchemy import Column, Boolean, Date, ForeignKey, Integer, MetaData, String, Table, create_engine, inspect
+from src import migrations
+from src.config import db
+
+# Schema of the databases created before migrations existed
+baseline = MetaData()
+Table("clients", baseline,
+      Column("username", String(255), primary_key=True),
+      Column("email", String(255), nullable=False),
+      Column("notifications", Boolean))
+Table("websites", baseline,
+      Column("id", String(255), primary_key=True),
+      Column("domain", String(255), nullable=False),
+      Column("username", String(255), ForeignKey("clients.username"), nullable=False))
+Table("keywords", baseline,
+      Column("id", String(255), primary_key=True),
+      Column("websiteId", String(255), ForeignKey("websites.id")),
+      Column("name", String(255), nullable=False))
+Table("trends", baseline,
+      Column("id", String(255), primary_key=True),
+      Column("keyword", String(255), ForeignKey("keywords.id")),
+      Column("position", Integer, nullable=False),
+      Column("engine", String(255), nullable=False),
+      Column("date", Date, nullable=False))
+
+
+def get_schema(engine):
+    """Get the column and index names of every table but schema_migrations"""
+    inspector = inspect(engine)
+    return {table: ({column["name"] for column in inspector.get_columns(table)},
+                    {index["name"] for index in inspector.get_indexes(table)})
+            for table in inspector.get_table_names() if table != "schema_migrations"}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine("sqlite:///%s" % (tmp_path / "migrations.sqlite"))
+    baseline.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_matches_models(engine, tmp_path):
+    migrations.upgrade(engine)
+    models = create_engine("sqlite:///%s" % (tmp_path / "models.sqlite"))
+    db.Model.metadata.create_all(models)
+
+    upgraded = get_schema(engine)
+    expected = get_schema(models)
+    assert set(upgraded) == set(expected)
+    for table, (columns, indexes) in expected.items():
+        assert upgraded[table][0] == columns, table
+        assert indexes == upgraded[table][1], table
+    assert migrations.get_applied(engine) == {version for version, _ in migrations.get_migrations()}
+
+
+def test_upgrade_is_idempotent(engine):
+    migrations.upgrade(engine)
+    schema = get_schema(engine)
+    # Migrations check what already exists, so running them again over an upgraded schema changes nothing
+    with engine.begin() as connection:
+        for _, migration in migrations.get_migrations():
+            migration.upgrade(connection)
+    assert get_schema(engine) == schema
+
+
+def test_downgrade_restores_baseline(engine):
+    schema = get_schema(engine)
+    migrations.upgrade(engine)
+    migrations.downgrade(engine, "v0000")
+    assert get_schema(engine) == schema
+    assert migrations.get_applied(engine) == set()
+
+
+def test_upgrade_to_target(engine):
+    versions = [version for version, _ in migrations.get_migrations()]
+    migrations.upgrade(engine, versions[0])
+    assert migrations.get_applied(engine) == {versions[0]}
+    migrations.upgrade(engine)
+    assert migrations.get_applied(engine) == set(versions)
+
+
+def test_upgrade_removes_duplicate_trends(engine):
+    trends = baseline.tables["trends"]
+    with engine.begin() as connection:
+        connection.execute(trends.insert(), [
+            {"id": "b", "keyword": "keyword", "engine": "google", "date": date(2024, 1, 2), "position": 5},
+            {"id": "a", "keyword": "keyword", "engine": "google", "date": date(2024, 1, 2), "position": 7},
+            {"id": "c", "keyword": "keyword", "engine": "bing", "date": date(2024, 1, 2), "position": 9}])
+    migrations.upgrade(engine)
+    with engine.connect() as connection:
+        rows = connection.execute(trends.select().order_by(trends.c.id)).fetchall()
+    assert [(row.id, row.position) for row in rows] == [("a", 7), ("c", 9)]
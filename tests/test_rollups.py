@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""Rollups kept up to date by the orm, and frozen once compacted"""
+
+from datetime import date, timedelta
+import pytest
+from src.config import app
+from src.lib.partitions import compact_month
+from src.model.orm import Client, Keyword, Trend, TrendRollup, Website
+
+MONTH = date(2022, 1, 1)
+
+
+@pytest.fixture(autouse=True)
+def rollups(monkeypatch):
+    """Keep rollups up to date"""
+    monkeypatch.setitem(app.config, "TREND_ROLLUPS", True)
+
+
+def add_trends(db, days):
+    """Add a keyword ranked 5 on every given day of the month"""
+    db.session.add(Client(username="alice", email="alice@example.com"))
+    db.session.add(Website(id="website", domain="www.example.com", username="alice"))
+    db.session.add(Keyword(id="keyword", websiteId="website", name="keyword"))
+    db.session.add_all([Trend(id="trend-%s" % day, keyword="keyword", engine="google", position=5,
+                              date=MONTH + timedelta(days=day)) for day in days])
+    db.session.commit()
+
+
+def get_rollups(db):
+    """Get the (granularity, bucket, best, samples) of every rollup"""
+    return sorted((rollup.granularity, rollup.bucket, rollup.best, rollup.samples)
+                  for rollup in TrendRollup.query.all())
+
+
+def test_rollups_follow_trends(database):
+    add_trends(database, range(10))
+    assert ("month", MONTH, 5, 10) in get_rollups(database)
+
+    database.session.add(Trend(id="late", keyword="keyword", engine="google", position=1, date=date(2022, 1, 20)))
+    database.session.commit()
+    assert ("month", MONTH, 1, 11) in get_rollups(database)
+
+    database.session.delete(Trend.query.get(("late", date(2022, 1, 20))))
+    database.session.commit()
+    assert ("month", MONTH, 5, 10) in get_rollups(database)
+
+
+def test_rollups_are_not_written_when_off(database):
+    app.config["TREND_ROLLUPS"] = False
+    add_trends(database, range(10))
+    assert get_rollups(database) == []
+
+
+def test_compacted_rollups_are_not_recomputed(database):
+    add_trends(database, range(31))
+    with database.engine.begin() as connection:
+        compact_month(connection, MONTH)
+        # Stands in for dropping the partition of the month
+        connection.execute(Trend.__table__.delete().where(Trend.__table__.c.date < date(2022, 2, 1)))
+    compacted = get_rollups(database)
+    assert ("month", MONTH, 5, 31) in compacted
+
+    late = Trend(id="late", keyword="keyword", engine="google", position=1, date=date(2022, 1, 20))
+    database.session.add(late)
+    database.session.commit()
+    assert get_rollups(database) == compacted
+
+    database.session.delete(late)
+    database.session.commit()
+    assert get_rollups(database) == compacted
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""Packed series kept up to date by the orm"""
+
+from datetime import date
+import pytest
+from src.config import app
+from src.lib.series import encode, get_series_trend_rows
+from src.model.orm import Client, Keyword, Trend, Website
+
+
+@pytest.fixture(autouse=True)
+def packed(monkeypatch):
+    """Keep series up to date"""
+    monkeypatch.setitem(app.config, "TREND_STORAGE", "packed")
+
+
+def test_encode_rejects_invalid_positions():
+    assert encode(-1) == 255
+    assert encode(1) == 1
+    assert encode(300) == 254
+    with pytest.raises(ValueError):
+        encode(0)
+    with pytest.raises(ValueError):
+        encode(-2)
+
+
+def test_series_follow_trends(database):
+    database.session.add(Client(username="alice", email="alice@example.com"))
+    database.session.add(Website(id="website", domain="www.example.com", username="alice"))
+    database.session.add(Keyword(id="keyword", websiteId="website", name="keyword"))
+    database.session.add_all([Trend(id="first", keyword="keyword", engine="google", position=3, date=date(2022, 1, 1)),
+                              Trend(id="second", keyword="keyword", engine="google", position=-1,
+                                    date=date(2022, 1, 2))])
+    database.session.commit()
+    assert get_series_trend_rows("website", "google") == [("keyword", "keyword", date(2022, 1, 1), 3),
+                                                          ("keyword", "keyword", date(2022, 1, 2), -1)]
+
+    trend = Trend.query.get(("first", date(2022, 1, 1)))
+    trend.position = 7
+    trend.date = date(2022, 2, 1)
+    database.session.delete(Trend.query.get(("second", date(2022, 1, 2))))
+    database.session.commit()
+    assert get_series_trend_rows("website", "google") == [("keyword", "keyword", date(2022, 2, 1), 7)]
+
+
+def test_invalid_position_is_not_written(database):
+    app.config["TREND_STORAGE"] = "rows"
+    database.session.add(Trend(id="zero", keyword="keyword", engine="google", position=0, date=date(2022, 1, 1)))
+    with pytest.raises(ValueError):
+        database.session.commit()
+    database.session.rollback()
+    assert Trend.query.count() == 0
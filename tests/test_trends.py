@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""Charts built from trend rows"""
+
+from datetime import date
+from src.lib.rollups import MAX_RANK
+from src.lib.trends import build_trend_matrix
+
+ROWS = [("b", "shared", date(2022, 1, 1), 9), ("a", "shared", date(2022, 1, 1), 3),
+        ("b", "shared", date(2022, 1, 2), -1), ("c", "other", date(2022, 1, 2), 5), ("d", "empty", None, None)]
+
+
+def test_shared_names_keep_the_first_keyword():
+    expected = {"keywords": [{"label": "shared", "data": [3, MAX_RANK]}, {"label": "other", "data": [-1, 5]},
+                             {"label": "empty", "data": [-1, -1]}],
+                "labels": [date(2022, 1, 1), date(2022, 1, 2)]}
+    assert build_trend_matrix(ROWS) == expected
+    assert build_trend_matrix(ROWS[::-1]) == expected
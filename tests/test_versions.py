@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Versions replaced as the data behind responses is written"""
+
+from datetime import date
+from src.lib.ingest import TrendIngester
+from src.lib.keywords import apply_keyword_diff
+from src.lib.versions import get_trend_version_name, get_user_version_name, get_versions, get_website_version_name
+from src.model.orm import Client, Keyword, Website
+
+NAMES = [get_trend_version_name("website", "google"), get_website_version_name("website"),
+         get_user_version_name("alice")]
+
+
+def test_writes_replace_versions(database):
+    database.session.add(Client(username="alice", email="alice@example.com"))
+    database.session.add(Website(id="website", domain="www.example.com", username="alice"))
+    database.session.add(Keyword(id="keyword", websiteId="website", name="keyword"))
+    database.session.commit()
+    trend, website, user = get_versions(NAMES)[0]
+    assert trend is None and website is not None and user is not None
+
+    ingester = TrendIngester(None, None, database.engine)
+    ingester.write_trends([{"id": "trend", "keyword": "keyword", "engine": "google", "position": 3,
+                            "date": date(2022, 1, 1)}])
+    versions = get_versions(NAMES)[0]
+    assert versions[0] is not None and versions[1] == website and versions[2] != user
+
+    apply_keyword_diff(database.session, "website", ["other"], [])
+    database.session.commit()
+    assert get_versions(NAMES)[0][0] == versions[0]
+    assert get_versions(NAMES)[0][1] != website
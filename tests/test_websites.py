@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Website listing queries"""
+
+import pytest
+from sqlalchemy import event
+from src.lib import websites
+from src.model.orm import Client, Keyword, Website
+
+
+def add_websites(db, username, count, keywords):
+    """Add count websites to a new client, each with a number of keywords"""
+    db.session.add(Client(username=username, email="%s@example.com" % username))
+    for idx in range(count):
+        website_id = "%s-website-%s" % (username, idx)
+        db.session.add(Website(id=website_id, domain="www.%s-%s.com" % (username, idx), username=username))
+        db.session.add_all([Keyword(id="%s-keyword-%s" % (website_id, keyword), websiteId=website_id,
+                                    name="keyword %s" % keyword) for keyword in range(keywords)])
+    db.session.commit()
+    db.session.remove()
+
+
+@pytest.mark.parametrize("count, keywords", [(0, 0), (1, 0), (5, 3), (25, 10)])
+def test_get_websites_runs_one_select(database, count, keywords):
+    add_websites(database, "alice", count, keywords)
+    add_websites(database, "bob", 2, 2)
+
+    statements = []
+
+    def listener(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(database.engine, "before_cursor_execute", listener)
+    try:
+        result = websites.get_websites("alice")
+    finally:
+        event.remove(database.engine, "before_cursor_execute", listener)
+
+    assert len([statement for statement in statements if statement.lstrip().upper().startswith("SELECT")]) == 1
+    assert len(result) == count
+    for website in result:
+        assert website["username"] == "alice"
+        assert sorted(website["keywords"]) == sorted("keyword %s" % keyword for keyword in range(keywords))
+        assert website["numKeywords"] == keywords